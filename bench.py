@@ -0,0 +1,325 @@
+# Headless benchmarks for the editor hot paths. Each scenario runs in its own
+# process against a real CodeEditor (under Xvfb when there is no display).
+import os
+import sys
+import time
+import json
+import fnmatch
+import tkinter as tk
+
+from main import CodeEditor, LatencyMonitor
+
+
+class EditorBenchmark:
+    # Scenarios driving a real CodeEditor for bench.py. Each one returns
+    # {metric: [seconds, ...]}; main loop lag comes from the LatencyMonitor
+    # heartbeat while the scenario runs.
+    TYPED_TEXT = "def benchmark_function(argument, *rest):\n    return 'value' + str(argument)  # done\n" * 3
+    # Keysyms of the characters in TYPED_TEXT that are not their own keysym;
+    # Tk adds Shift when a keysym is the shifted one of its key
+    KEYSYMS = {"\n": "Return", " ": "space", "(": "parenleft", ")": "parenright", ",": "comma", "*": "asterisk",
+               ":": "colon", "'": "apostrophe", "+": "plus", "#": "numbersign", "_": "underscore"}
+
+    def __init__(self, editor, workdir):
+        self.editor = editor
+        self.root = editor.root
+        self.workdir = workdir
+
+    @staticmethod
+    def source_lines(count):
+        template = ["import os", "", "class Item{0}(object):", "    # item number {0}",
+                    "    def value(self, x):", "        return \"text {0}\" + str(x * {0})", ""]
+        return "\n".join(template[i % len(template)].format(i // len(template)) for i in range(count)) + "\n"
+
+    def pump(self, until, timeout=600):
+        # Run the event loop (and the worker thread callbacks) until until() holds
+        start = time.perf_counter()
+        while not until():
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("benchmark step timed out")
+            self.root.update()
+            self.editor.drain_ui_queue()
+            time.sleep(0.0005)
+        return time.perf_counter() - start
+
+    def settle(self):
+        # Let pending renders and idle callbacks run so they don't leak into the next sample
+        self.root.update()
+        self.editor.drain_ui_queue()
+        self.render_now()
+
+    def render_now(self):
+        highlighter = self.editor.highlighter
+        if highlighter.after_id is not None:
+            highlighter.text_widget.after_cancel(highlighter.after_id)
+            highlighter.render()
+        self.root.update_idletasks()
+
+    def load_buffer(self, content):
+        self.editor.new_buffer()
+        self.editor.change_language("python")
+        self.editor.set_buffer_content(content)
+        self.settle()
+
+    def typing(self, lines):
+        self.load_buffer(self.source_lines(lines))
+        text_widget = self.editor.text_widget
+        text_widget.mark_set(tk.INSERT, f"{lines // 2}.0")
+        text_widget.see(tk.INSERT)
+        text_widget.focus_force()
+        self.settle()
+        keystrokes = []
+        for char in self.TYPED_TEXT:
+            if char == "\n":
+                # Return would accept an open completion instead of breaking the line
+                self.editor.hide_completion()
+            keysym = self.KEYSYMS.get(char, char)
+            start = time.perf_counter()
+            # Through the bindings like a real keystroke, completion included
+            text_widget.event_generate("<KeyPress>", keysym=keysym)
+            text_widget.event_generate("<KeyRelease>", keysym=keysym)
+            self.render_now()
+            keystrokes.append(time.perf_counter() - start)
+        self.settle()
+        undos = []
+        while self.editor.history.undo_stack:
+            start = time.perf_counter()
+            self.editor.undo()
+            self.render_now()
+            undos.append(time.perf_counter() - start)
+        return {"keystroke": keystrokes, "undo": undos}
+
+    def open_file(self, size_mb):
+        path = os.path.join(self.workdir, f"open_{size_mb}mb.py")
+        block = self.source_lines(10000).encode("utf-8")
+        with open(path, "wb") as file:
+            for _ in range(size_mb * 1024 * 1024 // len(block) + 1):
+                file.write(block)
+        self.settle()
+        start = time.perf_counter()
+        self.editor.open_path(path)
+        self.pump(lambda: self.editor.current_file == path and not self.editor.buffer.loading)
+        results = {"open": [time.perf_counter() - start]}
+        if self.editor.large_file is not None:
+            view = self.editor.large_file
+            self.pump(lambda: view.done)
+            results["index"] = [time.perf_counter() - start]
+        return results
+
+    def make_tree(self, count):
+        path = os.path.join(self.workdir, f"tree_{count}")
+        os.makedirs(path)
+        for i in range(count):
+            if i % 100 == 0:
+                os.mkdir(os.path.join(path, f"dir_{i:06d}"))
+            else:
+                open(os.path.join(path, f"file_{i:06d}.txt"), "w").close()
+        return path
+
+    def tree(self, count):
+        path = self.make_tree(count)
+        os.chdir(path)
+        self.settle()
+        start = time.perf_counter()
+        self.editor.update_treeview()
+        self.root.update_idletasks()
+        results = {"cold": [time.perf_counter() - start], "refresh": [], "refresh_changed": []}
+        for i in range(10):
+            start = time.perf_counter()
+            self.editor.update_treeview()
+            self.root.update_idletasks()
+            results["refresh"].append(time.perf_counter() - start)
+            for j in range(count // 100):
+                open(os.path.join(path, f"new_{i}_{j}.txt"), "w").close()
+            start = time.perf_counter()
+            self.editor.update_treeview()
+            self.root.update_idletasks()
+            results["refresh_changed"].append(time.perf_counter() - start)
+        return results
+
+    def fs_storm(self, count):
+        path = os.path.join(self.workdir, "storm")
+        os.makedirs(path)
+        self.editor.change_directory(path)
+        if self.editor.directory_watcher is None:
+            self.editor.setup_directory_observer()
+        self.settle()
+        seen = set()
+
+        def listener(changes):
+            seen.update(changed for changed, kind in changes.items() if kind == "created")
+        self.editor.directory_listeners.append(listener)
+        start = time.perf_counter()
+        for i in range(count):
+            open(os.path.join(path, f"storm_{i:06d}.txt"), "w").close()
+        written = time.perf_counter() - start
+        self.pump(lambda: len(seen) >= count)
+        return {"write": [written], "settle": [time.perf_counter() - start]}
+
+    def search(self, lines):
+        self.load_buffer("value = foo(foo, 'foo')  # foo\n" * lines)
+        editor = self.editor
+        editor.search()
+        editor.search_entry.delete(0, tk.END)
+        editor.search_entry.insert(0, "foo")
+        self.settle()
+        start = time.perf_counter()
+        editor.start_search()
+        self.pump(lambda: editor.search_matches is not None)
+        results = {"search": [time.perf_counter() - start], "step": []}
+        for _ in range(100):
+            start = time.perf_counter()
+            editor.search_step(1)
+            self.root.update_idletasks()
+            results["step"].append(time.perf_counter() - start)
+        return results
+
+
+# name: (EditorBenchmark method, argument, included in --quick runs)
+BENCHMARK_SCENARIOS = {
+    "typing-1k": ("typing", 1000, True),
+    "typing-10k": ("typing", 10000, True),
+    "typing-100k": ("typing", 100000, False),
+    "open-1mb": ("open_file", 1, True),
+    "open-10mb": ("open_file", 10, True),
+    "open-100mb": ("open_file", 100, False),
+    "open-500mb": ("open_file", 500, False),
+    "tree-10k": ("tree", 10000, True),
+    "tree-100k": ("tree", 100000, False),
+    "fs-storm-10k": ("fs_storm", 10000, True),
+    "search-100k": ("search", 100000, True),
+}
+
+
+def summarize_samples(samples):
+    values = sorted(samples)
+    last = len(values) - 1
+    summary = {"count": len(values), "mean": sum(values) / len(values) * 1000, "max": values[-1] * 1000}
+    for label, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+        summary[label] = values[min(last, int(last * q + 0.5))] * 1000
+    return summary
+
+
+def run_benchmark_scenario(name):
+    # Child process side: run one scenario and print its results as JSON
+    import resource
+    import shutil
+    import tempfile
+    method, argument, _ = BENCHMARK_SCENARIOS[name]
+    workdir = tempfile.mkdtemp(prefix="icacode-bench-")
+    os.chdir(workdir)
+    root = tk.Tk()
+    root.geometry("1200x800")
+    editor = CodeEditor(root)
+    try:
+        benchmark = EditorBenchmark(editor, workdir)
+        benchmark.pump(lambda: editor.startup_tasks is None)
+        # Instrumentation is off by default; the heartbeat gives the main loop lag
+        monitor = editor.latency
+        monitor.install()
+        monitor.samples.pop(LatencyMonitor.LAG, None)
+        results = getattr(benchmark, method)(argument)
+        if LatencyMonitor.LAG in monitor.samples:
+            results["main_loop_lag"] = list(monitor.samples[LatencyMonitor.LAG])
+        report = {"metrics": {metric: summarize_samples(samples) for metric, samples in results.items() if samples},
+                  "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    finally:
+        os.chdir(os.path.expanduser("~"))
+        if editor.directory_watcher is not None:
+            editor.directory_watcher.observer.stop()
+        root.destroy()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report))
+
+
+def start_virtual_display():
+    # Start Xvfb when there is no display; returns the process or None
+    import shutil
+    import subprocess
+    if os.environ.get("DISPLAY") or sys.platform != "linux" or not shutil.which("Xvfb"):
+        return None
+    for number in range(99, 199):
+        if not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            break
+    process = subprocess.Popen(["Xvfb", f":{number}", "-screen", "0", "1600x1000x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1)
+    os.environ["DISPLAY"] = f":{number}"
+    return process
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    # Print p50/p95 changes against the baseline; returns the regressed metrics
+    regressions = []
+    print(f"{'scenario / metric':<36}{'base p50':>10}{'p50':>10}{'base p95':>10}{'p95':>10}", file=sys.stderr)
+    for name, report in results["scenarios"].items():
+        base_report = baseline.get("scenarios", {}).get(name)
+        if base_report is None or "metrics" not in report:
+            continue
+        for metric, summary in report["metrics"].items():
+            base = base_report["metrics"].get(metric)
+            if base is None:
+                continue
+            flag = ""
+            if summary["p50"] > base["p50"] * (1 + tolerance) or summary["p95"] > base["p95"] * (1 + tolerance):
+                flag = "  REGRESSION"
+                regressions.append(f"{name}/{metric}")
+            print(f"{name + ' / ' + metric:<36}{base['p50']:>10.2f}{summary['p50']:>10.2f}"
+                  f"{base['p95']:>10.2f}{summary['p95']:>10.2f}{flag}", file=sys.stderr)
+    return regressions
+
+
+def run_benchmarks(argv):
+    # python bench.py [--quick] [--scenarios PATTERN ...] [--output FILE]
+    #                 [--baseline FILE] [--tolerance 0.15]
+    import argparse
+    import platform
+    import subprocess
+    import tempfile
+    parser = argparse.ArgumentParser(prog="bench.py")
+    parser.add_argument("--quick", action="store_true", help="skip the largest scenarios")
+    parser.add_argument("--scenarios", nargs="*", default=["*"], help="glob patterns of scenarios to run")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before reporting a regression")
+    args = parser.parse_args(argv)
+    display = start_virtual_display()
+    results = {"python": platform.python_version(), "platform": platform.platform(),
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "scenarios": {}}
+    try:
+        with tempfile.TemporaryDirectory(prefix="icacode-bench-home-") as home:
+            # Children get an empty home so saved settings and caches don't skew the numbers
+            environment = dict(os.environ, HOME=home)
+            for name, (_, _, quick) in BENCHMARK_SCENARIOS.items():
+                if args.quick and not quick or not any(fnmatch.fnmatch(name, pattern) for pattern in args.scenarios):
+                    continue
+                print(f"running {name}...", file=sys.stderr)
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), "--scenario", name],
+                                       env=environment, capture_output=True, text=True)
+                if child.returncode != 0:
+                    results["scenarios"][name] = {"error": child.stderr.strip().splitlines()[-1:] or ["failed"]}
+                    print(child.stderr, file=sys.stderr)
+                    continue
+                results["scenarios"][name] = json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        if display is not None:
+            display.terminate()
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            regressions = compare_with_baseline(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions), file=sys.stderr)
+            return 1
+    return 0 if all("error" not in report for report in results["scenarios"].values()) else 1
+
+if __name__ == "__main__":
+    if "--scenario" in sys.argv:
+        run_benchmark_scenario(sys.argv[sys.argv.index("--scenario") + 1])
+        sys.exit(0)
+    sys.exit(run_benchmarks(sys.argv[1:]))
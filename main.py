@@ -1,63 +1,3257 @@
+import time
+# Start of the startup profile (--profile-startup); taken before the other imports
+STARTUP_BEGIN = time.perf_counter()
 import os
+import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinter import simpledialog
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import subprocess
+import re
+import mmap
+import array
+import bisect
+import itertools
+import threading
+import queue
+import collections
+import concurrent.futures
+import fnmatch
+import json
+import hashlib
+import zlib
+import codecs
+import signal
+import atexit
+
+# Find in files: files per worker task, results kept per file and in total
+FIND_CHUNK_FILES = 200
+FIND_MAX_FILE_MATCHES = 1000
+FIND_MAX_RESULTS = 10000
+# Diff gutter: delay after the last edit before rediffing, time allowed per
+# diff, ranges small enough for Myers directly and the edit distance it gives
+# up at (the range is then marked as modified as a whole)
+DIFF_DELAY = 150
+DIFF_TIME_BUDGET = 0.5
+DIFF_MYERS_LINES = 2000
+DIFF_MAX_EDITS = 500
+DIFF_COLORS = {"added": "#2EA043", "modified": "#1F6FEB", "deleted": "#D73A49"}
+# Symbol index: files per worker task and the largest file that is parsed
+SYMBOL_CHUNK_FILES = 100
+SYMBOL_MAX_FILE_SIZE = 2 * 1024 * 1024
+# Buffers are reparsed this many ms after the last edit
+SYMBOL_REPARSE_DELAY = 500
+# Symbol tagger language of each source file suffix
+SYMBOL_LANGUAGES = {".py": "python", ".pyw": "python", ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp",
+                    ".cxx": "cpp", ".hpp": "cpp", ".hh": "cpp", ".java": "java", ".cs": "csharp",
+                    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".ts": "javascript"}
+# Definitions found by the regex tagger: (kind, pattern matched against the
+# stripped line, group 1 is the name). Kinds in SYMBOL_SCOPES contain the
+# symbols declared inside their braces; "method" only counts inside one.
+CLIKE_FUNCTION = r"(?:[\w\[\]<>,.:?@*&]+\s+|[\w\]>]+[*&]+\s*)+\**&*(~?[\w:]*~?\w+)\s*\([^;{]*(?:\{|$)"
+SYMBOL_PATTERNS = {
+    "c": (("macro", r"#\s*define\s+(\w+)"),
+          ("class", r"(?:typedef\s+)?(?:struct|union|enum)\s+(\w+)\s*\{?\s*$"),
+          ("function", CLIKE_FUNCTION)),
+    "cpp": (("macro", r"#\s*define\s+(\w+)"),
+            ("class", r"(?:template\s*<.*>\s*)?(?:class|struct|union|enum(?:\s+class)?|namespace)\s+(\w+)\s*(?:final\s*)?(?::[^;]*)?\{?\s*$"),
+            ("function", CLIKE_FUNCTION)),
+    "java": (("class", r"(?:[\w@]+\s+)*(?:class|interface|enum|record|@interface)\s+(\w+)"),
+             ("method", CLIKE_FUNCTION)),
+    "csharp": (("class", r"(?:[\w\[\]]+\s+)*(?:class|interface|enum|struct|record|namespace)\s+([\w.]+)"),
+               ("method", CLIKE_FUNCTION)),
+    "javascript": (("class", r"(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(\w+)"),
+                   ("function", r"(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)"),
+                   ("function", r"(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|\w+\s*=>)"),
+                   ("method", r"(?:(?:public|private|protected|static|async|get|set|override|readonly)\s+)*\*?(\w+)\s*\([^)]*\)\s*(?::\s*[^{]+)?\{")),
+    "python": (("class", r"class\s+(\w+)"),
+               ("function", r"(?:async\s+)?def\s+(\w+)")),
+}
+SYMBOL_SCOPES = ("class",)
+# Statements that look like definitions to the function patterns
+SYMBOL_STOP_WORDS = frozenset("""if else for foreach while do switch case return new throw catch sizeof
+    using lock await typeof delete with when elif except yield""".split())
+
+
+def find_in_files(root, paths, query, regex, match_case, whole_word):
+    # Runs in a worker process: returns (path, line, column, text) for every
+    # matching line of the given files, skipping binary files
+    pattern = query.encode("utf-8") if regex else re.escape(query.encode("utf-8"))
+    if whole_word:
+        pattern = rb"\b(?:" + pattern + rb")\b"
+    compiled = re.compile(pattern, re.MULTILINE if match_case else re.MULTILINE | re.IGNORECASE)
+    results = []
+    for path in paths:
+        try:
+            with open(os.path.join(root, path), "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                if not size:
+                    continue
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if b"\0" in data[:8192]:
+                        continue
+                    line = 1
+                    counted = 0
+                    matches = 0
+                    position = 0
+                    while matches < FIND_MAX_FILE_MATCHES:
+                        match = compiled.search(data, position)
+                        if not match:
+                            break
+                        start = match.start()
+                        line_start = data.rfind(b"\n", 0, start) + 1
+                        line_end = data.find(b"\n", start)
+                        if line_end < 0:
+                            line_end = size
+                        line += data[counted:line_start].count(b"\n")
+                        counted = line_start
+                        text = data[line_start:min(line_end, line_start + 300)].decode("utf-8", errors="replace")
+                        column = len(data[line_start:start].decode("utf-8", errors="replace"))
+                        results.append((path, line, column, text))
+                        matches += 1
+                        # One result per line
+                        position = line_end + 1
+                        if position >= size:
+                            break
+        except (OSError, ValueError):
+            continue
+    return results
+
+
+def extract_symbols(language, text):
+    # (name, kind, line, column, container) of every definition in text
+    if language == "python":
+        try:
+            return python_symbols(text)
+        except (SyntaxError, ValueError, RecursionError):
+            # Half-typed code: fall back to the tagger
+            pass
+    patterns = SYMBOL_PATTERNS.get(language)
+    if patterns is None:
+        return []
+    symbols = []
+    scopes = []  # (brace depth or indentation, qualified name, opened, kind)
+    depth = 0
+    for line_number, line in enumerate(text.splitlines(), 1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith(("//", "/*", "*", "#")) and not stripped.startswith(("#define", "# define")):
+            continue
+        if language == "python":
+            depth = len(line) - len(line.lstrip())
+            while scopes and scopes[-1][0] >= depth:
+                scopes.pop()
+        else:
+            while scopes and scopes[-1][2] and scopes[-1][0] >= depth:
+                scopes.pop()
+        for kind, pattern in patterns:
+            match = re.match(pattern, stripped)
+            if match is None:
+                continue
+            name = match.group(1)
+            if kind in ("function", "method") and (name in SYMBOL_STOP_WORDS or stripped.split(None, 1)[0] in SYMBOL_STOP_WORDS):
+                continue
+            container = scopes[-1][1] if scopes else None
+            if kind == "function" and language == "python" and scopes and scopes[-1][3] == "class":
+                kind = "method"
+            if kind == "method" and container is None:
+                if language == "javascript":
+                    continue
+                kind = "function"
+            if "::" in name:
+                container, _, name = name.rpartition("::")
+            column = len(line) - len(line.lstrip()) + match.end(1) - len(name)
+            symbols.append((name, kind, line_number, column, container))
+            if kind in SYMBOL_SCOPES or language == "python":
+                scopes.append((depth, f"{container}.{name}" if container else name, language == "python", kind))
+            break
+        if language != "python":
+            depth += stripped.count("{") - stripped.count("}")
+            if scopes and depth > scopes[-1][0]:
+                scopes[-1] = scopes[-1][:2] + (True, scopes[-1][3])
+    return symbols
+
+
+def python_symbols(text):
+    import ast
+    symbols = []
+
+    def visit(body, container, in_class):
+        for node in body:
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                if isinstance(node, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if in_class else "function"
+                symbols.append((node.name, kind, node.lineno, node.col_offset, container))
+                visit(node.body, f"{container}.{node.name}" if container else node.name, kind == "class")
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                # Module and class attributes, not locals
+                if container is None or in_class:
+                    targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                    for target in targets:
+                        if isinstance(target, ast.Name):
+                            symbols.append((target.id, "variable", target.lineno, target.col_offset, container))
+            else:
+                for field in ("body", "orelse", "finalbody"):
+                    visit(getattr(node, field, ()), container, in_class)
+                for handler in getattr(node, "handlers", ()):
+                    visit(handler.body, container, in_class)
+    visit(ast.parse(text).body, None, False)
+    return symbols
+
+
+def index_symbol_files(root, paths):
+    # Runs in a worker process: (path, stat key, symbols) for every file, with
+    # a None key for files that are gone or too large
+    results = []
+    for path in paths:
+        full_path = os.path.join(root, path)
+        key = file_stat_key(full_path)
+        if key is None or key[1] > SYMBOL_MAX_FILE_SIZE:
+            results.append((path, None, []))
+            continue
+        try:
+            with open(full_path, "rb") as file:
+                text = file.read().decode("utf-8", errors="replace")
+        except OSError:
+            results.append((path, None, []))
+            continue
+        language = SYMBOL_LANGUAGES.get(os.path.splitext(path)[1].lower())
+        results.append((path, key, extract_symbols(language, text)))
+    return results
+
+
+# Output kept per run before the oldest chunks are dropped, and lines shown per run tab
+OUTPUT_BUFFER_LIMIT = 1024 * 1024
+OUTPUT_PANEL_LINES = 5000
+
+# Source suffixes compiled by the C/C++ run path
+C_SOURCE_SUFFIXES = (".c",)
+CPP_SOURCE_SUFFIXES = (".cpp", ".cc", ".cxx")
+
+THEMES = {
+    "Default": {"background": "#f0f0f0", "foreground": "#000000", "fieldbackground": "#f0f0f0", "selected": "#0078d4"},
+    "Dark": {"background": "#2E2E2E", "foreground": "#FFFFFF", "fieldbackground": "#2E2E2E", "selected": "#0078d4"},
+    "Green": {"background": "#00FF00", "foreground": "#000000", "fieldbackground": "#00FF00", "selected": "#0078d4"},
+    "Blue": {"background": "#0000FF", "foreground": "#FFFFFF", "fieldbackground": "#0000FF", "selected": "#0078d4"},
+    "Red": {"background": "#FF0000", "foreground": "#FFFFFF", "fieldbackground": "#FF0000", "selected": "#0078d4"},
+    "Purple": {"background": "#800080", "foreground": "#FFFFFF", "fieldbackground": "#800080", "selected": "#0078d4"},
+    "Orange": {"background": "#FFA500", "foreground": "#000000", "fieldbackground": "#FFA500", "selected": "#0078d4"}
+}
+
+# Per-user settings and caches
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".icacode")
+SETTINGS_PATH = os.path.join(CONFIG_DIR, "settings.json")
+PLUGINS_DIR = os.path.join(CONFIG_DIR, "plugins")
+JOURNAL_DIR = os.path.join(CONFIG_DIR, "journal")
+DEFAULT_SETTINGS = {
+    "watch_ignore_patterns": [".git", "__pycache__", "node_modules", "build", "dist", ".venv", "venv"],
+    "c_compiler": "gcc",
+    "cpp_compiler": "g++",
+    "c_flags": [],
+    "cpp_flags": [],
+    "link_flags": [],
+    "build_all_sources": False,
+    "build_cache_limit_mb": 512,
+    "buffer_cache_limit_mb": 64,
+    "undo_history_limit_mb": 16,
+    "plugin_hook_budget_ms": 5,
+    "latency_instrumentation": False,
+    "autosave_seconds": 5,
+    "diff_base": "head",
+}
+
+
+def file_stat_key(path):
+    # (mtime, size) used to tell whether a file changed on disk, or None
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def normalize_newlines(text):
+    # Universal newlines, as open(path, "r") reads them
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def write_file_atomically(path, content):
+    # Write a temporary file next to path and rename it over path, so a crash
+    # leaves either the old or the new contents; returns the new file_stat_key
+    import tempfile
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with open(descriptor, "w", encoding="utf-8") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            # mkstemp creates the file 0600; a new file gets the usual 0666 & ~umask
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        except OSError:
+            mode = None
+        if mode is not None:
+            try:
+                os.chmod(temp_path, mode)
+            except OSError:
+                pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return file_stat_key(path)
+
+
+def read_diff_base(path, use_head):
+    # Text of the Git HEAD version of path, or of the file on disk when it is
+    # not tracked or use_head is off; None if neither can be read
+    if use_head:
+        import subprocess
+        directory, name = os.path.split(path)
+        try:
+            result = subprocess.run(["git", "--no-optional-locks", "show", f"HEAD:./{name}"], cwd=directory,
+                                    capture_output=True)
+            if result.returncode == 0:
+                return normalize_newlines(result.stdout.decode("utf-8", errors="replace"))
+        except OSError:
+            pass
+    try:
+        with open(path, "rb") as file:
+            return normalize_newlines(file.read().decode("utf-8", errors="replace"))
+    except OSError:
+        return None
+
+
+def process_running(pid):
+    # Whether a process with this pid exists (its journals are still in use)
+    if os.name == "nt":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def scan_identifiers(path):
+    # Identifiers in one project file, or None when it can't be read
+    try:
+        if os.path.getsize(path) > IDENTIFIER_MAX_FILE_SIZE:
+            return None
+        with open(path, "rb") as source_file:
+            return frozenset(IDENTIFIER_PATTERN.findall(source_file.read().decode("utf-8", errors="replace")))
+    except OSError:
+        return None
+
+
+def load_settings():
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(SETTINGS_PATH, "r") as settings_file:
+            settings.update(json.load(settings_file))
+    except (OSError, ValueError):
+        pass
+    return settings
+
+
+def save_settings(settings):
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    with open(SETTINGS_PATH, "w") as settings_file:
+        json.dump(settings, settings_file, indent=4)
+
+
+# Keywords for each language in the Language menu
+LANGUAGE_KEYWORDS = {
+    "c": """auto break case char const continue default do double else enum extern float for goto if
+        inline int long register restrict return short signed sizeof static struct switch typedef union
+        unsigned void volatile while""",
+    "cpp": """alignas alignof and asm auto bool break case catch char class const constexpr const_cast
+        continue decltype default delete do double dynamic_cast else enum explicit export extern false
+        float for friend goto if inline int long mutable namespace new noexcept not nullptr operator or
+        private protected public register reinterpret_cast return short signed sizeof static
+        static_assert static_cast struct switch template this throw true try typedef typeid typename
+        union unsigned using virtual void volatile while""",
+    "csharp": """abstract as base bool break byte case catch char checked class const continue decimal
+        default delegate do double else enum event explicit extern false finally fixed float for
+        foreach goto if implicit in int interface internal is lock long namespace new null object
+        operator out override params private protected public readonly ref return sbyte sealed short
+        sizeof stackalloc static string struct switch this throw true try typeof uint ulong unchecked
+        unsafe ushort using var virtual void volatile while""",
+    "java": """abstract assert boolean break byte case catch char class const continue default do
+        double else enum extends false final finally float for goto if implements import instanceof
+        int interface long native new null package private protected public return short static
+        strictfp super switch synchronized this throw throws transient true try var void volatile
+        while""",
+    "javascript": """async await break case catch class const continue debugger default delete do else
+        export extends false finally for function if import in instanceof let new null of return
+        static super switch this throw true try typeof undefined var void while with yield""",
+    "python": """False None True and as assert async await break class continue def del elif else
+        except finally for from global if import in is lambda nonlocal not or pass raise return try
+        while with yield""",
+}
+
+# Comment and string delimiters for each language
+LANGUAGE_SYNTAX = {
+    "c": {"line_comment": "//", "block_comment": ("/*", "*/"), "multiline_strings": ()},
+    "cpp": {"line_comment": "//", "block_comment": ("/*", "*/"), "multiline_strings": ()},
+    "csharp": {"line_comment": "//", "block_comment": ("/*", "*/"), "multiline_strings": ()},
+    "java": {"line_comment": "//", "block_comment": ("/*", "*/"), "multiline_strings": ('"""',)},
+    "javascript": {"line_comment": "//", "block_comment": ("/*", "*/"), "multiline_strings": ("`",)},
+    "python": {"line_comment": "#", "block_comment": None, "multiline_strings": ('"""', "'''")},
+}
+
+# Files at least this big are opened read-only through mmap, LARGE_FILE_WINDOW lines at a time
+LARGE_FILE_THRESHOLD = 16 * 1024 * 1024
+LARGE_FILE_WINDOW = 2000
+# Files are inserted into the Text widget in chunks of about this many characters
+FILE_LOAD_CHUNK = 256 * 1024
+# Directory children are added to the tree this many at a time
+TREE_PAGE_SIZE = 1000
+# Item id prefixes for the dummy child that makes a directory expandable and
+# for the "... more" item at the end of a partially loaded directory
+TREE_PLACEHOLDER = "placeholder:"
+TREE_MORE = "more:"
+# A Git status update re-queries the changed paths, or the whole repository
+# when more than this many changed at once
+GIT_STATUS_MAX_PATHS = 256
+# Tree tag and color of each Git state
+GIT_TAGS = {"modified": ("git_modified", "#C06000"), "added": ("git_added", "#2E8B2E"),
+            "untracked": ("git_untracked", "#2E8B2E"), "ignored": ("git_ignored", "#909090"),
+            "conflict": ("git_conflict", "#D00000")}
+
+SYNTAX_TAGS = ("syntax_keyword", "syntax_string", "syntax_comment", "syntax_number")
+
+# Built-in snippets; ~/.icacode/snippets/<language>.json adds to or overrides them
+DEFAULT_SNIPPETS = {
+    "python": {
+        "if": "if condition:\n    # code",
+        "for": "for item in iterable:\n    # code",
+        "print": "print('Hello, World!')",
+        "def": "def funcname(etc):\n    #code",
+        "elif": "elif condition:\n    #code",
+        "else": "else:    #code",
+        "import": "import lib",
+        "from": "from lib import item",
+        "pygame": "import pygame as pg\nfrom pygame.locals import *\nimport sys\n",
+        "pygameinit": "pg.init()\n",
+        "pygamedrawrect": "pg.draw.rect(screenname, (r,g,b), (posx,posy,sizex,sizey))",
+        "pygamedrawcircle": "pg.draw.circle(screenname, (r,g,b), (posx,posy), radius",
+        "pygamescreen": "pg.display.set_mode((width,height))",
+        "pygamecaption": "pg.display.set_caption('window name')",
+    },
+    "javascript": {
+        "if": "if (condition) {\n    // code\n}",
+        "for": "for (let i = 0; i < array.length; i++) {\n    // code\n}",
+        "console.log": "console.log('Hello, World!');",
+    },
+}
+SNIPPETS_DIR = os.path.join(CONFIG_DIR, "snippets")
+
+# Identifiers offered by completion and the project files they are collected from
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+IDENTIFIER_SOURCE_SUFFIXES = (".py", ".js", ".ts", ".c", ".h", ".cpp", ".hpp", ".cc", ".cxx", ".cs", ".java")
+IDENTIFIER_MAX_FILE_SIZE = 1024 * 1024
+COMPLETION_LIMIT = 15
+
+
+class SyntaxTokenizer:
+    # Line-by-line lexer. The state carried between lines is the closing
+    # delimiter of an unterminated block comment or multi-line string, or None.
+    def __init__(self, language):
+        syntax = LANGUAGE_SYNTAX[language]
+        self.keywords = frozenset(LANGUAGE_KEYWORDS[language].split())
+        self.block_comment = syntax["block_comment"]
+        parts = []
+        if self.block_comment:
+            parts.append("(?P<block>%s)" % re.escape(self.block_comment[0]))
+        parts.append("(?P<comment>%s.*)" % re.escape(syntax["line_comment"]))
+        if syntax["multiline_strings"]:
+            parts.append("(?P<mstring>%s)" % "|".join(re.escape(d) for d in syntax["multiline_strings"]))
+        parts.append(r"""(?P<string>"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?)""")
+        parts.append(r"(?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\w*)")
+        parts.append(r"(?P<ident>[A-Za-z_]\w*)")
+        self.pattern = re.compile("|".join(parts))
+
+    def find_closer(self, line, closer, pos):
+        # Find the end of a block comment or multi-line string, skipping escaped quotes
+        while True:
+            index = line.find(closer, pos)
+            if index < 0 or closer == "*/":
+                return index
+            backslashes = 0
+            while index - backslashes > 0 and line[index - backslashes - 1] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return index
+            pos = index + 1
+
+    def tokenize_line(self, line, state):
+        tokens = []
+        pos = 0
+        length = len(line)
+        while pos < length:
+            if state is not None:
+                tag = "syntax_comment" if state == "*/" else "syntax_string"
+                end = self.find_closer(line, state, pos)
+                if end < 0:
+                    tokens.append((tag, pos, length))
+                    return tokens, state
+                end += len(state)
+                tokens.append((tag, pos, end))
+                pos = end
+                state = None
+                continue
+
+            match = self.pattern.search(line, pos)
+            if not match:
+                break
+            kind = match.lastgroup
+            start, end = match.span()
+            if kind == "block":
+                state = self.block_comment[1]
+                tokens.append(("syntax_comment", start, end))
+            elif kind == "mstring":
+                state = match.group()
+                tokens.append(("syntax_string", start, end))
+            elif kind == "comment":
+                tokens.append(("syntax_comment", start, end))
+            elif kind == "string":
+                tokens.append(("syntax_string", start, end))
+            elif kind == "number":
+                tokens.append(("syntax_number", start, end))
+            elif match.group() in self.keywords:
+                tokens.append(("syntax_keyword", start, end))
+            pos = end
+        return tokens, state
+
+
+class TextChangeHook:
+    # Intercepts the insert/delete commands of a Text widget at the Tcl level so
+    # listeners see every modification, whether it comes from typing or from code.
+    # Listeners are called as listener(kind, start, end, text) after the change,
+    # with "line.col" indices as they were before the change.
+    def __init__(self, widget):
+        self.widget = widget
+        self.listeners = []
+        self.orig = widget._w + "_orig"
+        widget.tk.call("rename", widget._w, self.orig)
+        widget.tk.createcommand(widget._w, self.dispatch)
+
+    def call(self, *args):
+        return self.widget.tk.call((self.orig,) + args)
+
+    def dispatch(self, operation, *args):
+        try:
+            if operation in ("insert", "delete", "replace") and self.call("cget", "-state") == "disabled":
+                return ""
+            if operation == "insert" and len(args) >= 2:
+                return self.insert(args)
+            if operation == "delete" and 1 <= len(args) <= 2:
+                return self.delete(args)
+            if operation == "replace" and len(args) >= 3:
+                start = self.call("index", args[0])
+                self.delete(args[:2])
+                return self.insert((start,) + args[2:])
+            return self.call(operation, *args)
+        except tk.TclError:
+            return ""
+
+    def insert(self, args):
+        start = self.call("index", args[0])
+        if self.call("compare", start, "==", "end"):
+            start = self.call("index", "end-1c")
+        chars = "".join(args[1::2])
+        result = self.call("insert", start, *args[1:])
+        if chars:
+            line, col = map(int, start.split("."))
+            newlines = chars.count("\n")
+            if newlines:
+                end = "%d.%d" % (line + newlines, len(chars) - chars.rfind("\n") - 1)
+            else:
+                end = "%d.%d" % (line, col + len(chars))
+            self.notify("insert", start, end, chars)
+        return result
+
+    def delete(self, args):
+        start = self.call("index", args[0])
+        if len(args) > 1:
+            end = self.call("index", args[1])
+        else:
+            end = self.call("index", start + "+1c")
+        if self.call("compare", end, ">", "end-1c"):
+            end = self.call("index", "end-1c")
+        if not self.call("compare", start, "<", end):
+            return ""
+        chars = self.call("get", start, end)
+        result = self.call("delete", start, end)
+        self.notify("delete", start, end, chars)
+        return result
+
+    def notify(self, kind, start, end, text):
+        monitor = LatencyMonitor.active
+        for listener in self.listeners:
+            if monitor is None:
+                listener(kind, start, end, text)
+            else:
+                monitor.call(listener, (kind, start, end, text))
+
+
+class SyntaxHighlighter:
+    # Keeps the lexer state at the end of every line and re-lexes only from the
+    # first edited line until the states match the ones from before the edit.
+    # Tags are only applied to the lines around the visible part of the widget.
+    UNKNOWN = object()
+    VIEWPORT_MARGIN = 50
+    EDIT_DELAY = 30
+    SCROLL_DELAY = 10
+    LEX_CHUNK = 500
+
+    def __init__(self, text_widget):
+        self.text_widget = text_widget
+        self.tokenizer = None
+        self.after_id = None
+        self.reset()
+
+    def line_count(self):
+        return int(self.text_widget.index("end-1c").split(".")[0])
+
+    def reset(self):
+        total = self.line_count()
+        self.line_states = [self.UNKNOWN] * total
+        self.tagged_states = [self.UNKNOWN] * total
+        self.valid_upto = 0
+        self.lexed_upto = 0
+        self.converge_from = 0
+        for tag in SYNTAX_TAGS:
+            self.text_widget.tag_remove(tag, "1.0", tk.END)
+
+    def set_language(self, language, keyword_style):
+        self.tokenizer = SyntaxTokenizer(language) if language in LANGUAGE_SYNTAX else None
+        self.keyword_style = keyword_style
+        self.configure_tags()
+        self.reset()
+        self.schedule_render(0)
+
+    def configure_tags(self):
+        foreground, font = self.keyword_style
+        self.text_widget.tag_configure("syntax_keyword", foreground=foreground, font=font)
+        self.text_widget.tag_configure("syntax_string", foreground="#A31515")
+        self.text_widget.tag_configure("syntax_comment", foreground="#808080")
+        self.text_widget.tag_configure("syntax_number", foreground="#098658")
+
+    def detach(self):
+        # The widget is about to be destroyed; the line states are kept
+        if self.after_id is not None:
+            self.text_widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def attach(self, text_widget):
+        # Move to a new widget holding the same text; only the tags are redone
+        self.text_widget = text_widget
+        self.configure_tags()
+        self.tagged_states = [self.UNKNOWN] * len(self.line_states)
+        self.schedule_render(0)
+
+    def on_change(self, kind, start, end, text):
+        first = int(start.split(".")[0]) - 1
+        if kind == "insert":
+            old_count, new_count = 1, 1 + text.count("\n")
+        else:
+            old_count, new_count = int(end.split(".")[0]) - first, 1
+        replacement = [self.UNKNOWN] * new_count
+        self.line_states[first:first + old_count] = replacement
+        self.tagged_states[first:first + old_count] = replacement
+        self.valid_upto = min(self.valid_upto, first)
+        if self.lexed_upto >= first + old_count:
+            self.lexed_upto += new_count - old_count
+        else:
+            self.lexed_upto = min(self.lexed_upto, first)
+        if self.converge_from > first:
+            self.converge_from = max(self.converge_from + new_count - old_count, first + new_count)
+        else:
+            self.converge_from = first + new_count
+        self.schedule_render(self.EDIT_DELAY)
+
+    def on_view_changed(self):
+        if self.after_id is None:
+            self.schedule_render(self.SCROLL_DELAY)
+
+    def schedule_render(self, delay):
+        # Bursts of keystrokes keep pushing the render back
+        if self.after_id is not None:
+            self.text_widget.after_cancel(self.after_id)
+        self.after_id = self.text_widget.after(delay, self.render)
+
+    def get_lines(self, first, last):
+        # Lines first..last-1 (0-based) in one round trip to Tk
+        return self.text_widget.get("%d.0" % (first + 1), "%d.end" % last).split("\n")
+
+    def ensure_states(self, last):
+        # Lex forward from the first stale line until `last` is covered or the
+        # state converges with the one recorded before the edit. Lines past
+        # lexed_upto were never lexed, so they can't converge.
+        total = len(self.line_states)
+        while self.valid_upto <= last and self.valid_upto < total:
+            i = self.valid_upto
+            converged = False
+            for line in self.get_lines(i, min(i + self.LEX_CHUNK, total)):
+                state = self.line_states[i - 1] if i else None
+                old = self.line_states[i]
+                new = self.tokenizer.tokenize_line(line, state)[1]
+                self.line_states[i] = new
+                i += 1
+                if old is not self.UNKNOWN and new == old and i > self.converge_from:
+                    converged = True
+                    break
+            self.lexed_upto = max(self.lexed_upto, i)
+            if converged:
+                self.valid_upto = self.lexed_upto
+                self.converge_from = 0
+            else:
+                self.valid_upto = i
+
+    def visible_lines(self):
+        top = int(self.text_widget.index("@0,0").split(".")[0]) - 1
+        bottom = self.text_widget.index("@0,%d" % self.text_widget.winfo_height())
+        bottom = int(bottom.split(".")[0]) - 1
+        return top, bottom
+
+    def render(self):
+        self.after_id = None
+        total = len(self.line_states)
+        if self.tokenizer is None or total != self.line_count():
+            if total != self.line_count():
+                self.reset()
+            return
+
+        top, bottom = self.visible_lines()
+        first = max(0, top - self.VIEWPORT_MARGIN)
+        last = min(total - 1, bottom + self.VIEWPORT_MARGIN)
+        self.ensure_states(last)
+
+        ranges = {tag: [] for tag in SYNTAX_TAGS}
+        stale_runs = []
+        for offset, line in enumerate(self.get_lines(first, last + 1)):
+            i = first + offset
+            state = self.line_states[i - 1] if i else None
+            if self.tagged_states[i] is not self.UNKNOWN and self.tagged_states[i] == state:
+                continue
+            self.tagged_states[i] = state
+            if stale_runs and stale_runs[-1][1] == i:
+                stale_runs[-1][1] = i + 1
+            else:
+                stale_runs.append([i, i + 1])
+            for tag, start, end in self.tokenizer.tokenize_line(line, state)[0]:
+                ranges[tag].extend(("%d.%d" % (i + 1, start), "%d.%d" % (i + 1, end)))
+
+        for run_start, run_end in stale_runs:
+            for tag in SYNTAX_TAGS:
+                self.text_widget.tag_remove(tag, "%d.0" % (run_start + 1), "%d.end" % run_end)
+        for tag, indices in ranges.items():
+            if indices:
+                self.text_widget.tag_add(tag, *indices)
+
+
+class Document:
+    # Piece table mirroring the contents of the Text widget. The original text
+    # and every inserted run stay immutable, so a snapshot only copies the
+    # piece list and can be read from another thread.
+    MAX_ADD_CHUNK = 4096
+
+    def __init__(self, text=""):
+        self.load(text)
+
+    def load(self, text):
+        self.buffers = [text]
+        self.pieces = [(0, 0, len(text), text.count("\n"))] if text else []
+        self.length = len(text)
+
+    def newline_count(self):
+        return sum(piece[3] for piece in self.pieces)
+
+    def locate(self, offset):
+        # Index of the piece containing offset and the offset inside it
+        position = 0
+        for index, piece in enumerate(self.pieces):
+            if offset < position + piece[2]:
+                return index, offset - position
+            position += piece[2]
+        return len(self.pieces), 0
+
+    def offset_of(self, line, col):
+        # Convert a 1-based line and 0-based column into a character offset
+        newlines = line - 1
+        position = 0
+        for buffer_index, start, length, count in self.pieces:
+            if newlines <= 0:
+                break
+            if count < newlines:
+                newlines -= count
+                position += length
+                continue
+            buffer = self.buffers[buffer_index]
+            index = start
+            for _ in range(newlines):
+                index = buffer.index("\n", index) + 1
+            position += index - start
+            newlines = 0
+            break
+        return position + col
+
+    def add_text(self, text):
+        # Append to the last add buffer while it is small so typing runs share
+        # one buffer instead of creating a buffer per keystroke
+        last = len(self.buffers) - 1
+        if last > 0 and len(self.buffers[last]) + len(text) <= self.MAX_ADD_CHUNK:
+            start = len(self.buffers[last])
+            self.buffers[last] = self.buffers[last] + text
+            return last, start
+        self.buffers.append(text)
+        return len(self.buffers) - 1, 0
+
+    def insert(self, offset, text):
+        if not text:
+            return
+        buffer_index, start = self.add_text(text)
+        new_piece = (buffer_index, start, len(text), text.count("\n"))
+        index, inner = self.locate(offset)
+        if inner == 0 and index > 0:
+            # Extend the previous piece when the text continues it in the same buffer
+            prev = self.pieces[index - 1]
+            if prev[0] == buffer_index and prev[1] + prev[2] == start:
+                self.pieces[index - 1] = (prev[0], prev[1], prev[2] + len(text), prev[3] + new_piece[3])
+                self.length += len(text)
+                return
+        if inner == 0:
+            self.pieces.insert(index, new_piece)
+        else:
+            self.pieces[index:index + 1] = [self.make_piece(*self.pieces[index][:2], inner),
+                                            new_piece,
+                                            self.make_piece(self.pieces[index][0],
+                                                            self.pieces[index][1] + inner,
+                                                            self.pieces[index][2] - inner)]
+        self.length += len(text)
+
+    def make_piece(self, buffer_index, start, length):
+        return (buffer_index, start, length, self.buffers[buffer_index].count("\n", start, start + length))
+
+    def delete(self, offset, length):
+        if length <= 0:
+            return
+        end = offset + length
+        first, first_inner = self.locate(offset)
+        last, last_inner = self.locate(end)
+        replacement = []
+        if first_inner:
+            piece = self.pieces[first]
+            replacement.append(self.make_piece(piece[0], piece[1], first_inner))
+        if last < len(self.pieces) and last_inner:
+            piece = self.pieces[last]
+            replacement.append(self.make_piece(piece[0], piece[1] + last_inner, piece[2] - last_inner))
+            last += 1
+        self.pieces[first:last] = replacement
+        self.length -= length
+
+    def on_change(self, kind, start, end, text):
+        # TextChangeHook listener keeping the piece table in sync with the widget
+        line, col = map(int, start.split("."))
+        offset = self.offset_of(line, col)
+        if kind == "insert":
+            self.insert(offset, text)
+        else:
+            self.delete(offset, len(text))
+
+    def snapshot(self):
+        return DocumentSnapshot(list(self.buffers), list(self.pieces))
+
+    def text(self):
+        return self.snapshot().text()
+
+
+class DocumentSnapshot:
+    def __init__(self, buffers, pieces):
+        self.buffers = buffers
+        self.pieces = pieces
+
+    def text(self):
+        return "".join(self.buffers[b][start:start + length] for b, start, length, _ in self.pieces)
+
+
+class EditHistory:
+    # Undo/redo as a list of edit groups. Each edit is (kind, start, end, text)
+    # with Tk indices, so undoing only touches the affected range. Typing and
+    # backspacing runs are coalesced, and the oldest groups are dropped once the
+    # recorded text exceeds memory_limit characters.
+    def __init__(self, text_widget, memory_limit=16 * 1024 * 1024):
+        self.text_widget = text_widget
+        self.memory_limit = memory_limit
+        self.undo_stack = []
+        self.redo_stack = []
+        self.memory = 0
+        self.replaying = False
+        self.group_open = False
+
+    def clear(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.memory = 0
+        self.group_open = False
+
+    def on_change(self, kind, start, end, text):
+        if self.replaying:
+            return
+        if self.redo_stack:
+            self.memory -= sum(len(edit[3]) for group in self.redo_stack for edit in group)
+            self.redo_stack = []
+        if not self.coalesce(kind, start, end, text):
+            edit = (kind, start, end, text)
+            if self.group_open and self.undo_stack:
+                self.undo_stack[-1].append(edit)
+            else:
+                self.undo_stack.append([edit])
+        self.memory += len(text)
+        if not self.group_open:
+            # Every change made in the same Tk event (e.g. a paste replacing the
+            # selection) ends up in one group
+            self.group_open = True
+            self.text_widget.after_idle(self.close_group)
+        self.evict()
+
+    def close_group(self):
+        self.group_open = False
+
+    def coalesce(self, kind, start, end, text):
+        if not self.undo_stack or "\n" in text:
+            return False
+        group = self.undo_stack[-1]
+        last_kind, last_start, last_end, last_text = group[-1]
+        if last_kind != kind or "\n" in last_text or len(group) > 1:
+            return False
+        if kind == "insert" and start == last_end:
+            # Break runs at word boundaries so undo removes a word at a time
+            if text.isspace() and not last_text[-1].isspace():
+                return False
+            group[-1] = (kind, last_start, end, last_text + text)
+            return True
+        if kind == "delete" and end == last_start:
+            group[-1] = (kind, start, last_end, text + last_text)
+            return True
+        if kind == "delete" and start == last_start:
+            line, col = start.split(".")
+            group[-1] = (kind, start, "%s.%d" % (line, int(col) + len(last_text) + len(text)), last_text + text)
+            return True
+        return False
+
+    def evict(self):
+        while self.memory > self.memory_limit and len(self.undo_stack) > 1:
+            group = self.undo_stack.pop(0)
+            self.memory -= sum(len(edit[3]) for edit in group)
+
+    def apply(self, group, reverse):
+        self.replaying = True
+        try:
+            edits = reversed(group) if reverse else group
+            for kind, start, end, text in edits:
+                if (kind == "insert") == reverse:
+                    self.text_widget.delete(start, end)
+                    position = start
+                else:
+                    self.text_widget.insert(start, text)
+                    position = self.text_widget.index("%s+%dc" % (start, len(text)))
+            self.text_widget.mark_set(tk.INSERT, position)
+            self.text_widget.see(tk.INSERT)
+        finally:
+            self.replaying = False
+            self.group_open = False
+
+    def undo(self):
+        if self.undo_stack:
+            group = self.undo_stack.pop()
+            self.apply(group, reverse=True)
+            self.redo_stack.append(group)
+
+    def redo(self):
+        if self.redo_stack:
+            group = self.redo_stack.pop()
+            self.apply(group, reverse=False)
+            self.undo_stack.append(group)
+
+
+class LargeFileView:
+    # Read-only view of a big file through mmap. A background thread records the
+    # offset of every INDEX_STEP-th line, so any line can be found with a short
+    # scan and only a window of lines ever has to be decoded.
+    INDEX_STEP = 64
+    INDEX_CHUNK = 4 * 1024 * 1024
+    SEARCH_CHUNK = 1024 * 1024
+
+    def __init__(self, path, on_progress=None):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.sparse_index = array.array("q", [0])
+        self.indexed_lines = 0
+        self.indexed_offset = 0
+        self.done = False
+        self.closed = False
+        self.on_progress = on_progress
+        self.searches = []
+        self.thread = threading.Thread(target=self.build_index, daemon=True)
+        self.thread.start()
+
+    def build_index(self):
+        step = self.INDEX_STEP
+        position = 0
+        lines = 0
+        while position < self.size and not self.closed:
+            block = self.mmap[position:position + self.INDEX_CHUNK]
+            cut = block.rfind(b"\n")
+            if cut >= 0 and position + len(block) < self.size:
+                block = block[:cut + 1]
+            starts = itertools.accumulate((len(line) + 1 for line in block.split(b"\n")[:-1]), initial=0)
+            # The first start of the block was recorded by the previous block
+            next(starts)
+            for start in starts:
+                lines += 1
+                if lines % step == 0:
+                    self.sparse_index.append(position + start)
+            position += len(block)
+            self.indexed_offset = position
+            self.indexed_lines = lines
+            if self.on_progress:
+                self.on_progress(self)
+        if self.size and self.mmap[self.size - 1:self.size] != b"\n":
+            lines += 1
+        self.indexed_lines = max(lines, 1)
+        self.done = True
+        if self.on_progress:
+            self.on_progress(self)
+
+    def line_offset(self, line):
+        # Byte offset of a 0-based line, or None if it is not indexed yet
+        if line > self.indexed_lines:
+            return None
+        if self.done and line == self.indexed_lines:
+            return self.size
+        offset = self.sparse_index[line // self.INDEX_STEP]
+        for _ in range(line % self.INDEX_STEP):
+            offset = self.mmap.find(b"\n", offset) + 1
+        return offset
+
+    def line_of_offset(self, offset):
+        block = bisect.bisect_right(self.sparse_index, offset) - 1
+        start = self.sparse_index[block]
+        return block * self.INDEX_STEP + self.mmap[start:offset].count(b"\n")
+
+    def read_lines(self, first, count):
+        start = self.line_offset(first)
+        if start is None:
+            return ""
+        end = self.line_offset(min(first + count, self.indexed_lines))
+        data = self.mmap[start:end]
+        if data.endswith(b"\n"):
+            data = data[:-1]
+        return data.decode("utf-8", errors="replace")
+
+    def search(self, pattern, start=0, end=None, is_cancelled=None):
+        # (start, end) byte offsets of the first non-empty match of a bytes
+        # pattern in [start, end), or None. The mmap is scanned a few whole
+        # lines at a time so a search can be cancelled between chunks; a match
+        # cannot span a chunk boundary.
+        end = self.size if end is None else end
+        position = start
+        while position < end:
+            if self.closed or (is_cancelled and is_cancelled()):
+                return None
+            stop = min(position + self.SEARCH_CHUNK, end)
+            if stop < end:
+                newline = self.mmap.find(b"\n", stop, end)
+                stop = end if newline < 0 else newline + 1
+            for match in pattern.finditer(self.mmap, position, stop):
+                if match.end() > match.start():
+                    return match.span()
+            position = stop
+        return None
+
+    def search_async(self, pattern, start, callback, is_cancelled):
+        # Searches from start to the end of the file and then wraps around, on
+        # a worker thread. callback(span) is called there unless cancelled.
+        def work():
+            span = self.search(pattern, start, is_cancelled=is_cancelled)
+            if span is None and start > 0 and not self.closed:
+                # Up to the end of the line of start, so the match the search
+                # started from is found again when it is the only one
+                newline = self.mmap.find(b"\n", start)
+                span = self.search(pattern, 0, self.size if newline < 0 else newline + 1, is_cancelled)
+            if not self.closed and not is_cancelled():
+                callback(span)
+        self.searches = [thread for thread in self.searches if thread.is_alive()]
+        thread = threading.Thread(target=work, daemon=True)
+        self.searches.append(thread)
+        thread.start()
+
+    def close(self):
+        self.closed = True
+        self.thread.join()
+        # The mmap cannot be closed while a search is still reading it
+        for thread in self.searches:
+            thread.join()
+        if self.size:
+            self.mmap.close()
+        self.file.close()
+
+
+class FileLoader:
+    # Reads and decodes files on worker threads. Only the most recent request()
+    # is delivered; a newer one cancels it, and a read that had already been
+    # queued is skipped. Recently read and prefetched files are kept in a small
+    # LRU cache validated by mtime and size, and a file is only read by one
+    # worker at a time.
+    LARGE = object()
+
+    def __init__(self, call_soon, cache_limit=32 * 1024 * 1024):
+        self.call_soon = call_soon
+        self.cache_limit = cache_limit
+        self.cache = collections.OrderedDict()
+        self.cache_size = 0
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.generation = 0
+        self.pending = None
+        # path -> Event set when its read finishes, and path -> queued prefetch
+        self.reading = {}
+        self.prefetching = {}
+
+    def read(self, path):
+        stat = os.stat(path)
+        if stat.st_size >= LARGE_FILE_THRESHOLD:
+            return self.LARGE
+        key = (stat.st_mtime_ns, stat.st_size)
+        while True:
+            with self.lock:
+                cached = self.cache.get(path)
+                if cached is not None and cached[0] == key:
+                    self.cache.move_to_end(path)
+                    return cached[1]
+                reading = self.reading.get(path)
+                if reading is None:
+                    reading = self.reading[path] = threading.Event()
+                    break
+            # Another worker is reading it: take its result from the cache
+            reading.wait()
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            try:
+                content = normalize_newlines(data.decode("utf-8"))
+            except UnicodeDecodeError as e:
+                # Replacing the bad bytes would destroy them on the next save
+                raise ValueError(f"not UTF-8 text (invalid byte at offset {e.start})") from None
+            self.store(path, key, content)
+        finally:
+            with self.lock:
+                del self.reading[path]
+            reading.set()
+        return content
+
+    def store(self, path, key, content):
+        with self.lock:
+            if path in self.cache:
+                self.cache_size -= len(self.cache.pop(path)[1])
+            self.cache[path] = (key, content)
+            self.cache_size += len(content)
+            while self.cache_size > self.cache_limit and len(self.cache) > 1:
+                self.cache_size -= len(self.cache.popitem(last=False)[1][1])
+
+    def read_async(self, path, callback, generation=None):
+        # callback(path, content, error) runs on the Tk main loop. With a
+        # generation the read is skipped once a newer request() was made.
+        def work():
+            if generation is not None and generation != self.generation:
+                return
+            try:
+                content = self.read(path)
+            except Exception as e:
+                self.call_soon(callback, path, None, e)
+            else:
+                self.call_soon(callback, path, content, None)
+        return self.executor.submit(work)
+
+    def request(self, path, callback):
+        self.cancel()
+        generation = self.generation
+
+        def deliver(path, content, error):
+            if generation == self.generation:
+                callback(path, content, error)
+        self.pending = self.read_async(path, deliver, generation)
+
+    def cancel(self):
+        # Drop the pending request and the read-ahead queued around it
+        self.generation += 1
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+        with self.lock:
+            for path, future in list(self.prefetching.items()):
+                if future.cancel():
+                    del self.prefetching[path]
+
+    def prefetch(self, paths):
+        for path in paths:
+            with self.lock:
+                if path in self.cache or path in self.reading or path in self.prefetching:
+                    continue
+                self.prefetching[path] = self.executor.submit(self.prefetch_one, path)
+
+    def prefetch_one(self, path):
+        try:
+            self.read(path)
+        except Exception:
+            pass
+        finally:
+            with self.lock:
+                self.prefetching.pop(path, None)
+
+
+class DirectoryWatcher:
+    # watchdog watches on the tree, planned so the ignored directories are never
+    # entered: a subtree without ignored directories gets one recursive watch,
+    # a directory holding one gets a non-recursive watch of its own. Watches
+    # are planned and (un)scheduled on a daemon thread, as inotify registers a
+    # recursive watch by walking the tree. Events arrive on the watchdog thread
+    # and are only recorded there, coalesced per path; the Tk main loop is
+    # asked to flush them once DEBOUNCE ms have passed.
+    DEBOUNCE = 200
+
+    def __init__(self, root, call_soon, on_changes, ignore_patterns):
+        self.root = root
+        self.call_soon = call_soon
+        self.on_changes = on_changes
+        self.ignore_patterns = list(ignore_patterns)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flush_scheduled = False
+        self.path = None
+        # Only used on the scheduling thread: directory -> ObservedWatch
+        self.watches = {}
+        self.jobs = queue.Queue()
+        # watchdog takes a noticeable part of the startup time to import
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+        self.event_handler = FileSystemEventHandler()
+        self.event_handler.on_any_event = self.handle_event
+        self.observer = Observer()
+        self.observer.start()
+        threading.Thread(target=self.run_jobs, daemon=True).start()
+
+    def watch_path(self, path):
+        # Move the watches to a new root directory
+        if path == self.path:
+            return
+        self.path = path
+        with self.lock:
+            self.pending.clear()
+        self.jobs.put((self.rewatch, path))
+
+    def set_ignore_patterns(self, patterns):
+        self.ignore_patterns = list(patterns)
+        if self.path is not None:
+            self.jobs.put((self.rewatch, self.path))
+
+    def run_jobs(self):
+        while True:
+            job, path = self.jobs.get()
+            try:
+                job(path)
+            except Exception as e:
+                print(f"[watcher] {job.__name__} failed: {e}", file=sys.stderr)
+
+    def rewatch(self, root):
+        # Scheduling thread: drop every watch and cover the new root
+        self.remove_watches(None)
+        self.add_watches(root, root)
+
+    def plan_watches(self, root, top):
+        # [(directory, recursive)] covering top without entering ignored directories
+        parents = {top: None}
+        dirty = set()
+        for directory, subdirectories, _ in os.walk(top):
+            if self.path != root:
+                return []
+            kept = [name for name in subdirectories if not self.is_ignored_name(name)]
+            ancestor = directory if len(kept) < len(subdirectories) else None
+            while ancestor is not None and ancestor not in dirty:
+                dirty.add(ancestor)
+                ancestor = parents[ancestor]
+            subdirectories[:] = kept
+            for name in kept:
+                parents[os.path.join(directory, name)] = directory
+        return [(directory, directory in dirty) for directory, parent in parents.items()
+                if directory in dirty or parent is None or parent in dirty]
+
+    def add_watches(self, root, top):
+        for directory, has_ignored in self.plan_watches(root, top):
+            try:
+                self.watches[directory] = self.observer.schedule(self.event_handler, path=directory,
+                                                                 recursive=not has_ignored)
+            except OSError:
+                # Gone already, or out of watches
+                pass
+
+    def remove_watches(self, top):
+        # Unschedule the watches on top and below it, or all of them for None
+        prefix = None if top is None else os.path.join(top, "")
+        for directory in list(self.watches):
+            if top is None or directory == top or directory.startswith(prefix):
+                try:
+                    self.observer.unschedule(self.watches.pop(directory))
+                except KeyError:
+                    pass
+
+    def directory_created(self, path):
+        # Scheduling thread: cover a new directory. Under a non-recursive watch
+        # it needs watches of its own; an ignored directory appearing under a
+        # recursive watch means that subtree has to be planned again.
+        root = self.path
+        anchor = path
+        while anchor not in self.watches:
+            parent = os.path.dirname(anchor)
+            if parent == anchor:
+                return
+            anchor = parent
+        recursive = self.watches[anchor].is_recursive
+        if self.is_ignored_name(os.path.basename(path)):
+            if recursive:
+                self.remove_watches(anchor)
+                self.add_watches(root, anchor)
+        elif not recursive and anchor == os.path.dirname(path):
+            self.add_watches(root, path)
+
+    def is_ignored_name(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore_patterns)
+
+    def is_ignored(self, path):
+        relative = os.path.relpath(path, self.path)
+        return any(self.is_ignored_name(part) for part in relative.split(os.sep))
+
+    def handle_event(self, event):
+        # Runs on the watchdog thread: never touch Tk here
+        if event.is_directory and event.event_type == "modified":
+            return
+        paths = [(event.src_path, "deleted" if event.event_type == "moved" else event.event_type)]
+        if event.event_type == "moved":
+            paths.append((event.dest_path, "created"))
+        with self.lock:
+            for path, kind in paths:
+                if isinstance(path, bytes):
+                    path = os.fsdecode(path)
+                if event.is_directory and kind == "created":
+                    self.jobs.put((self.directory_created, path))
+                elif event.is_directory and kind == "deleted":
+                    self.jobs.put((self.remove_watches, path))
+                if not self.is_ignored(path):
+                    # A later event for the same path replaces the earlier one
+                    self.pending[path] = kind
+            if not self.pending or self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.call_soon(self.root.after, self.DEBOUNCE, self.flush)
+
+    def flush(self):
+        with self.lock:
+            changes = self.pending
+            self.pending = {}
+            self.flush_scheduled = False
+        if changes:
+            self.on_changes(changes)
+
+
+class GitIgnore:
+    # Rules of one .gitignore file. match() takes a path relative to the
+    # directory holding the file and returns True/False, or None if no rule applies.
+    def __init__(self, lines):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            self.rules.append((re.compile(self.translate(line.lstrip("/"))), negate, dir_only, anchored))
+
+    @staticmethod
+    def translate(pattern):
+        regex = ""
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                regex += "(?:.*/)?"
+                i += 3
+            elif pattern.startswith("**", i):
+                regex += ".*"
+                i += 2
+            elif pattern[i] == "*":
+                regex += "[^/]*"
+                i += 1
+            elif pattern[i] == "?":
+                regex += "[^/]"
+                i += 1
+            elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+                end = pattern.index("]", i + 1)
+                body = pattern[i + 1:end]
+                regex += "[" + ("^" + body[1:] if body.startswith("!") else body) + "]"
+                i = end + 1
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        return regex
+
+    def match(self, relative, is_directory):
+        result = None
+        name = relative.rsplit("/", 1)[-1]
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_directory:
+                continue
+            if regex.fullmatch(relative if anchored else name):
+                result = not negate
+        return result
+
+
+class FileIndex:
+    # Project-wide list of files relative to root. Directory paths are stored
+    # once and files reference them by id; names are interned. Names that
+    # contain the query are found with str.find on a blob of all lowercase
+    # names. For fuzzy matches, there is a byte per file and character telling
+    # whether the name contains it, so candidates are narrowed down with a few
+    # big-int ANDs before the subsequence match runs.
+    MAX_MATCHES = 5000
+    MAX_CANDIDATES = 20000
+    VERSION = 1
+
+    def __init__(self, root):
+        self.root = root
+        self.dirs = []
+        self.dir_ids = {}
+        self.dir_files = {}
+        self.file_dir = array.array("I")
+        self.file_name = []
+        self.alive = bytearray()
+        self.char_masks = {}
+        self.name_blob = ""
+        self.name_offsets = array.array("Q")
+        self.ignores = {}
+        self.masks_ready = False
+        self.dirty = False
+
+    def dir_id(self, relative_dir):
+        dir_id = self.dir_ids.get(relative_dir)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(relative_dir)
+            self.dir_ids[relative_dir] = dir_id
+            self.dir_files[dir_id] = {}
+        return dir_id
+
+    def add_file(self, relative):
+        relative_dir, _, name = relative.rpartition("/")
+        dir_id = self.dir_id(relative_dir)
+        if name in self.dir_files[dir_id]:
+            return
+        file_id = len(self.file_name)
+        name = sys.intern(name)
+        self.dir_files[dir_id][name] = file_id
+        self.file_dir.append(dir_id)
+        self.file_name.append(name)
+        self.alive.append(1)
+        self.dirty = True
+        if not self.masks_ready:
+            return
+        lower = name.lower()
+        self.name_offsets.append(len(self.name_blob) + 1)
+        self.name_blob += "\n" + lower
+        for char, mask in self.char_masks.items():
+            mask.append(char in lower)
+        for char in set(lower).difference(self.char_masks):
+            mask = self.char_masks[char] = bytearray(file_id)
+            mask.append(1)
+
+    def build_masks(self):
+        # Bulk version of the per-file mask update done by add_file
+        names = [name.lower() for name in self.file_name]
+        self.name_blob = "\n" + "\n".join(names)
+        self.name_offsets = array.array("Q", itertools.accumulate((len(name) + 1 for name in names[:-1]), initial=1))
+        self.char_masks = {char: bytearray(map(str.__contains__, names, itertools.repeat(char)))
+                           for char in set("".join(names))}
+        self.masks_ready = True
+
+    def remove_path(self, relative):
+        # Remove a file, or a directory with everything below it
+        relative_dir, _, name = relative.rpartition("/")
+        dir_id = self.dir_ids.get(relative_dir)
+        if dir_id is not None and name in self.dir_files[dir_id]:
+            self.alive[self.dir_files[dir_id].pop(name)] = 0
+            self.dirty = True
+        prefix = relative + "/"
+        for sub_dir, sub_id in self.dir_ids.items():
+            if sub_dir == relative or sub_dir.startswith(prefix):
+                for file_id in self.dir_files[sub_id].values():
+                    self.alive[file_id] = 0
+                self.dir_files[sub_id] = {}
+                self.dirty = True
+
+    def path(self, file_id):
+        relative_dir = self.dirs[self.file_dir[file_id]]
+        name = self.file_name[file_id]
+        return relative_dir + "/" + name if relative_dir else name
+
+    def paths(self):
+        return [self.path(file_id) for file_id in range(len(self.file_name)) if self.alive[file_id]]
+
+    def is_ignored(self, relative, is_directory):
+        # Also true below an ignored directory; crawl() never enters those, but
+        # paths reported by the directory watcher can be anywhere
+        parts = relative.split("/")
+        return (any(self.matches_ignore("/".join(parts[:end]), True) for end in range(1, len(parts)))
+                or self.matches_ignore(relative, is_directory))
+
+    def matches_ignore(self, relative, is_directory):
+        # Closer .gitignore files override the ones further up
+        if relative.split("/")[-1] == ".git":
+            return True
+        ignored = False
+        parts = relative.split("/")
+        for depth in range(len(parts)):
+            rules = self.ignores.get("/".join(parts[:depth]))
+            if rules is not None:
+                result = rules.match("/".join(parts[depth:]), is_directory)
+                if result is not None:
+                    ignored = result
+        return ignored
+
+    def crawl(self, relative_dir="", should_stop=lambda: False):
+        # Walk the tree below relative_dir, skipping ignored entries
+        stack = [relative_dir]
+        while stack and not should_stop():
+            current = stack.pop()
+            try:
+                with os.scandir(os.path.join(self.root, current)) as iterator:
+                    # Symlinked directories are skipped: they can point back up the tree
+                    entries = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in iterator
+                               if not (entry.is_symlink() and entry.is_dir())]
+            except OSError:
+                continue
+            if any(name == ".gitignore" and not is_directory for name, is_directory in entries):
+                try:
+                    with open(os.path.join(self.root, current, ".gitignore"), "r", errors="replace") as ignore_file:
+                        self.ignores[current] = GitIgnore(ignore_file.readlines())
+                except OSError:
+                    pass
+            for name, is_directory in entries:
+                relative = current + "/" + name if current else name
+                if self.matches_ignore(relative, is_directory):
+                    continue
+                if is_directory:
+                    stack.append(relative)
+                else:
+                    self.add_file(relative)
+        if not self.masks_ready:
+            self.build_masks()
+
+    @staticmethod
+    def subsequence_pattern(query):
+        # Possessive classes make this a single left-to-right pass per name
+        return re.compile("".join("[^%s]*+%s" % (re.escape(c), re.escape(c)) for c in query))
+
+    def search(self, query, limit=50):
+        if not self.masks_ready:
+            return []
+        query = query.lower().replace(" ", "")
+        dir_query, _, name_query = query.rpartition("/")
+        if not name_query:
+            return []
+        dir_pattern = self.subsequence_pattern(dir_query) if dir_query else None
+        results = []
+        seen = set()
+
+        def consider(file_id, score):
+            seen.add(file_id)
+            relative_dir = self.dirs[self.file_dir[file_id]]
+            if dir_pattern is None or dir_pattern.match(relative_dir.lower()):
+                results.append((-score, len(self.file_name[file_id]), len(relative_dir), file_id))
+
+        # Names containing the query: prefix matches rank first
+        position = self.name_blob.find(name_query)
+        while position >= 0 and len(seen) < self.MAX_MATCHES:
+            file_id = bisect.bisect_right(self.name_offsets, position) - 1
+            if self.alive[file_id] and file_id not in seen:
+                consider(file_id, 2 if self.name_offsets[file_id] == position else 1)
+            position = self.name_blob.find(name_query, position + 1)
+
+        # Scattered (fuzzy) matches rank below the ones above, so they are only
+        # needed when there are not enough of those
+        if len(results) >= limit:
+            results.sort()
+            return [self.path(result[3]) for result in results[:limit]]
+        mask = int.from_bytes(self.alive, "little")
+        for char in set(name_query):
+            if char not in self.char_masks:
+                return []
+            mask &= int.from_bytes(self.char_masks[char], "little")
+        candidates = mask.to_bytes(len(self.alive), "little")
+        name_pattern = self.subsequence_pattern(name_query)
+        file_id = candidates.find(1)
+        checked = 0
+        while file_id >= 0 and checked < self.MAX_CANDIDATES:
+            checked += 1
+            if file_id not in seen and name_pattern.match(self.file_name[file_id].lower()):
+                consider(file_id, 0)
+            file_id = candidates.find(1, file_id + 1)
+        results.sort()
+        return [self.path(result[3]) for result in results[:limit]]
+
+    def save(self, path):
+        data = {"version": self.VERSION, "root": self.root, "dirs": self.dirs,
+                "file_dir": [self.file_dir[i] for i in range(len(self.file_name)) if self.alive[i]],
+                "file_name": [self.file_name[i] for i in range(len(self.file_name)) if self.alive[i]]}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as index_file:
+            index_file.write(zlib.compress(json.dumps(data).encode("utf-8")))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, root):
+        with open(path, "rb") as index_file:
+            data = json.loads(zlib.decompress(index_file.read()).decode("utf-8"))
+        if data.get("version") != cls.VERSION or data.get("root") != root:
+            return None
+        index = cls(root)
+        dirs = data["dirs"]
+        for dir_id, name in zip(data["file_dir"], data["file_name"]):
+            index.add_file(dirs[dir_id] + "/" + name if dirs[dir_id] else name)
+        index.build_masks()
+        index.dirty = False
+        return index
+
+    @staticmethod
+    def cache_path(root):
+        return os.path.join(CONFIG_DIR, "index", hashlib.sha1(root.encode("utf-8")).hexdigest() + ".idx")
+
+
+class SymbolIndex:
+    # On-disk cache of the project's symbols: one SQLite database per project
+    # root. files keeps the stat key every file was parsed at, so reopening a
+    # project only reparses what changed. Connections are per thread; in WAL
+    # mode searches can read while the indexer writes.
+    VERSION = 1
+    QUERY_BUDGET = 0.04
+    SEARCH_TIMEOUT = 0.5
+    SCHEMA = """
+        DROP TABLE IF EXISTS files;
+        DROP TABLE IF EXISTS symbols;
+        CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime INTEGER, size INTEGER);
+        CREATE TABLE symbols (file_id INTEGER NOT NULL, name TEXT NOT NULL, lower TEXT NOT NULL, kind TEXT,
+                              line INTEGER, col INTEGER, container TEXT);
+        CREATE INDEX symbols_lower ON symbols (lower);
+        CREATE INDEX symbols_file ON symbols (file_id);
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(CONFIG_DIR, "index", hashlib.sha1(root.encode("utf-8")).hexdigest() + ".symbols")
+
+    def connect(self, timeout=30):
+        import sqlite3
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=timeout)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        if connection.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                # Another thread may have created the schema meanwhile
+                if connection.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+                    for statement in self.SCHEMA.split(";"):
+                        if statement.strip():
+                            connection.execute(statement)
+                    connection.execute(f"PRAGMA user_version={self.VERSION}")
+        return connection
+
+    def keys(self, connection):
+        return {path: (mtime, size) for path, mtime, size in connection.execute("SELECT path, mtime, size FROM files")}
+
+    def store(self, connection, results):
+        # Replace the symbols of the parsed files in one transaction
+        with connection:
+            for path, key, symbols in results:
+                row = connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    connection.execute("DELETE FROM symbols WHERE file_id = ?", row)
+                    if key is None:
+                        connection.execute("DELETE FROM files WHERE id = ?", row)
+                        continue
+                    file_id = row[0]
+                    connection.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?", key + (file_id,))
+                elif key is None:
+                    continue
+                else:
+                    file_id = connection.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                                                 (path,) + key).lastrowid
+                connection.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       [(file_id, name, name.lower(), kind, line, column, container)
+                                        for name, kind, line, column, container in symbols])
+
+    def remove(self, connection, paths):
+        # Forget files, or directories with everything below them
+        with connection:
+            for path in paths:
+                # "0" sorts right after "/", so this is every path below path/
+                ids = connection.execute("SELECT id FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+                                         (path, path + "/", path + "0")).fetchall()
+                connection.executemany("DELETE FROM symbols WHERE file_id = ?", ids)
+                connection.executemany("DELETE FROM files WHERE id = ?", ids)
+
+    def search(self, connection, query, limit=50):
+        # Prefix matches are read in index order; names merely containing the
+        # query need a scan. Both are cut off after QUERY_BUDGET seconds with
+        # the rows found so far.
+        import sqlite3
+        query = query.lower()
+        select = ("SELECT s.name, s.kind, f.path, s.line, s.container FROM symbols s "
+                  "JOIN files f ON f.id = s.file_id WHERE ")
+        prefix = (query, query + "\uffff")
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        results = []
+        deadline = time.perf_counter() + self.QUERY_BUDGET
+        connection.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        try:
+            for row in connection.execute(select + "s.lower >= ? AND s.lower < ? ORDER BY s.lower LIMIT ?",
+                                          prefix + (limit,)):
+                results.append(row)
+            if query and len(results) < limit:
+                cursor = connection.execute(select + "s.lower LIKE ? ESCAPE '\\' AND NOT (s.lower >= ? AND s.lower < ?) "
+                                            "LIMIT ?", (pattern,) + prefix + (limit - len(results),))
+                for row in cursor:
+                    results.append(row)
+        except sqlite3.OperationalError:
+            # Interrupted by the progress handler, or the index is busy
+            pass
+        finally:
+            connection.set_progress_handler(None, 0)
+        return results
+
+
+class GitStatus:
+    # Working tree state of the Git repository holding the tree root, from one
+    # `git status --porcelain=v2` run. files maps the absolute paths git
+    # reported to their state (untracked and ignored directories end with
+    # os.sep, everything below them shares their state) and changed counts the
+    # changed paths below every directory so parents can be marked too.
+    # query() runs on a worker thread; apply() patches the maps with its result,
+    # limited to the re-queried paths, on the UI thread.
+    PROPAGATED = ("modified", "added", "untracked", "conflict")
+
+    def __init__(self, root, top, git_dir):
+        self.root = root
+        self.top = top
+        self.git_dir = git_dir
+        self.files = {}
+        self.changed = collections.Counter()
+        self.branch = None
+        self.ahead = 0
+        self.behind = 0
+
+    @staticmethod
+    def git(root, *args):
+        import subprocess
+        result = subprocess.run(["git", "--no-optional-locks"] + list(args), cwd=root, capture_output=True)
+        if result.returncode != 0:
+            raise OSError(result.stderr.decode("utf-8", errors="replace").strip())
+        return result.stdout.decode("utf-8", errors="surrogateescape")
+
+    @classmethod
+    def discover(cls, root):
+        # The repository containing root, or None
+        try:
+            cdup, git_dir = cls.git(root, "rev-parse", "--show-cdup", "--git-dir").splitlines()[:2]
+        except (OSError, ValueError):
+            return None
+        return cls(root, os.path.normpath(os.path.join(root, cdup)), os.path.join(root, git_dir))
+
+    def head_key(self):
+        # Changes when the index, HEAD or the current branch move
+        refs = [os.path.join(self.git_dir, "index"), os.path.join(self.git_dir, "HEAD"),
+                os.path.join(self.git_dir, "packed-refs")]
+        if self.branch:
+            refs.append(os.path.join(self.git_dir, "refs", "heads", self.branch))
+        return tuple(file_stat_key(ref) for ref in refs)
+
+    def query(self, paths=None):
+        # Status of the paths (absolute), or of the whole repository
+        args = ["status", "--porcelain=v2", "-z", "--branch", "--untracked-files=normal", "--ignored"]
+        if paths is not None:
+            args.append("--")
+            args.extend(":(literal)" + os.path.relpath(path, self.root) for path in paths)
+        fields = self.git(self.root, *args).split("\0")
+        branch, ahead, behind = None, 0, 0
+        entries = {}
+        i = 0
+        while i < len(fields):
+            record = fields[i]
+            i += 1
+            if not record:
+                continue
+            kind = record[0]
+            if kind == "#":
+                parts = record.split(" ")
+                if parts[1] == "branch.head":
+                    branch = parts[2]
+                elif parts[1] == "branch.ab":
+                    ahead, behind = int(parts[2]), -int(parts[3])
+                continue
+            if kind in "12u":
+                # 1 XY sub mH mI mW hH hI path, 2 adds a rename score, u has three stages
+                path_field = {"1": 8, "2": 9, "u": 10}[kind]
+                parts = record.split(" ", path_field)
+                relative = parts[path_field]
+                if kind == "2":
+                    i += 1  # original path of the rename
+                state = "conflict" if kind == "u" else "added" if parts[1][0] == "A" else "modified"
+            elif kind in "?!":
+                relative = record[2:]
+                state = "untracked" if kind == "?" else "ignored"
+            else:
+                continue
+            path = os.path.join(self.top, relative.rstrip("/").replace("/", os.sep))
+            entries[path + os.sep if relative.endswith("/") else path] = state
+        return branch, ahead, behind, entries
+
+    def apply(self, result, paths=None):
+        # Replace the state of the queried paths and everything below them;
+        # returns the paths whose decoration may have changed
+        self.branch, self.ahead, self.behind, entries = result
+        if paths is None:
+            stale = list(self.files)
+        else:
+            prefixes = tuple(path + os.sep for path in paths)
+            queried = set(paths)
+            stale = [path for path in self.files if path.startswith(prefixes) or path.rstrip(os.sep) in queried]
+        touched = set()
+        for path in stale:
+            self.set_state(path, None, touched)
+        for path, state in entries.items():
+            self.set_state(path, state, touched)
+        return touched
+
+    def set_state(self, path, state, touched):
+        old = self.files.pop(path, None)
+        if state is not None:
+            self.files[path] = state
+        if old == state:
+            return
+        touched.add(path)
+        for propagated, delta in ((old, -1), (state, 1)):
+            if propagated not in self.PROPAGATED:
+                continue
+            parent = os.path.dirname(path.rstrip(os.sep))
+            while len(parent) >= len(self.top) and parent != os.path.dirname(parent):
+                self.changed[parent] += delta
+                if self.changed[parent] <= 0:
+                    del self.changed[parent]
+                if delta > 0 and self.changed[parent] == 1 or delta < 0 and parent not in self.changed:
+                    touched.add(parent)
+                parent = os.path.dirname(parent)
+
+    def state(self, path):
+        state = self.files.get(path) or self.files.get(path + os.sep)
+        if state is not None:
+            return state
+        if path in self.changed:
+            return "modified"
+        parent = os.path.dirname(path)
+        while len(parent) > len(self.top):
+            state = self.files.get(parent + os.sep)
+            if state is not None:
+                return state
+            parent = os.path.dirname(parent)
+        return None
+
+    def branch_label(self):
+        if self.branch is None:
+            return ""
+        label = self.branch
+        if self.ahead:
+            label += f" \u2191{self.ahead}"
+        if self.behind:
+            label += f" \u2193{self.behind}"
+        return label
+
+
+class SearchMatches:
+    # Offsets of every match of one search over a document snapshot, with the
+    # line start offsets needed to turn them into Tk indices
+    def __init__(self, starts, ends, line_starts):
+        self.starts = starts
+        self.ends = ends
+        self.line_starts = line_starts
+
+    def __len__(self):
+        return len(self.starts)
+
+    def index(self, offset):
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        return "%d.%d" % (line + 1, offset - self.line_starts[line])
+
+    def in_lines(self, first, last):
+        # Range of matches starting on 0-based lines first..last
+        start = self.line_starts[min(first, len(self.line_starts) - 1)]
+        end = self.line_starts[last + 1] if last + 1 < len(self.line_starts) else sys.maxsize
+        return bisect.bisect_left(self.starts, start), bisect.bisect_left(self.starts, end)
+
+    @classmethod
+    def find(cls, snapshot, pattern, is_cancelled):
+        # Runs on a worker thread; returns None when cancelled
+        text = snapshot.text()
+        line_starts = array.array("q", itertools.accumulate((len(line) + 1 for line in text.split("\n")[:-1]), initial=0))
+        starts = array.array("q")
+        ends = array.array("q")
+        for count, match in enumerate(pattern.finditer(text)):
+            if match.end() == match.start():
+                continue
+            starts.append(match.start())
+            ends.append(match.end())
+            if count % 10000 == 0 and is_cancelled():
+                return None
+        return cls(starts, ends, line_starts)
+
+
+class PrefixTrie:
+    # Character trie mapping keys to values, used for the snippet names
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def insert(self, key, value):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        if None not in node:
+            self.size += 1
+        node[None] = value
+
+    def complete(self, prefix, limit):
+        # (key, value) pairs starting with prefix, in key order
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        results = []
+        stack = [(prefix, node)]
+        while stack and len(results) < limit:
+            key, node = stack.pop()
+            if None in node:
+                results.append((key, node[None]))
+            for char in sorted((char for char in node if char is not None), reverse=True):
+                stack.append((key + char, node[char]))
+        return results
+
+
+class IdentifierIndex:
+    # Reference-counted identifiers kept in a sorted list, so a prefix lookup
+    # is one bisect plus a scan over the matches
+    REBUILD_THRESHOLD = 64
+
+    def __init__(self, counts=None):
+        self.counts = counts if counts is not None else {}
+        self.names = sorted(self.counts)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, names):
+        new = []
+        for name in names:
+            count = self.counts.get(name, 0)
+            if not count:
+                new.append(name)
+            self.counts[name] = count + 1
+        if len(new) > self.REBUILD_THRESHOLD:
+            self.names = sorted(self.counts)
+        else:
+            for name in new:
+                bisect.insort(self.names, name)
+
+    def remove(self, names):
+        gone = []
+        for name in names:
+            count = self.counts[name] - 1
+            if count:
+                self.counts[name] = count
+            else:
+                del self.counts[name]
+                gone.append(name)
+        if len(gone) > self.REBUILD_THRESHOLD:
+            self.names = sorted(self.counts)
+        else:
+            for name in gone:
+                del self.names[bisect.bisect_left(self.names, name)]
+
+    def complete(self, prefix, limit):
+        names = self.names
+        i = bisect.bisect_left(names, prefix)
+        results = []
+        while i < len(names) and len(results) < limit and names[i].startswith(prefix):
+            results.append(names[i])
+            i += 1
+        return results
+
+
+class BufferIdentifiers:
+    # TextChangeHook listener feeding one buffer's identifiers into a shared
+    # IdentifierIndex. The identifiers of every line are kept so an edit only
+    # rescans the lines it touched.
+    def __init__(self, index):
+        self.index = index
+        self.text_widget = None
+        self.lines = [()]
+
+    def on_change(self, kind, start, end, text):
+        first = int(start.split(".")[0]) - 1
+        if kind == "insert":
+            old_count, new_count = 1, 1 + text.count("\n")
+        else:
+            old_count, new_count = int(end.split(".")[0]) - first, 1
+        new_text = self.text_widget.get("%d.0" % (first + 1), "%d.end" % (first + new_count))
+        new = [tuple(IDENTIFIER_PATTERN.findall(line)) for line in new_text.split("\n")]
+        old = self.lines[first:first + old_count]
+        # Add before removing so names on both sides never leave the sorted list
+        self.index.add([name for line in new for name in line])
+        self.index.remove([name for line in old for name in line])
+        self.lines[first:first + old_count] = new
+
+    def release(self):
+        self.index.remove([name for line in self.lines for name in line])
+        self.lines = [()]
+
+    def reset(self, content):
+        self.release()
+        self.lines = [tuple(IDENTIFIER_PATTERN.findall(line)) for line in content.split("\n")]
+        self.index.add([name for line in self.lines for name in line])
+
+
+class OutputBuffer:
+    # Ring buffer of (stream, text) chunks bounded by the total number of
+    # characters; the oldest chunks are dropped when it is full
+    def __init__(self, limit):
+        self.limit = limit
+        self.chunks = collections.deque()
+        self.size = 0
+        self.dropped = 0
+
+    def append(self, stream, text):
+        self.chunks.append((stream, text))
+        self.size += len(text)
+        while self.size > self.limit and len(self.chunks) > 1:
+            self.size -= len(self.chunks.popleft()[1])
+            self.dropped += 1
+
+    def take(self):
+        chunks, dropped = list(self.chunks), self.dropped
+        self.chunks.clear()
+        self.size = 0
+        self.dropped = 0
+        return chunks, dropped
+
+
+class RunSession:
+    # One child process. Reader threads collect stdout/stderr into an
+    # OutputBuffer and a waiter thread reaps the process; the Tk main loop is
+    # notified through call_soon and never blocks on the child.
+    def __init__(self, command, cwd, call_soon, on_output, on_exit):
+        self.command = command
+        self.cwd = cwd
+        self.call_soon = call_soon
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.lock = threading.Lock()
+        self.process = None
+
+    def start(self):
+        import subprocess
+        self.output = OutputBuffer(OUTPUT_BUFFER_LIMIT)
+        self.output_pending = False
+        self.returncode = None
+        self.cpu_time = None
+        self.started = time.monotonic()
+        self.finished = None
+        self.process = subprocess.Popen(self.command, cwd=self.cwd, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        start_new_session=os.name == "posix")
+        self.readers = [threading.Thread(target=self.read_stream, args=(self.process.stdout, "stdout"), daemon=True),
+                        threading.Thread(target=self.read_stream, args=(self.process.stderr, "stderr"), daemon=True)]
+        for reader in self.readers:
+            reader.start()
+        threading.Thread(target=self.wait, daemon=True).start()
+
+    def read_stream(self, stream, name):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = stream.read1(65536)
+            text = decoder.decode(data, final=not data)
+            if text:
+                with self.lock:
+                    self.output.append(name, text)
+                    notify = not self.output_pending
+                    self.output_pending = True
+                if notify:
+                    self.call_soon(self.on_output, self)
+            if not data:
+                break
+        stream.close()
+
+    def wait(self):
+        if hasattr(os, "wait4"):
+            # wait4 also reports the CPU time used by the child
+            _, status, usage = os.wait4(self.process.pid, 0)
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+            self.cpu_time = usage.ru_utime + usage.ru_stime
+        else:
+            self.process.wait()
+        for reader in self.readers:
+            reader.join()
+        self.returncode = self.process.returncode
+        self.finished = time.monotonic()
+        self.call_soon(self.on_exit, self)
+
+    def running(self):
+        return self.process is not None and self.finished is None
+
+    def take_output(self):
+        with self.lock:
+            self.output_pending = False
+            return self.output.take()
+
+    def kill(self):
+        if self.running() and self.process.returncode is None:
+            try:
+                if os.name == "posix":
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                else:
+                    self.process.kill()
+            except OSError:
+                pass
+
+    def status(self):
+        if self.finished is None:
+            return f"Running for {time.monotonic() - self.started:.1f}s"
+        status = f"Exit code {self.returncode} - wall {self.finished - self.started:.2f}s"
+        if self.cpu_time is not None:
+            status += f" - CPU {self.cpu_time:.2f}s"
+        return status
+
+
+class BuildCache:
+    # Content-addressed cache of object files and linked binaries.
+    # An object is keyed by compiler, flags, source contents and the contents
+    # of every header the compiler reported in its dependency file on the
+    # last compile (kept in a per-source manifest), so an unchanged project is
+    # never recompiled and an edit recompiles only the objects it affects.
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = limit
+        self.header_hashes = {}
+        self.lock = threading.Lock()
+        for name in ("objects", "manifests", "binaries"):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            digest = self.header_hashes.get(key)
+        if digest is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as source_file:
+                for block in iter(lambda: source_file.read(1 << 20), b""):
+                    digest.update(block)
+            digest = digest.hexdigest()
+            with self.lock:
+                self.header_hashes[key] = digest
+        return digest
+
+    def object_key(self, base, headers):
+        digest = hashlib.sha256(base.encode("utf-8"))
+        for header in headers:
+            digest.update(b"\0" + header.encode("utf-8") + b"\0" + self.file_hash(header).encode("ascii"))
+        return digest.hexdigest()
+
+    def cached_object(self, base):
+        # Object for this source if the headers it used last time are unchanged
+        try:
+            with open(os.path.join(self.directory, "manifests", base + ".json"), "r") as manifest:
+                headers = json.load(manifest)
+            path = os.path.join(self.directory, "objects", self.object_key(base, headers) + ".o")
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    @staticmethod
+    def parse_depfile(path):
+        with open(path, "r", errors="replace") as depfile:
+            data = depfile.read().replace("\\\n", " ")
+        _, _, data = data.partition(": ")
+        return [name.replace("\\ ", " ") for name in re.split(r"(?<!\\)\s+", data) if name]
+
+    def compile(self, compiler, flags, source, on_output):
+        # Returns (object path, compiled?) or (None, True) when compilation failed
+        source = os.path.abspath(source)
+        base = hashlib.sha256("\0".join([compiler] + flags + [source, self.file_hash(source)]).encode("utf-8")).hexdigest()
+        cached = self.cached_object(base)
+        if cached is not None:
+            return cached, False
+        import subprocess
+        import tempfile
+        descriptor, temp_object = tempfile.mkstemp(suffix=".o", dir=os.path.join(self.directory, "objects"))
+        os.close(descriptor)
+        temp_depfile = temp_object[:-2] + ".d"
+        try:
+            result = subprocess.run([compiler] + flags + ["-c", source, "-o", temp_object, "-MMD", "-MF", temp_depfile],
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if result.stdout:
+                on_output(result.stdout.decode("utf-8", "replace"))
+            if result.returncode != 0:
+                return None, True
+            headers = sorted(os.path.abspath(name) for name in self.parse_depfile(temp_depfile)[1:])
+            path = os.path.join(self.directory, "objects", self.object_key(base, headers) + ".o")
+            os.replace(temp_object, path)
+            manifest_path = os.path.join(self.directory, "manifests", base + ".json")
+            with open(manifest_path + ".tmp", "w") as manifest:
+                json.dump(headers, manifest)
+            os.replace(manifest_path + ".tmp", manifest_path)
+            return path, True
+        finally:
+            for name in (temp_object, temp_depfile):
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def link(self, linker, flags, objects, on_output):
+        key = hashlib.sha256("\0".join([linker] + flags + objects).encode("utf-8")).hexdigest()
+        path = os.path.join(self.directory, "binaries", key)
+        if os.path.exists(path):
+            os.utime(path)
+            return path, False
+        import subprocess
+        temp_path = path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        result = subprocess.run([linker] + objects + flags + ["-o", temp_path],
+                                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if result.stdout:
+            on_output(result.stdout.decode("utf-8", "replace"))
+        if result.returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None, True
+        os.replace(temp_path, path)
+        return path, True
+
+    def build(self, sources, settings, on_output):
+        # Compile sources in parallel and link them; returns the binary path or None
+        is_cpp = any(source.endswith(CPP_SOURCE_SUFFIXES) for source in sources)
+        linker = settings["cpp_compiler"] if is_cpp else settings["c_compiler"]
+
+        def compile_source(source):
+            if source.endswith(CPP_SOURCE_SUFFIXES):
+                return self.compile(settings["cpp_compiler"], list(settings["cpp_flags"]), source, on_output)
+            return self.compile(settings["c_compiler"], list(settings["c_flags"]), source, on_output)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+                results = list(executor.map(compile_source, sources))
+            if any(path is None for path, _ in results):
+                return None
+            compiled = sum(1 for _, fresh in results if fresh)
+            binary, linked = self.link(linker, list(settings["link_flags"]), [path for path, _ in results], on_output)
+        except OSError as e:
+            on_output(f"Build failed: {e}\n", "info")
+            return None
+        if binary is not None:
+            if compiled or linked:
+                on_output(f"Compiled {compiled} of {len(sources)} sources{', relinked' if linked else ''}\n", "info")
+            else:
+                on_output("Build is up to date\n", "info")
+        self.evict()
+        return binary
+
+    def evict(self):
+        # Drop least recently used objects and binaries while over the size limit
+        entries = []
+        total = 0
+        for name in ("objects", "binaries"):
+            with os.scandir(os.path.join(self.directory, name)) as iterator:
+                for entry in iterator:
+                    if entry.name.endswith(".tmp"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def diff_lines(old, new, deadline):
+    # Hunks (old_start, old_end, new_start, new_end) turning the line hashes in
+    # old into new. Common prefixes and suffixes are trimmed, big ranges are
+    # split at the lines that occur once on both sides (patience diff) and the
+    # small ones go to Myers. Past the deadline, or when Myers gives up, a
+    # range becomes a single hunk.
+    hunks = []
+    stack = [(0, len(old), 0, len(new))]
+    while stack:
+        o0, o1, n0, n1 = stack.pop()
+        while o0 < o1 and n0 < n1 and old[o0] == new[n0]:
+            o0 += 1
+            n0 += 1
+        while o0 < o1 and n0 < n1 and old[o1 - 1] == new[n1 - 1]:
+            o1 -= 1
+            n1 -= 1
+        if o0 == o1 and n0 == n1:
+            continue
+        if o0 == o1 or n0 == n1 or time.perf_counter() > deadline:
+            hunks.append((o0, o1, n0, n1))
+            continue
+        if (o1 - o0) + (n1 - n0) > DIFF_MYERS_LINES:
+            anchors = unique_anchors(old, o0, o1, new, n0, n1)
+            if anchors:
+                previous = (o0 - 1, n0 - 1)
+                for anchor in anchors + [(o1, n1)]:
+                    stack.append((previous[0] + 1, anchor[0], previous[1] + 1, anchor[1]))
+                    previous = anchor
+                continue
+        matches = myers_matches(old, o0, o1, new, n0, n1)
+        if matches is None:
+            hunks.append((o0, o1, n0, n1))
+            continue
+        x, y = o0, n0
+        for match_x, match_y in matches + [(o1, n1)]:
+            if match_x > x or match_y > y:
+                hunks.append((x, match_x, y, match_y))
+            x, y = match_x + 1, match_y + 1
+    hunks.sort(key=lambda hunk: (hunk[2], hunk[0]))
+    return hunks
+
+
+def unique_anchors(old, o0, o1, new, n0, n1):
+    # Lines occurring exactly once in both ranges, as the longest run of
+    # (old, new) positions increasing on both sides
+    seen_old = {}
+    for i in range(o0, o1):
+        seen_old[old[i]] = i if old[i] not in seen_old else -1
+    seen_new = {}
+    for j in range(n0, n1):
+        seen_new[new[j]] = j if new[j] not in seen_new else -1
+    pairs = sorted((j, seen_old[line]) for line, j in seen_new.items() if j >= 0 and seen_old.get(line, -1) >= 0)
+    # Longest increasing subsequence of the old positions
+    tails = []
+    tail_index = []
+    previous = [-1] * len(pairs)
+    for index, (j, i) in enumerate(pairs):
+        position = bisect.bisect_left(tails, i)
+        if position == len(tails):
+            tails.append(i)
+            tail_index.append(index)
+        else:
+            tails[position] = i
+            tail_index[position] = index
+        previous[index] = tail_index[position - 1] if position else -1
+    anchors = []
+    index = tail_index[-1] if tail_index else -1
+    while index >= 0:
+        j, i = pairs[index]
+        anchors.append((i, j))
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def myers_matches(old, o0, o1, new, n0, n1):
+    # Matching (old, new) line positions of a shortest edit script, or None
+    # past DIFF_MAX_EDITS edits
+    n = o1 - o0
+    m = n1 - n0
+    v = {1: 0}
+    trace = []
+    for d in range(min(n + m, DIFF_MAX_EDITS) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or k != d and v[k - 1] < v[k + 1]:
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and old[o0 + x] == new[n0 + y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                break
+        else:
+            continue
+        break
+    else:
+        return None
+    matches = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or k != d and v[k - 1] < v[k + 1]:
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = v[previous_k]
+        previous_y = previous_x - previous_k
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            matches.append((o0 + x, n0 + y))
+        x, y = previous_x, previous_y
+    matches.reverse()
+    return matches
+
+
+class LineDiff:
+    # Alignment of a buffer with its base version (Git HEAD or the file on
+    # disk). Lines are kept as hashes; hunks are (old_start, old_end,
+    # new_start, new_end) sorted by position. An edit patches the new lines,
+    # shifts the hunks after it and marks its lines dirty. The next diff only
+    # covers the dirty window, against the base lines between the hunks
+    # around it.
+    def __init__(self, old_text, new_text):
+        self.old = array.array("q", map(hash, old_text.split("\n")))
+        self.new = array.array("q", map(hash, new_text.split("\n")))
+        self.hunks = []
+        self.dirty = (0, len(self.new))
+        self.version = 0
+        self.running = False
+
+    def replace(self, first, last, lines):
+        # Lines first..last-1 (0-based) were replaced by lines
+        count = len(lines)
+        delta = count - (last - first)
+        self.new[first:last] = array.array("q", map(hash, lines))
+        self.version += 1
+
+        def moved(line):
+            if line <= first:
+                return line
+            return line + delta if line >= last else first + count
+        low, high = first, first + count
+        if self.dirty is not None:
+            low, high = min(low, moved(self.dirty[0])), max(high, moved(self.dirty[1]))
+        kept = []
+        for hunk in self.hunks:
+            if hunk[3] < first:
+                kept.append(hunk)
+            elif hunk[2] > last:
+                kept.append((hunk[0], hunk[1], hunk[2] + delta, hunk[3] + delta) if delta else hunk)
+            else:
+                low, high = min(low, moved(hunk[2])), max(high, moved(hunk[3]))
+        self.hunks = kept
+        self.dirty = (low, high)
+
+    def window(self):
+        # The dirty window in both versions; hunks touching it are dropped
+        low, high = self.dirty
+        before = [hunk for hunk in self.hunks if hunk[3] < low]
+        after = [hunk for hunk in self.hunks if hunk[2] > high]
+        for hunk in self.hunks[len(before):len(self.hunks) - len(after)]:
+            low, high = min(low, hunk[2]), max(high, hunk[3])
+        old_low = low + (before[-1][1] - before[-1][3] if before else 0)
+        old_high = high + (after[0][0] - after[0][2] if after else len(self.old) - len(self.new))
+        if not 0 <= old_low <= old_high <= len(self.old):
+            # Can't happen unless the bookkeeping is off: start over
+            before, after, low, high, old_low, old_high = [], [], 0, len(self.new), 0, len(self.old)
+        self.hunks = before + after
+        self.dirty = (low, high)
+        return old_low, old_high, low, high
+
+    def apply(self, window, hunks):
+        old_low, old_high, low, high = window
+        position = bisect.bisect_left([hunk[2] for hunk in self.hunks], low)
+        self.hunks[position:position] = [(o0 + old_low, o1 + old_low, n0 + low, n1 + low) for o0, o1, n0, n1 in hunks]
+        self.dirty = None
+
+    def markers(self, top, bottom):
+        # (kind, first, last) of the hunks touching lines top..bottom-1
+        for old_start, old_end, new_start, new_end in self.hunks:
+            if new_start > bottom:
+                break
+            if new_end < top:
+                continue
+            if new_start == new_end:
+                yield "deleted", new_start, new_start
+            else:
+                yield "added" if old_start == old_end else "modified", new_start, new_end
+
+
+class BackgroundWriter:
+    # One daemon thread running file writes in the order they were submitted,
+    # so the saves and journal records of a buffer never overtake each other.
+    # Pending jobs are finished at exit.
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+        atexit.register(self.wait)
+
+    def submit(self, job, *args):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.jobs.put((job, args))
+
+    def run(self):
+        while True:
+            job, args = self.jobs.get()
+            try:
+                job(*args)
+            except Exception as e:
+                print(f"[writer] {job.__qualname__} failed: {e}", file=sys.stderr)
+            finally:
+                self.jobs.task_done()
+
+    def wait(self):
+        if self.thread is not None:
+            self.jobs.join()
+
+
+class EditJournal:
+    # Append-only log of one buffer's edits for crash recovery. The file holds
+    # JSON lines: a base, {"path", "disk_key"} when the text started as the
+    # file on disk or {"path", "text"}, followed by ["i", index, text] and
+    # ["d", index, length] records with the Tk indices of the edits. The UI
+    # thread only queues records; the BackgroundWriter appends and flushes
+    # them, sync() makes them durable and compact() replaces the file with a
+    # single text base. A journal without edits is never written, so clean
+    # buffers leave nothing behind.
+    COMPACT_MIN = 1024 * 1024
+    counter = itertools.count(1)
+
+    def __init__(self, writer, path=None, disk_key=None, text=""):
+        self.writer = writer
+        self.path = os.path.join(JOURNAL_DIR, f"{os.getpid()}-{next(EditJournal.counter)}.journal")
+        self.base = self.make_base(path, disk_key, text)
+        self.file = None
+        self.size = 0
+        self.dirty = False
+
+    @staticmethod
+    def make_base(path, disk_key, text):
+        return {"path": path, "text": text} if text is not None else {"path": path, "disk_key": disk_key}
+
+    # Called on the UI thread
+    def reset(self, path, disk_key=None, text=None):
+        self.writer.submit(self.set_base, self.make_base(path, disk_key, text))
+
+    def record(self, kind, start, text):
+        self.writer.submit(self.append, ["i", start, text] if kind == "insert" else ["d", start, len(text)])
+
+    def sync(self):
+        self.writer.submit(self.fsync)
+
+    def compact(self, path, snapshot):
+        self.writer.submit(self.write_snapshot, path, snapshot)
+
+    def discard(self):
+        self.writer.submit(self.set_base, None)
+
+    # Called on the writer thread
+    def set_base(self, base):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.base = base
+        self.size = 0
+        self.dirty = False
+
+    def write_base(self, base):
+        # Atomically replace the journal with one holding just base
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as temp_file:
+            temp_file.write(json.dumps(base) + "\n")
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        if self.file is not None:
+            self.file.close()
+        os.replace(temp_path, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.size = self.file.tell()
+        self.dirty = False
+
+    def append(self, record):
+        if self.base is None:
+            return
+        if self.file is None:
+            self.write_base(self.base)
+        line = json.dumps(record) + "\n"
+        self.file.write(line)
+        self.file.flush()
+        self.size += len(line)
+        self.dirty = True
+
+    def fsync(self):
+        if self.file is not None and self.dirty:
+            os.fsync(self.file.fileno())
+            self.dirty = False
+
+    def write_snapshot(self, path, snapshot):
+        self.base = {"path": path, "text": snapshot.text()}
+        self.write_base(self.base)
+
+    @staticmethod
+    def recover(journal_path):
+        # Replay a journal left by an editor that didn't exit cleanly; returns
+        # (path, text) or raises ValueError/OSError when it can't be rebuilt
+        with open(journal_path, "r", encoding="utf-8") as journal_file:
+            base = json.loads(journal_file.readline())
+            records = []
+            for line in journal_file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn last record
+                    break
+        path = base.get("path")
+        if "text" in base:
+            text = base["text"]
+        else:
+            if file_stat_key(path) != tuple(base["disk_key"] or ()):
+                raise ValueError("the file changed on disk since the edits were made")
+            with open(path, "rb") as file:
+                # Decoded the way FileLoader read it when the edits were made
+                text = normalize_newlines(file.read().decode("utf-8"))
+        document = Document(text)
+        for kind, start, value in records:
+            line, col = map(int, start.split("."))
+            offset = document.offset_of(line, col)
+            if offset > document.length:
+                raise ValueError("the journal does not match the file")
+            if kind == "i":
+                document.insert(offset, value)
+            else:
+                document.delete(offset, value)
+        return path, document.text()
+
+
+class EditorBuffer:
+    # One open file (tab): its Text widget with the document, undo history and
+    # highlighter attached to it, plus the per-file editor state. The active
+    # buffer's state lives on CodeEditor (see STATE) and is copied back when
+    # another tab is activated. Inactive buffers over the memory budget are
+    # spilled: the widget is destroyed and the text is kept zlib-compressed, or
+    # dropped entirely when it is unmodified and can be re-read from disk.
+    # Every edit also goes to the buffer's EditJournal.
+    STATE = ("text_widget", "text_hook", "document", "history", "highlighter", "current_file", "language",
+             "large_file", "large_window_start", "large_window_lines", "large_search_offset")
+    ON_DISK = object()
+
+    def __init__(self, frame, language, on_modified, identifiers, journal):
+        self.frame = frame
+        self.language = language
+        self.on_modified = on_modified
+        self.identifiers = identifiers
+        self.journal = journal
+        self.text_widget = None
+        self.text_hook = None
+        self.document = Document()
+        self.history = None
+        self.highlighter = None
+        self.current_file = None
+        self.large_file = None
+        self.large_window_start = 0
+        self.large_window_lines = 0
+        self.large_search_offset = 0
+        self.modified = False
+        self.version = 0
+        self.preview = False
+        self.loading = False
+        self.load_token = 0
+        self.pending_line = None
+        self.symbols = None
+        self.diff = None
+        self.diff_generation = 0
+        self.diff_after_id = None
+        self.gutter = None
+        self.gutter_after_id = None
+        self.disk_key = None
+        self.spilled = None
+        self.cursor = "1.0"
+        self.top = "1.0"
+        self.last_used = 0
+
+    def on_change(self, kind, start, end, text):
+        if self.loading:
+            return
+        self.version += 1
+        self.journal.record(kind, start, text)
+        if not self.modified:
+            self.modified = True
+            self.preview = False
+            self.on_modified(self)
+
+    def memory(self):
+        # Approximate size in characters of what a live buffer keeps in memory
+        if self.spilled is not None or self.large_file is not None:
+            return 0
+        return self.document.length + self.history.memory
+
+
+def handler_name(function):
+    # Readable name of a Tk callback for the latency stats
+    if getattr(function, "__qualname__", "").endswith("after.<locals>.callit") and function.__closure__:
+        # Misc.after wraps the callback in a closure
+        for cell in function.__closure__:
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                continue
+            if callable(contents) and not isinstance(contents, tk.Misc):
+                function = contents
+                break
+    name = getattr(function, "__qualname__", None) or type(function).__name__
+    if name.endswith("<lambda>"):
+        name += ":%d" % function.__code__.co_firstlineno
+    return name
+
+
+class TimedCallWrapper(tk.CallWrapper):
+    # Replaces tkinter.CallWrapper, which wraps every Python callback called
+    # from Tcl (bindings, menu and button commands, after callbacks)
+    def __init__(self, func, subst, widget):
+        super().__init__(func, subst, widget)
+        self.name = handler_name(func)
+
+    def __call__(self, *args):
+        # Callbacks registered while the monitor was on outlive it
+        monitor = LatencyMonitor.active
+        if monitor is None:
+            return super().__call__(*args)
+        start = time.perf_counter()
+        try:
+            return super().__call__(*args)
+        finally:
+            monitor.record(self.name, start, time.perf_counter() - start)
+
+
+class LatencyMonitor:
+    # Rolling latency samples per handler plus a ring of trace events that can
+    # be exported in the Chrome trace format (chrome://tracing, Perfetto).
+    # A heartbeat scheduled every HEARTBEAT ms measures how late the main loop
+    # gets to it.
+    SAMPLES = 1024
+    TRACE_EVENTS = 50000
+    HEARTBEAT = 50
+    LAG = "<main loop lag>"
+    active = None
 
-class CodeEditor:
     def __init__(self, root):
+        self.root = root
+        self.samples = {}
+        self.counts = collections.Counter()
+        self.events = collections.deque(maxlen=self.TRACE_EVENTS)
+        self.expected = None
+        self.heartbeat_id = None
+        self.original_wrapper = None
+        # Tcl commands routed through a timing proxy, and the ones created by a
+        # TimedCallWrapper (which time themselves whenever a monitor is active)
+        self.proxied = {}
+        self.self_timed = set()
+
+    def install(self):
+        if LatencyMonitor.active is self:
+            return
+        LatencyMonitor.active = self
+        self.original_wrapper = tk.CallWrapper
+        tk.CallWrapper = TimedCallWrapper
+        self.proxy_commands()
+        self.expected = time.perf_counter() + self.HEARTBEAT / 1000
+        self.heartbeat_id = self.root.after(self.HEARTBEAT, self.heartbeat)
+
+    def uninstall(self):
+        # Give tkinter its own CallWrapper and commands back; the samples are kept
+        if LatencyMonitor.active is not self:
+            return
+        LatencyMonitor.active = None
+        tk.CallWrapper = self.original_wrapper
+        self.self_timed.update(self.registered_commands().difference(self.proxied))
+        self.unproxy_commands()
+        self.root.after_cancel(self.heartbeat_id)
+        self.heartbeat_id = None
+
+    def registered_commands(self):
+        # Names of the Tcl commands tkinter registered for the widget tree
+        names = set()
+        widgets = [self.root]
+        while widgets:
+            widget = widgets.pop()
+            widgets.extend(widget.children.values())
+            names.update(widget._tclCommands or ())
+        return names
+
+    def proxy_commands(self):
+        # The CallWrapper swap only reaches callbacks registered from now on.
+        # The ones already bound (key bindings, menu commands, ...) are renamed
+        # and replaced by a proxy that times the call, as TextChangeHook does
+        # for the Text widget commands.
+        names = self.registered_commands()
+        self.self_timed.intersection_update(names)
+        for name in names.difference(self.self_timed):
+            # tkinter names them id + function name; after() callbacks are one-shot
+            function = name.lstrip("0123456789")
+            if function == "callit":
+                continue
+            untimed = name + "_untimed"
+            try:
+                self.root.tk.call("rename", name, untimed)
+            except tk.TclError:
+                continue
+            self.root.tk.createcommand(name, self.make_proxy(untimed, function))
+            self.proxied[name] = untimed
+
+    def make_proxy(self, command, name):
+        call = self.root.tk.call
+
+        def proxy(*args):
+            start = time.perf_counter()
+            try:
+                return call((command,) + args)
+            finally:
+                self.record(name, start, time.perf_counter() - start)
+        return proxy
+
+    def unproxy_commands(self):
+        for name, untimed in self.proxied.items():
+            if not self.root.tk.call("info", "commands", untimed):
+                continue
+            if self.root.tk.call("info", "commands", name):
+                self.root.tk.deletecommand(name)
+                self.root.tk.call("rename", untimed, name)
+            else:
+                # The widget was destroyed and deleted the proxy
+                self.root.tk.call("rename", untimed, "")
+        self.proxied = {}
+
+    def record(self, name, start, duration):
+        ring = self.samples.get(name)
+        if ring is None:
+            ring = self.samples[name] = collections.deque(maxlen=self.SAMPLES)
+        ring.append(duration)
+        self.counts[name] += 1
+        self.events.append((name, start, duration, threading.get_ident()))
+
+    def call(self, callback, args):
+        start = time.perf_counter()
+        try:
+            return callback(*args)
+        finally:
+            self.record(handler_name(callback), start, time.perf_counter() - start)
+
+    def heartbeat(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self.expected)
+        ring = self.samples.get(self.LAG)
+        if ring is None:
+            ring = self.samples[self.LAG] = collections.deque(maxlen=self.SAMPLES)
+        ring.append(lag)
+        self.counts[self.LAG] += 1
+        self.expected = now + self.HEARTBEAT / 1000
+        self.heartbeat_id = self.root.after(self.HEARTBEAT, self.heartbeat)
+
+    def percentiles(self, name):
+        # (p50, p95, p99) in seconds over the samples in the ring
+        values = sorted(self.samples[name])
+        last = len(values) - 1
+        return tuple(values[min(last, int(last * q + 0.5))] for q in (0.5, 0.95, 0.99))
+
+    def summary(self, limit=10):
+        lines = []
+        if self.LAG in self.samples:
+            p50, p95, p99 = self.percentiles(self.LAG)
+            lines.append(f"main loop lag  p50 {p50 * 1000:.1f}  p95 {p95 * 1000:.1f}  p99 {p99 * 1000:.1f} ms")
+        rows = [(self.percentiles(name), name) for name in list(self.samples) if name != self.LAG]
+        rows.sort(reverse=True)
+        lines.append(f"{'handler':<44}{'calls':>7}{'p50':>8}{'p95':>8}{'p99':>8}")
+        for (p50, p95, p99), name in rows[:limit]:
+            lines.append(f"{name[-44:]:<44}{self.counts[name]:>7}"
+                         f"{p50 * 1000:>8.2f}{p95 * 1000:>8.2f}{p99 * 1000:>8.2f}")
+        return "\n".join(lines)
+
+    def export_trace(self, path):
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "pid": pid, "tid": tid, "cat": "tk",
+                   "ts": round((start - STARTUP_BEGIN) * 1e6, 1), "dur": round(duration * 1e6, 1)}
+                  for name, start, duration, tid in list(self.events)]
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": threading.main_thread().ident,
+                       "args": {"name": "Tk main loop"}})
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+class PluginAPI:
+    # The handle a plugin gets on the editor. Hooks may run on a worker thread
+    # (see PluginHost), so everything that touches Tk is forwarded to the main
+    # loop; the calls that return data only read thread-safe state.
+    def __init__(self, editor, name):
+        self.editor = editor
+        self.name = name
+
+    def run_on_main(self, function, *args):
+        if threading.current_thread() is threading.main_thread():
+            function(*args)
+        else:
+            self.editor.call_soon(function, *args)
+
+    def current_file(self):
+        return self.editor.current_file
+
+    def text(self):
+        # Contents of the active buffer, from a snapshot of its document
+        return self.editor.document.snapshot().text()
+
+    def insert(self, index, text):
+        self.run_on_main(self.editor.text_widget.insert, index, text)
+
+    def open_file(self, path, line=None):
+        self.run_on_main(self.editor.open_path, path, line)
+
+    def run(self, command, title=None):
+        self.run_on_main(self.editor.run_command, command, title or self.name)
+
+    def show_message(self, title, message):
+        self.run_on_main(messagebox.showinfo, title, message)
+
+    def add_command(self, label, callback):
+        # Adds an entry to the Plugins menu
+        self.run_on_main(self.editor.add_plugin_command, label, callback)
+
+    def log(self, message):
+        self.editor.plugins.log(f"{self.name}: {message}")
+
+
+class Plugin:
+    def __init__(self, name, path, hooks):
+        self.name = name
+        self.path = path
+        self.hooks = hooks
+        self.module = None
+        self.api = None
+        self.disabled = False
+        self.worker = None
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.slow_calls = 0
+        self.errors = 0
+
+    def state(self):
+        if self.disabled:
+            return "disabled"
+        if self.module is None:
+            return "not loaded"
+        return "worker thread" if self.worker is not None else "main thread"
+
+
+class PluginHost:
+    # Plugins are .py files in PLUGINS_DIR defining on_<hook>(api, ...)
+    # functions and optionally setup(api). Discovery only parses the source to
+    # find the hooks; a plugin is imported when one of them first fires. Every
+    # hook call is timed, and a plugin that keeps going over the budget is
+    # moved to its own worker thread so it can't slow down typing.
+    HOOKS = ("buffer_changed", "file_opened", "file_saved", "tree_refreshed", "run_finished")
+    SLOW_CALL_LIMIT = 3
+    ERROR_LIMIT = 5
+    QUEUE_LIMIT = 1000
+
+    def __init__(self, editor, directory, budget):
+        self.editor = editor
+        self.directory = directory
+        self.budget = budget
+        self.plugins = {}
+        self.hooks = {hook: [] for hook in self.HOOKS}
+
+    def log(self, message):
+        print(f"[plugins] {message}", file=sys.stderr)
+
+    def discover(self):
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(".py"):
+                self.add(os.path.join(self.directory, name))
+
+    def add(self, path):
+        import ast
+        try:
+            with open(path, "rb") as plugin_file:
+                tree = ast.parse(plugin_file.read(), path)
+        except (OSError, SyntaxError, ValueError) as e:
+            self.log(f"Can't read plugin '{path}': {e}")
+            return None
+        hooks = [node.name[3:] for node in tree.body
+                 if isinstance(node, ast.FunctionDef) and node.name.startswith("on_") and node.name[3:] in self.HOOKS]
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in self.plugins:
+            self.remove(name)
+        plugin = Plugin(name, path, hooks)
+        self.plugins[name] = plugin
+        for hook in hooks:
+            self.hooks[hook].append(plugin)
+        return plugin
+
+    def remove(self, name):
+        plugin = self.plugins.pop(name)
+        for hook in plugin.hooks:
+            self.hooks[hook].remove(plugin)
+        if plugin.worker is not None:
+            plugin.worker.put((None, None))
+
+    def reload(self):
+        for name in list(self.plugins):
+            self.remove(name)
+        self.discover()
+
+    def load(self, plugin):
+        import importlib.util
+        plugin.api = PluginAPI(self.editor, plugin.name)
+        try:
+            spec = importlib.util.spec_from_file_location("icacode_plugin_" + plugin.name, plugin.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            if hasattr(module, "setup"):
+                module.setup(plugin.api)
+        except Exception as e:
+            self.log(f"{plugin.name}: failed to load: {e!r}")
+            plugin.disabled = True
+            return False
+        plugin.module = module
+        return True
+
+    def fire(self, hook, *args):
+        for plugin in self.hooks[hook]:
+            if plugin.worker is None:
+                self.call(plugin, hook, args)
+            elif plugin.worker.qsize() < self.QUEUE_LIMIT:
+                plugin.worker.put((hook, args))
+
+    def call(self, plugin, hook, args):
+        if plugin.disabled or plugin.module is None and not self.load(plugin):
+            return
+        start = time.perf_counter()
+        try:
+            getattr(plugin.module, "on_" + hook)(plugin.api, *args)
+        except Exception as e:
+            plugin.errors += 1
+            self.log(f"{plugin.name}: on_{hook} raised {e!r}")
+            if plugin.errors >= self.ERROR_LIMIT:
+                self.log(f"{plugin.name}: disabled after {plugin.errors} errors")
+                plugin.disabled = True
+        elapsed = time.perf_counter() - start
+        plugin.calls += 1
+        plugin.total_time += elapsed
+        plugin.max_time = max(plugin.max_time, elapsed)
+        if elapsed > self.budget and plugin.worker is None:
+            plugin.slow_calls += 1
+            self.log(f"{plugin.name}: on_{hook} took {elapsed * 1000:.1f} ms")
+            if plugin.slow_calls >= self.SLOW_CALL_LIMIT:
+                self.log(f"{plugin.name}: moved to a worker thread")
+                plugin.worker = queue.Queue()
+                threading.Thread(target=self.run_worker, args=(plugin,), daemon=True).start()
+
+    def run_worker(self, plugin):
+        while True:
+            hook, args = plugin.worker.get()
+            if hook is None:
+                return
+            self.call(plugin, hook, args)
+
+    def report(self):
+        lines = []
+        for plugin in self.plugins.values():
+            average = plugin.total_time / plugin.calls * 1000 if plugin.calls else 0.0
+            lines.append(f"{plugin.name}: {plugin.state()}, {plugin.calls} calls, "
+                         f"avg {average:.2f} ms, max {plugin.max_time * 1000:.2f} ms, {plugin.errors} errors")
+        return "\n".join(lines) or f"No plugins in {self.directory}"
+
+
+class StartupProfile:
+    # Time spent in each startup phase, printed by --profile-startup
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = []
+        self.last = STARTUP_BEGIN
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - STARTUP_BEGIN))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        lines = ["Startup profile (ms):", f"  {'phase':<20}{'time':>10}{'elapsed':>10}"]
+        for phase, duration, elapsed in self.phases:
+            lines.append(f"  {phase:<20}{duration * 1000:>10.1f}{elapsed * 1000:>10.1f}")
+        print("\n".join(lines), file=sys.stderr)
+
+
+class CodeEditor:
+    def __init__(self, root, profile=None):
         self.root = root
         self.root.title("iCACode 1.6")
-        self.themes = {
-            "Default": {"background": "#f0f0f0", "foreground": "#000000", "fieldbackground": "#f0f0f0", "selected": "#0078d4"},
-            "Dark": {"background": "#2E2E2E", "foreground": "#FFFFFF", "fieldbackground": "#2E2E2E", "selected": "#0078d4"},
-            "Green": {"background": "#00FF00", "foreground": "#000000", "fieldbackground": "#00FF00", "selected": "#0078d4"},
-            "Blue": {"background": "#0000FF", "foreground": "#FFFFFF", "fieldbackground": "#0000FF", "selected": "#0078d4"},
-            "Red": {"background": "#FF0000", "foreground": "#FFFFFF", "fieldbackground": "#FF0000", "selected": "#0078d4"},
-            "Purple": {"background": "#800080", "foreground": "#FFFFFF", "fieldbackground": "#800080", "selected": "#0078d4"},
-            "Orange": {"background": "#FFA500", "foreground": "#000000", "fieldbackground": "#FFA500", "selected": "#0078d4"}
-        }
+        self.profile = profile if profile is not None else StartupProfile(False)
+        self.settings = load_settings()
+        # Time every Tk callback from here on
+        self.latency = LatencyMonitor(self.root)
+        if self.settings["latency_instrumentation"]:
+            self.latency.install()
+        self.latency_overlay = None
+        self.themes = THEMES
         self.selected_theme = "Default"
         self.language = "plain"  # Inicializando a variável language
+        # Callbacks posted from worker threads, run on the Tk main loop
+        self.ui_queue = queue.Queue()
+        self.large_file = None
+        self.large_paging = False
+        self.file_loader = FileLoader(self.call_soon)
+        # Directory tree state: item ids are absolute paths
+        self.tree_root = None
+        self.tree_entries = {}
+        self.tree_loaded = {}
+        self.pending_line = None
+        self.pending_preview = False
+        self.search_matches = None
+        self.search_generation = 0
+        self.search_after_id = None
+        self.search_render_id = None
+        self.search_current = -1
+        # Completion sources: identifiers of the open buffers and of the
+        # project files, and the snippet tries loaded per language
+        self.buffer_identifiers = IdentifierIndex()
+        self.project_identifiers = IdentifierIndex()
+        self.project_identifier_files = {}
+        self.project_identifier_generation = 0
+        self.snippet_tries = {}
+        self.completion_popup = None
+        self.completion_items = []
+        # Saves and edit journals are written on this thread
+        self.journal_writer = BackgroundWriter()
+        # Symbol index of the project, filled from the process pool, and the
+        # outline panel showing the symbols of the active buffer
+        self.symbol_index = None
+        self.symbol_generation = 0
+        # Go to Symbol queries run one at a time on this thread, which alone
+        # uses symbol_connection
+        self.symbol_search_executor = None
+        self.symbol_search_generation = 0
+        self.symbol_connection = None
+        self.symbol_parse_id = None
+        self.outline = None
+        self.outline_lines = {}
+        # Other features add callbacks here to receive the batched directory changes
+        self.directory_listeners = [self.handle_directory_changes]
+        self.directory_watcher = None
+        self.plugins = PluginHost(self, PLUGINS_DIR, self.settings["plugin_hook_budget_ms"] / 1000)
+        self.plugin_commands = []
+        self.plugins_menu = None
+        self.profile.mark("editor state")
         self.create_widgets()
-        self.setup_directory_observer()
+        self.file_index = None
+        self.file_index_generation = 0
+        self.file_index_save_timer = None
+        self.find_window = None
+        self.process_pool = None
+        self.process_pool_closed = False
+        self.process_pool_lock = threading.Lock()
+        self.root.bind("<Destroy>", self.on_root_destroyed, add="+")
+        self.find_generation = 0
+        self.find_futures = []
+        self.output_panel = None
+        self.run_views = {}
+        self.build_cache = None
+        # Git decorations of the tree: one status query runs at a time and the
+        # paths changed meanwhile are batched into the next one
+        self.git_status = None
+        self.git_generation = 0
+        self.git_running = False
+        self.git_pending = set()
+        self.git_full_pending = False
+        self.git_head_key = None
+        self.git_poll_id = None
+        self.directory_listeners.append(self.update_file_index)
+        self.directory_listeners.append(self.update_project_identifiers)
+        self.directory_listeners.append(self.update_git_status)
+        self.directory_listeners.append(self.update_symbol_index)
         self.treeview_open = True
         self.editor_window = None
+        self.poll_ui_queue()
         # Configuração de fonte e estilo para o Text widget
         self.text_widget.configure(font=("Courier New", 12))
-        
-        self.python_snippets = {
-            "if": "if condition:\n    # code",
-            "for": "for item in iterable:\n    # code",
-            "print": "print('Hello, World!')",
-            "def": "def funcname(etc):\n    #code",
-            "elif": "elif condition:\n    #code",
-            "else": "else:    #code",
-            "import": "import lib",
-            "from": "from lib import item",
-            "pygame": "import pygame as pg\nfrom pygame.locals import *\nimport sys\n",
-            "pygameinit": "pg.init()\n",
-            "pygamedrawrect": "pg.draw.rect(screenname, (r,g,b), (posx,posy,sizex,sizey))",
-            "pygamedrawcircle": "pg.draw.circle(screenname, (r,g,b), (posx,posy), radius",
-            "pygamescreen": "pg.display.set_mode((width,height))",
-            "pygamecaption": "pg.display.set_caption('window name')",
-            # Adicione mais snippets conforme necessário
-        }
-
-        # Snippets predefinidos para JavaScript
-        self.javascript_snippets = {
-            "if": "if (condition) {\n    // code\n}",
-            "for": "for (let i = 0; i < array.length; i++) {\n    // code\n}",
-            "console.log": "console.log('Hello, World!');",
-            # Adicione mais snippets conforme necessário
-        }
+        # Everything not needed for the first frame runs once the window is
+        # mapped, one task per event loop turn
+        self.startup_tasks = [("tree", self.update_treeview),
+                              ("directory watcher", self.setup_directory_observer),
+                              ("file index", self.start_file_index),
+                              ("plugins", self.plugins.discover),
+                              ("recovery", self.recover_journals)]
+        self.root.bind("<Map>", self.on_root_mapped, add="+")
         
     def create_widgets(self):
         # Main frame
         main_frame = tk.Frame(self.root)
         main_frame.pack(fill="both", expand=True)
+        self.main_frame = main_frame
 
         # Treeview to display directory tree
         self.treeview = ttk.Treeview(main_frame, style="Custom.Treeview")
@@ -67,17 +3261,32 @@ class CodeEditor:
         scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self.treeview.yview)
         scrollbar.pack(side="right", fill="y")
         self.treeview.configure(yscrollcommand=scrollbar.set)
+        self.treeview.tag_configure("directory", foreground="#0000FF")
+        for tag, color in GIT_TAGS.values():
+            self.treeview.tag_configure(tag, foreground=color)
 
-        # Text widget for the code editor
-        self.text_widget = tk.Text(main_frame, wrap="word", undo=True)
-        self.text_widget.pack(side="right", fill="both", expand=True)
+        # One tab per open file; each tab has its own Text widget
+        self.editor_tabs = ttk.Notebook(main_frame)
+        self.editor_tabs.pack(side="right", fill="both", expand=True)
+        self.editor_tabs.enable_traversal()
+        self.editor_tabs.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.editor_tabs.bind("<Button-2>", self.on_tab_middle_click)
+        self.buffers = []
+        self.buffer = None
+        self.buffer_clock = itertools.count(1)
+        # Called with (kind, start, end, text) for every change in any buffer
+        self.text_listeners = [self.on_search_buffer_changed, self.on_plugin_buffer_changed,
+                               self.on_symbol_buffer_changed]
+        self.create_search_bar()
+        self.new_buffer()
 
         # Initial settings for syntax highlighting
         self.set_syntax_highlighting()
+        self.profile.mark("widgets")
 
         # Menu bar
-        menu_bar = tk.Menu(root)
-        root.config(menu=menu_bar)
+        menu_bar = tk.Menu(self.root)
+        self.root.config(menu=menu_bar)
 
         file_menu = tk.Menu(menu_bar, tearoff=0)
         menu_bar.add_cascade(label="File", menu=file_menu)
@@ -85,6 +3294,7 @@ class CodeEditor:
         file_menu.add_command(label="Open", command=self.open_file)
         file_menu.add_command(label="Save", command=self.save_file)
         file_menu.add_command(label="Save as...", command=self.save_file_as)
+        file_menu.add_command(label="Close Tab", command=lambda: self.close_buffer(self.buffer))
         file_menu.add_command(label="New Folder", command=self.create_new_folder)
         file_menu.add_separator()
         file_menu.add_command(label="Open iCACode", command=self.open_icacode)
@@ -100,25 +3310,127 @@ class CodeEditor:
         file_menu.add_cascade(label="Navigate", menu=back_submenu)
 
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=root.destroy)
+        file_menu.add_command(label="Exit", command=self.root.destroy)
+
+        # Rarely used menus are filled in the first time they are opened
+        self.add_lazy_menu(menu_bar, "Advanced", self.build_advanced_menu)
+        self.add_lazy_menu(menu_bar, "Language", self.build_language_menu)
+        self.add_lazy_menu(menu_bar, "Execute", self.build_execute_menu)
+        
+        # Edit Menu
+        edit_menu = tk.Menu(menu_bar, tearoff=0)
+        menu_bar.add_cascade(label="Edit", menu=edit_menu)
+        edit_menu.add_command(label="Search", command=self.search)
+        edit_menu.add_command(label="Go to Line", command=self.go_to_line)
+        edit_menu.add_command(label="Search Files/Folders", command=self.search_files_folders)
+        edit_menu.add_command(label="Go to File...", command=self.show_quick_open)
+        edit_menu.add_command(label="Go to Symbol...", command=self.show_go_to_symbol)
+        edit_menu.add_command(label="Find in Files...", command=self.show_find_in_files)
+        edit_menu.add_command(label="Insert Snippet", command=self.insert_snippet)
+        
+        self.add_lazy_menu(menu_bar, "Plugins", self.build_plugins_menu)
+        self.profile.mark("menus")
+
+        # Connect directory tree selection to editor update function
+        self.treeview.bind("<<TreeviewSelect>>", self.update_editor)
+        self.treeview.bind("<<TreeviewOpen>>", self.on_tree_open)
+        self.treeview.bind("<Double-1>", self.on_tree_double_click)
+
+        # Connect keyboard shortcuts
+        self.root.bind('<Control-z>', lambda event: self.undo())
+        self.root.bind('<Control-y>', lambda event: self.redo())
+        self.root.bind('<Control-s>', lambda event: self.save_file())
+        self.root.bind('<Control-Alt-s>', lambda event: self.save_file_as())
+        self.root.bind('<Control-o>', lambda event: self.open_directory())
+        self.root.bind('<Control-b>', lambda event: self.navigate_back())
+        self.root.bind('<Control-a>', lambda event: self.select_all_text(event))
+        self.root.bind('<Control-g>', lambda event: self.go_to_line())
+        self.root.bind('<Control-p>', lambda event: self.show_quick_open())
+        self.root.bind('<Control-t>', lambda event: self.show_go_to_symbol())
+        self.root.bind('<Control-O>', lambda event: self.toggle_outline())
+        self.root.bind('<Control-d>', lambda event: self.show_diff())
+        self.root.bind('<Control-F>', lambda event: self.show_find_in_files())
+        self.root.bind('<Control-f>', lambda event: self.search())
+        self.root.bind('<Control-w>', lambda event: self.close_buffer(self.buffer))
+        self.root.bind('<Control-L>', lambda event: self.toggle_latency_overlay())
+        
+        self.root.bind('<Up>', lambda event: self.navigate_directory(-1))
+        self.root.bind('<Down>', lambda event: self.navigate_directory(1))
+
+    def add_lazy_menu(self, menu_bar, label, build):
+        menu = tk.Menu(menu_bar, tearoff=0)
+        menu.configure(postcommand=lambda: self.populate_lazy_menu(menu, build))
+        menu_bar.add_cascade(label=label, menu=menu)
 
+    def populate_lazy_menu(self, menu, build):
+        menu.configure(postcommand="")
+        build(menu)
 
-        # Advanced Menu
-        advanced_menu = tk.Menu(menu_bar, tearoff=0)
-        menu_bar.add_cascade(label="Advanced", menu=advanced_menu)
+    def build_advanced_menu(self, advanced_menu):
         advanced_menu.add_command(label="Show Version", command=self.show_version)
         advanced_menu.add_command(label="Reload Tree", command=self.update_treeview)
         advanced_menu.add_command(label="Toggle Theme", command=self.toggle_theme)
         advanced_menu.add_command(label="Toggle Treeview", command=self.toggle_treeview)
+        advanced_menu.add_command(label="Toggle Outline", command=self.toggle_outline)
+        advanced_menu.add_command(label="Show Diff", command=self.show_diff)
+        self.diff_head_var = tk.BooleanVar(value=self.settings["diff_base"] == "head")
+        advanced_menu.add_checkbutton(label="Diff Against Git HEAD", variable=self.diff_head_var,
+                                      command=self.toggle_diff_base)
+        advanced_menu.add_command(label="Watch Ignore Patterns...", command=self.edit_ignore_patterns)
+        self.latency_var = tk.BooleanVar(value=self.settings["latency_instrumentation"])
+        advanced_menu.add_checkbutton(label="Latency Instrumentation", variable=self.latency_var,
+                                      command=self.toggle_latency_instrumentation)
+        advanced_menu.add_command(label="Latency Overlay", command=self.toggle_latency_overlay)
+        advanced_menu.add_command(label="Export Latency Trace...", command=self.export_latency_trace)
         advanced_menu.add_separator()
         theme_menu = tk.Menu(advanced_menu, tearoff=0)
         advanced_menu.add_cascade(label="Select Theme", menu=theme_menu)
         for theme_name in self.themes.keys():
             theme_menu.add_command(label=theme_name, command=lambda name=theme_name: self.select_theme(name))
-        
-        # Language Menu
-        language_menu = tk.Menu(menu_bar, tearoff=0)
-        menu_bar.add_cascade(label="Language", menu=language_menu)
+
+    def toggle_latency_instrumentation(self):
+        self.settings["latency_instrumentation"] = self.latency_var.get()
+        save_settings(self.settings)
+        if self.settings["latency_instrumentation"]:
+            self.latency.install()
+            return
+        self.latency.uninstall()
+        if self.latency_overlay is not None:
+            self.toggle_latency_overlay()
+
+    def toggle_latency_overlay(self):
+        # Stats drawn over the top right corner of the window, refreshed every second
+        if self.latency_overlay is not None:
+            self.latency_overlay.destroy()
+            self.latency_overlay = None
+            return
+        if LatencyMonitor.active is None:
+            messagebox.showinfo("Latency", "Latency instrumentation is turned off (Advanced > Latency Instrumentation).")
+            return
+        self.latency_overlay = tk.Label(self.root, justify="left", anchor="nw", font=("Courier New", 9),
+                                        background="#FFFFE0", foreground="#000000", relief="solid", borderwidth=1)
+        self.latency_overlay.place(relx=1.0, rely=0.0, anchor="ne")
+        self.refresh_latency_overlay()
+
+    def refresh_latency_overlay(self):
+        if self.latency_overlay is not None:
+            self.latency_overlay.config(text=self.latency.summary())
+            self.latency_overlay.lift()
+            self.root.after(1000, self.refresh_latency_overlay)
+
+    def export_latency_trace(self):
+        if LatencyMonitor.active is None:
+            messagebox.showinfo("Latency", "Latency instrumentation is turned off (Advanced > Latency Instrumentation).")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="icacode-trace.json",
+                                                 filetypes=[("Chrome Trace", "*.json"), ("All Files", "*.*")])
+        if file_path:
+            try:
+                self.latency.export_trace(file_path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Error saving trace: {str(e)}")
+
+    def build_language_menu(self, language_menu):
         language_menu.add_command(label="C", command=lambda: self.change_language("c"))
         language_menu.add_command(label="C++", command=lambda: self.change_language("cpp"))
         language_menu.add_command(label="C#", command=lambda: self.change_language("csharp"))
@@ -127,128 +3439,413 @@ class CodeEditor:
         language_menu.add_command(label="Python", command=lambda: self.change_language("python"))
         language_menu.add_command(label="Plain Text", command=lambda: self.change_language("plain"))
 
-        # Execute Menu
-        execute_menu = tk.Menu(menu_bar, tearoff=0)
-        menu_bar.add_cascade(label="Execute", menu=execute_menu)
+    def build_execute_menu(self, execute_menu):
         execute_menu.add_command(label="Python", command=lambda: self.execute_file("python"))
         execute_menu.add_command(label="JavaScript", command=lambda: self.execute_file("javascript"))
         execute_menu.add_command(label="C/C++", command=lambda: self.execute_file("c_cpp"))
-        
-        # Edit Menu
-        edit_menu = tk.Menu(menu_bar, tearoff=0)
-        menu_bar.add_cascade(label="Edit", menu=edit_menu)
-        edit_menu.add_command(label="Search", command=self.search)
-        edit_menu.add_command(label="Search Files/Folders", command=self.search_files_folders)
-        edit_menu.add_command(label="Insert Snippet", command=self.insert_snippet)
-        
-        plugins_menu = tk.Menu(menu_bar, tearoff=0)
-        menu_bar.add_cascade(label="Plugins", menu=plugins_menu)
+        execute_menu.add_separator()
+        execute_menu.add_command(label="Toggle Output Panel", command=self.toggle_output_panel)
+
+    def build_plugins_menu(self, plugins_menu):
         plugins_menu.add_command(label="Load Plugin", command=self.load_plugin)
+        plugins_menu.add_command(label="Reload Plugins", command=self.plugins.reload)
+        plugins_menu.add_command(label="Plugin Timings", command=lambda: messagebox.showinfo("Plugins", self.plugins.report()))
+        plugins_menu.add_separator()
+        self.plugins_menu = plugins_menu
+        for label, callback in self.plugin_commands:
+            plugins_menu.add_command(label=label, command=callback)
 
-        # Update the directory tree
-        self.update_treeview()
+    def add_plugin_command(self, label, callback):
+        self.plugin_commands.append((label, callback))
+        if self.plugins_menu is not None:
+            self.plugins_menu.add_command(label=label, command=callback)
 
-        # Connect directory tree selection to editor update function
-        self.treeview.bind("<<TreeviewSelect>>", self.update_editor)
+    def on_plugin_buffer_changed(self, kind, start, end, text):
+        if self.plugins.hooks["buffer_changed"]:
+            self.plugins.fire("buffer_changed", self.current_file, kind, start, end, text)
 
-        # Connect syntax highlighting function to text modification event
-        self.text_widget.bind("<KeyRelease>", self.highlight_syntax)
+    def on_root_mapped(self, event):
+        # The window is on screen: draw the first frame, then run the deferred
+        # startup tasks
+        if event.widget is not self.root or self.startup_tasks is None:
+            return
+        self.root.update_idletasks()
+        self.profile.mark("first paint")
+        self.root.after(0, self.run_startup_task)
 
-        # Connect right-click event for deleting files
-        self.text_widget.bind("<Button-3>", self.show_context_menu)
+    def run_startup_task(self):
+        phase, task = self.startup_tasks.pop(0)
+        task()
+        self.profile.mark(phase)
+        if self.startup_tasks:
+            self.root.after(0, self.run_startup_task)
+        else:
+            self.startup_tasks = None
+            self.profile.report()
 
-        # Connect keyboard shortcuts
-        self.root.bind('<Control-z>', lambda event: self.undo())
-        self.root.bind('<Control-y>', lambda event: self.redo())
-        self.root.bind('<Control-s>', lambda event: self.save_file())
-        self.root.bind('<Control-Alt-s>', lambda event: self.save_file_as())
-        self.root.bind('<Control-o>', lambda event: self.open_directory())
-        self.root.bind('<Control-b>', lambda event: self.navigate_back())
-        self.root.bind('<Control-a>', lambda event: self.select_all_text(event))
-        
-        self.root.bind('<Up>', lambda event: self.navigate_directory(-1))
-        self.root.bind('<Down>', lambda event: self.navigate_directory(1))
-    
     def insert_snippet(self):
+        # Offer the snippets matching the word before the cursor
         language = self.language.lower()
+        if not self.snippet_trie(language).size:
+            messagebox.showwarning("Snippet Error", f"Snippets not available for {language.capitalize()}.")
+            return
+        self.show_completion(force=True)
 
-        if language == "python":
-            snippets = self.python_snippets
-        elif language == "javascript":
-            snippets = self.javascript_snippets
+    def snippet_trie(self, language):
+        # Snippets are read the first time a language needs them
+        trie = self.snippet_tries.get(language)
+        if trie is None:
+            snippets = dict(DEFAULT_SNIPPETS.get(language, {}))
+            try:
+                with open(os.path.join(SNIPPETS_DIR, language + ".json"), "r") as snippets_file:
+                    snippets.update(json.load(snippets_file))
+            except (OSError, ValueError):
+                pass
+            trie = PrefixTrie()
+            for name, body in snippets.items():
+                trie.insert(name, body)
+            self.snippet_tries[language] = trie
+        return trie
+
+    def completion_prefix(self):
+        match = re.search(r"[A-Za-z_][A-Za-z0-9_.]*$", self.text_widget.get("insert linestart", tk.INSERT))
+        return match.group() if match else ""
+
+    def completions(self, prefix):
+        # (label, text, is_snippet, characters replaced before the cursor).
+        # Snippets first, then identifiers from the open buffers before the
+        # ones only seen in project files. Snippet names may contain dots,
+        # identifiers complete the part after the last one.
+        items = [(name, body, True, len(prefix))
+                 for name, body in self.snippet_trie(self.language).complete(prefix, COMPLETION_LIMIT)]
+        word = prefix.rsplit(".", 1)[-1]
+        if len(word) >= 2:
+            seen = {word}
+            for name in self.buffer_identifiers.complete(word, COMPLETION_LIMIT * 2) + \
+                    self.project_identifiers.complete(word, COMPLETION_LIMIT * 2):
+                if name not in seen and len(items) < COMPLETION_LIMIT:
+                    seen.add(name)
+                    items.append((name, name, False, len(word)))
+        return items
+
+    def on_completion_key(self, event):
+        if self.large_file is not None or event.keysym in ("Up", "Down", "Tab", "Return", "Escape"):
+            return
+        if event.char and (event.char.isalnum() or event.char == "_") or \
+                event.keysym == "BackSpace" and self.completion_popup is not None and self.completion_popup.winfo_ismapped():
+            self.show_completion()
         else:
-            messagebox.showwarning("Snippet Error", f"Snippets not available for {language.capitalize()}.")
+            self.hide_completion()
+
+    def show_completion(self, force=False):
+        prefix = self.completion_prefix()
+        items = self.completions(prefix) if len(prefix) >= 2 or force else []
+        if not items:
+            self.hide_completion()
             return
+        if self.completion_popup is None:
+            self.completion_popup = tk.Toplevel(self.root)
+            self.completion_popup.overrideredirect(True)
+            self.completion_list = tk.Listbox(self.completion_popup, height=COMPLETION_LIMIT, width=40,
+                                              font=("Courier New", 11), activestyle="none")
+            self.completion_list.pack(fill="both", expand=True)
+            self.completion_list.bind("<Double-1>", lambda event: self.accept_completion())
+        self.completion_items = items
+        self.completion_list.delete(0, tk.END)
+        for name, body, is_snippet, length in items:
+            self.completion_list.insert(tk.END, f"{name}  [snippet]" if is_snippet else name)
+        self.completion_list.configure(height=len(items))
+        self.completion_list.selection_set(0)
+        bbox = self.text_widget.bbox(tk.INSERT)
+        if bbox is None:
+            self.hide_completion()
+            return
+        x = self.text_widget.winfo_rootx() + bbox[0]
+        y = self.text_widget.winfo_rooty() + bbox[1] + bbox[3]
+        self.completion_popup.geometry(f"+{x}+{y}")
+        self.completion_popup.deiconify()
+        self.completion_popup.lift()
+
+    def hide_completion(self):
+        if self.completion_popup is not None:
+            self.completion_popup.withdraw()
 
-        snippet_name = simpledialog.askstring("Insert Snippet", "Enter snippet name:")
-        if snippet_name in snippets:
-            snippet_code = snippets[snippet_name]
-            self.text_widget.insert(tk.INSERT, snippet_code)
+    def on_completion_nav(self, event):
+        # Keys go to the completion list while it is shown
+        if self.completion_popup is None or not self.completion_popup.winfo_ismapped():
+            return None
+        if event.keysym == "Escape":
+            self.hide_completion()
+        elif event.keysym in ("Up", "Down"):
+            selection = self.completion_list.curselection()
+            index = (selection[0] if selection else 0) + (1 if event.keysym == "Down" else -1)
+            index %= len(self.completion_items)
+            self.completion_list.selection_clear(0, tk.END)
+            self.completion_list.selection_set(index)
+            self.completion_list.see(index)
         else:
-            messagebox.showwarning("Snippet Error", f"Snippet '{snippet_name}' not found.")
+            self.accept_completion()
+        return "break"
+
+    def accept_completion(self):
+        selection = self.completion_list.curselection()
+        if selection:
+            name, body, is_snippet, length = self.completion_items[selection[0]]
+            self.text_widget.delete(f"insert-{length}c", tk.INSERT)
+            self.text_widget.insert(tk.INSERT, body)
+            self.text_widget.see(tk.INSERT)
+        self.hide_completion()
+        self.text_widget.focus_set()
     
     def load_plugin(self):
+        # Load a plugin file for this session; files in the plugins directory
+        # are picked up at startup
         file_path = filedialog.askopenfilename(defaultextension=".py", filetypes=[("Python Files", "*.py"), ("All Files", "*.*")])
         if file_path:
-            try:
-                # Carrega e executa o código do plugin
-                with open(file_path, "r") as plugin_file:
-                    plugin_code = plugin_file.read()
-                    exec(plugin_code)
-
-                # Fecha a janela atual do iCACode
-                self.root.destroy()
-            except Exception as e:
-                messagebox.showerror("Error", f"Error loading plugin: {str(e)}")
+            plugin = self.plugins.add(file_path)
+            if plugin is None or not self.plugins.load(plugin):
+                messagebox.showerror("Error", f"Error loading plugin '{file_path}', see the log for details.")
+            else:
+                hooks = ", ".join(plugin.hooks) or "no hooks"
+                messagebox.showinfo("Plugin", f"Plugin '{plugin.name}' loaded ({hooks}).")
     
     def undo(self):
-        if self.undo_stack:
-            last_change = self.undo_stack.pop()
-            self.redo_stack.append(self.text_widget.get("1.0", tk.END))
+        self.history.undo()
+
+    def redo(self):
+        self.history.redo()
+
+    def set_buffer_content(self, content):
+        # Replace the whole buffer without recording it in the undo history
+        self.history.replaying = True
+        self.buffer.loading = True
+        try:
             self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert(tk.END, last_change)
+            self.text_widget.insert(tk.END, content)
+        finally:
+            self.history.replaying = False
+            self.buffer.loading = False
+        self.document.load(content)
+        self.history.clear()
+        self.buffer.journal.reset(self.current_file, text=content)
+        self.text_widget.mark_set(tk.INSERT, "1.0")
+    
+    def select_all_text(self, event):
+        self.text_widget.tag_add(tk.SEL, "1.0", tk.END)
+    
+    def search_files_folders(self):
+        search_term = simpledialog.askstring("Search", "Enter search term:")
+        if search_term:
+            self.treeview.delete(*self.treeview.get_children())  # Limpa a árvore de diretórios
+            # The next update_treeview has to rebuild the tree from scratch
+            self.tree_root = None
+
+            current_directory = os.getcwd()
+            for name, item_path, is_directory in self.scan_directory(current_directory):
+                if search_term.lower() in name.lower():
+                    tags = ("directory",) if is_directory else ("file",)
+                    self.treeview.insert("", "end", iid=item_path, text=name, tags=tags)
+    
+    def select_all_text(self, event):
+        self.text_widget.tag_add(tk.SEL, "1.0", tk.END)
+    
+    def create_search_bar(self):
+        # Search bar shown under the editor by Edit > Search (Ctrl+F)
+        self.search_bar = tk.Frame(self.root)
+        tk.Label(self.search_bar, text="Search:").pack(side="left")
+        self.search_entry = tk.Entry(self.search_bar, width=40)
+        self.search_entry.pack(side="left", fill="x", expand=True)
+        self.search_regex = tk.BooleanVar(value=False)
+        self.search_case = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.search_bar, text="Regex", variable=self.search_regex, command=self.schedule_search).pack(side="left")
+        tk.Checkbutton(self.search_bar, text="Match case", variable=self.search_case, command=self.schedule_search).pack(side="left")
+        self.search_count = tk.Label(self.search_bar, width=18, anchor="w")
+        self.search_count.pack(side="left")
+        tk.Button(self.search_bar, text="Previous", command=lambda: self.search_step(-1)).pack(side="left")
+        tk.Button(self.search_bar, text="Next", command=lambda: self.search_step(1)).pack(side="left")
+        tk.Button(self.search_bar, text="X", command=self.close_search_bar).pack(side="left")
+        self.search_entry.bind("<KeyRelease>", self.on_search_key)
+        self.search_entry.bind("<Return>", lambda event: self.search_step(1))
+        self.search_entry.bind("<Shift-Return>", lambda event: self.search_step(-1))
+        self.search_entry.bind("<Escape>", lambda event: self.close_search_bar())
+
+    def search(self):
+        # Implementa a funcionalidade de pesquisa
+        if not self.search_bar.winfo_ismapped():
+            self.search_bar.pack(side="bottom", fill="x", before=self.main_frame)
+        self.search_entry.focus_set()
+        self.search_entry.select_range(0, tk.END)
+
+    def close_search_bar(self):
+        self.search_generation += 1
+        self.search_matches = None
+        self.search_bar.pack_forget()
+        self.text_widget.tag_remove("search", "1.0", tk.END)
+        self.text_widget.tag_remove("search_current", "1.0", tk.END)
+        self.text_widget.focus_set()
+
+    def on_search_key(self, event):
+        if event.keysym not in ("Return", "Escape", "Shift_L", "Shift_R"):
+            self.schedule_search()
+
+    def schedule_search(self, delay=100):
+        # Re-search shortly after the query or the buffer stops changing
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(delay, self.start_search)
+
+    def on_search_buffer_changed(self, kind, start, end, text):
+        # TextChangeHook listener: match offsets are stale after an edit
+        if self.search_matches is not None and self.search_bar.winfo_ismapped():
+            self.schedule_search(300)
+
+    def start_search(self):
+        # Search a snapshot of the document on a worker thread, cancelling the
+        # previous search
+        self.search_after_id = None
+        self.search_generation += 1
+        generation = self.search_generation
+        query = self.search_entry.get()
+        self.search_matches = None
+        self.search_current = -1
+        self.render_search_matches()
+        if not query:
+            self.search_count.config(text="")
+            return
+        if self.large_file is not None:
+            self.search_count.config(text="Enter: next match")
+            return
+        try:
+            pattern = re.compile(query if self.search_regex.get() else re.escape(query),
+                                 0 if self.search_case.get() else re.IGNORECASE)
+        except re.error:
+            self.search_count.config(text="Invalid regex")
+            return
+        self.search_count.config(text="Searching...")
+        snapshot = self.document.snapshot()
+
+        def work():
+            matches = SearchMatches.find(snapshot, pattern, lambda: generation != self.search_generation)
+            if matches is not None:
+                self.call_soon(self.on_search_done, generation, matches)
+        threading.Thread(target=work, daemon=True).start()
+
+    def on_search_done(self, generation, matches):
+        if generation != self.search_generation:
+            return
+        self.search_matches = matches
+        self.search_count.config(text=f"{len(matches)} matches")
+        self.render_search_matches()
+
+    def render_search_matches(self):
+        # Tag only the matches around the visible lines
+        self.text_widget.tag_remove("search", "1.0", tk.END)
+        self.text_widget.tag_remove("search_current", "1.0", tk.END)
+        matches = self.search_matches
+        if not matches:
+            return
+        top, bottom = self.highlighter.visible_lines()
+        first, last = matches.in_lines(max(0, top - SyntaxHighlighter.VIEWPORT_MARGIN),
+                                       bottom + SyntaxHighlighter.VIEWPORT_MARGIN)
+        last = min(last, first + 5000)
+        indices = []
+        for i in range(first, last):
+            indices.append(matches.index(matches.starts[i]))
+            indices.append(matches.index(matches.ends[i]))
+        if indices:
+            self.text_widget.tag_add("search", *indices)
+        if 0 <= self.search_current < len(matches):
+            self.text_widget.tag_add("search_current", matches.index(matches.starts[self.search_current]),
+                                     matches.index(matches.ends[self.search_current]))
+
+    def search_step(self, direction):
+        # Move to the next or previous match from the cursor
+        if self.large_file is not None:
+            if self.search_entry.get():
+                self.search_large_file(self.search_entry.get())
+            return
+        matches = self.search_matches
+        if not matches:
+            return
+        line, col = map(int, self.text_widget.index(tk.INSERT).split("."))
+        cursor = self.document.offset_of(line, col)
+        if direction > 0:
+            current = bisect.bisect_left(matches.starts, cursor)
+            if current == self.search_current:
+                current += 1
+            current %= len(matches)
+        else:
+            current = (bisect.bisect_left(matches.starts, cursor) - 1) % len(matches)
+        self.search_current = current
+        self.search_count.config(text=f"{current + 1} of {len(matches)}")
+        self.text_widget.mark_set(tk.INSERT, matches.index(matches.starts[current]))
+        self.text_widget.see(tk.INSERT)
+        self.render_search_matches()
+
+    def search_large_file(self, search_text):
+        # Search the mmap from the last match instead of the loaded window, on
+        # a worker thread. The pattern is a bytes regex, so Match case off
+        # only folds ASCII letters.
+        flags = re.MULTILINE if self.search_case.get() else re.MULTILINE | re.IGNORECASE
+        query = search_text.encode("utf-8")
+        try:
+            pattern = re.compile(query if self.search_regex.get() else re.escape(query), flags)
+        except re.error:
+            self.search_count.config(text="Invalid regex")
+            return
+        self.search_generation += 1
+        generation = self.search_generation
+        view = self.large_file
+        self.search_count.config(text="Searching...")
+        view.search_async(pattern, self.large_search_offset,
+                          lambda span: self.call_soon(self.on_large_search_done, generation, view, span),
+                          lambda: generation != self.search_generation)
 
-    def redo(self):
-        if self.redo_stack:
-            next_change = self.redo_stack.pop()
-            self.undo_stack.append(self.text_widget.get("1.0", tk.END))
-            self.text_widget.delete("1.0", tk.END)
-            self.text_widget.insert(tk.END, next_change)
-    
-    def select_all_text(self, event):
-        self.text_widget.tag_add(tk.SEL, "1.0", tk.END)
-    
-    def search_files_folders(self):
-        search_term = simpledialog.askstring("Search", "Enter search term:")
-        if search_term:
-            self.treeview.delete(*self.treeview.get_children())  # Limpa a árvore de diretórios
+    def on_large_search_done(self, generation, view, span):
+        if generation != self.search_generation or view is not self.large_file:
+            return
+        if span is None:
+            self.search_count.config(text="No matches")
+            return
+        offset, end = span
+        if offset >= view.indexed_offset and not view.done:
+            self.search_count.config(text="Still indexing...")
+            return
+        self.search_count.config(text="Enter: next match")
+        self.large_search_offset = offset + 1
+        line = view.line_of_offset(offset)
+        column = len(view.mmap[view.line_offset(line):offset].decode("utf-8", errors="replace"))
+        length = len(view.mmap[offset:end].decode("utf-8", errors="replace"))
+        self.show_large_window(line - LARGE_FILE_WINDOW // 2, line)
+        start_index = f"{line - self.large_window_start + 1}.{column}"
+        self.text_widget.tag_remove("search", "1.0", tk.END)
+        self.text_widget.tag_add("search", start_index, f"{start_index}+{length}c")
+        self.text_widget.tag_config("search", background="yellow")
+        self.text_widget.see(start_index)
 
-            current_directory = os.getcwd()
-            for item in os.listdir(current_directory):
-                if search_term.lower() in item.lower():
-                    self.treeview.insert("", "end", text=item, open=True)
-    
-    def select_all_text(self, event):
-        self.text_widget.tag_add(tk.SEL, "1.0", tk.END)
-    
-    def search(self):
-        # Implementa a funcionalidade de pesquisa
-        search_text = simpledialog.askstring("Search", "Enter text to search:")
-        if search_text:
-            start_index = "1.0"
-            while True:
-                start_index = self.text_widget.search(search_text, start_index, stopindex=tk.END)
-                if not start_index:
-                    break
-                end_index = f"{start_index}+{len(search_text)}c"
-                self.text_widget.tag_add("search", start_index, end_index)
-                start_index = end_index
-            self.text_widget.tag_config("search", background="yellow")
+    def go_to_line(self):
+        line = simpledialog.askinteger("Go to Line", "Enter line number:", minvalue=1)
+        if line:
+            self.show_line(line)
+
+    def show_line(self, line):
+        if self.large_file is not None:
+            if line > self.large_file.indexed_lines:
+                messagebox.showinfo("Go to Line", f"Only {self.large_file.indexed_lines} lines are indexed so far.")
+                return
+            self.show_large_window(line - 1 - LARGE_FILE_WINDOW // 2, line - 1)
+            line -= self.large_window_start
+        self.text_widget.mark_set(tk.INSERT, f"{line}.0")
+        self.text_widget.see(tk.INSERT)
 
     def open_icacode(self):
         icacode_path = os.path.abspath(__file__)  # Caminho absoluto do script iCACode
-        with open(icacode_path, "r") as icacode_file:
-            content = icacode_file.read()
+        self.file_loader.read_async(icacode_path, self.on_icacode_loaded)
+
+    def on_icacode_loaded(self, path, content, error):
+        if error:
+            messagebox.showerror("Error", f"Error opening '{path}': {str(error)}")
+        else:
             self.open_editor_window(content)
 
     def open_editor_window(self, initial_content=""):
@@ -272,7 +3869,7 @@ class CodeEditor:
             modified_file.write(editor_text_widget.get("1.0", tk.END))
 
         # Executa o código do arquivo modificado
-        subprocess.run(["python", modified_file_path])
+        self.run_command([sys.executable, modified_file_path], "ic_modify.py")
 
         # Fecha a janela do editor de código
         editor_window.destroy()  
@@ -280,13 +3877,14 @@ class CodeEditor:
     def navigate_directory(self, direction):
         selected_item = self.treeview.selection()
         if selected_item:
+            siblings = self.treeview.get_children(self.treeview.parent(selected_item[0]))
             index = self.treeview.index(selected_item)
             new_index = index + direction
-            if 0 <= new_index < len(self.treeview.get_children()):
-                new_item = self.treeview.get_children()[new_index]
+            if 0 <= new_index < len(siblings):
+                new_item = siblings[new_index]
                 self.treeview.selection_set(new_item)
                 self.treeview.see(new_item)
-                self.update_editor(None)  # Atualiza o editor para exibir o conteúdo do novo item
+                # selection_set fires <<TreeviewSelect>>, which loads the new item
     
     def create_new_folder(self):
         # Abre uma caixa de diálogo para inserir o nome da nova pasta
@@ -314,91 +3912,816 @@ class CodeEditor:
         parent_directory = os.path.dirname(current_directory)
     
         if current_directory != parent_directory:
-            os.chdir(parent_directory)
-            self.update_treeview()
-            self.root.title(f"iCACode 1.6 - {parent_directory}")
+            self.change_directory(parent_directory)
 
     def new_file(self):
-        self.text_widget.delete("1.0", tk.END)
-        self.root.title("iCACode 1.6")
+        self.file_loader.cancel()
+        self.new_buffer()
+
+    def new_buffer(self):
+        # Open an empty tab and make it the active one
+        frame = tk.Frame(self.editor_tabs)
+        buffer = EditorBuffer(frame, self.language, self.update_tab_label, BufferIdentifiers(self.buffer_identifiers),
+                              EditJournal(self.journal_writer))
+        self.create_buffer_widget(buffer, "")
+        self.buffers.append(buffer)
+        self.editor_tabs.add(frame, text="Untitled")
+        self.activate_buffer(buffer)
+        self.set_syntax_highlighting()
+        return buffer
+
+    def create_buffer_widget(self, buffer, content):
+        # The content is inserted before the change hook is installed so the
+        # document, history and highlighter state of a restored buffer survive
+        # Diff markers against the base version, left of the text
+        buffer.gutter = tk.Canvas(buffer.frame, width=6, highlightthickness=0, borderwidth=0)
+        buffer.gutter.pack(side="left", fill="y")
+        text_widget = tk.Text(buffer.frame, wrap="word", undo=False, font=("Courier New", 12))
+        text_widget.pack(side="left", fill="both", expand=True)
+        text_widget.insert("1.0", content)
+        text_widget.mark_set(tk.INSERT, buffer.cursor)
+        text_widget.tag_config("search", background="yellow")
+        text_widget.tag_config("search_current", background="orange")
+        text_widget.tag_raise("search_current", "search")
+        text_widget.bind("<Button-3>", self.show_context_menu)
+        text_widget.bind("<KeyRelease>", self.on_completion_key)
+        text_widget.bind("<Button-1>", lambda event: self.hide_completion())
+        text_widget.bind("<Control-space>", lambda event: self.show_completion(force=True) or "break")
+        # The Text class bindings would transpose, delete or move the cursor first
+        text_widget.bind("<Control-t>", lambda event: self.show_go_to_symbol() or "break")
+        text_widget.bind("<Control-d>", lambda event: self.show_diff() or "break")
+        text_widget.bind("<Control-f>", lambda event: self.search() or "break")
+        text_widget.bind("<Control-F>", lambda event: self.show_find_in_files() or "break")
+        text_widget.bind("<Control-p>", lambda event: self.show_quick_open() or "break")
+        for key in ("<Up>", "<Down>", "<Tab>", "<Return>", "<Escape>"):
+            text_widget.bind(key, self.on_completion_nav)
+        text_widget.configure(yscrollcommand=lambda first, last: self.on_buffer_scroll(buffer, first, last))
+        buffer.identifiers.text_widget = text_widget
+        buffer.text_widget = text_widget
+        if buffer.history is None:
+            buffer.history = EditHistory(text_widget, self.settings["undo_history_limit_mb"] * 1024 * 1024)
+        else:
+            buffer.history.text_widget = text_widget
+        if buffer.highlighter is None:
+            buffer.highlighter = SyntaxHighlighter(text_widget)
+        else:
+            buffer.highlighter.attach(text_widget)
+        # Track every change to the text so highlighting only redoes the edited lines
+        buffer.text_hook = TextChangeHook(text_widget)
+        buffer.text_hook.listeners.append(buffer.document.on_change)
+        buffer.text_hook.listeners.append(buffer.history.on_change)
+        buffer.text_hook.listeners.append(buffer.highlighter.on_change)
+        buffer.text_hook.listeners.append(buffer.on_change)
+        buffer.text_hook.listeners.append(buffer.identifiers.on_change)
+        buffer.text_hook.listeners.append(lambda kind, start, end, text: self.on_diff_change(buffer, kind, start, end, text))
+        buffer.text_hook.listeners.append(self.on_text_change)
+
+    def on_text_change(self, kind, start, end, text):
+        for listener in self.text_listeners:
+            listener(kind, start, end, text)
+
+    def on_buffer_scroll(self, buffer, first, last):
+        self.schedule_gutter_redraw(buffer)
+        if buffer is self.buffer:
+            self.on_text_scroll(first, last)
+
+    def store_buffer_state(self):
+        if self.buffer is not None:
+            for name in EditorBuffer.STATE:
+                setattr(self.buffer, name, getattr(self, name))
+
+    def activate_buffer(self, buffer):
+        if buffer is self.buffer:
+            return
+        self.store_buffer_state()
+        if buffer.spilled is not None:
+            self.restore_buffer(buffer)
+        self.buffer = buffer
+        buffer.last_used = next(self.buffer_clock)
+        for name in EditorBuffer.STATE:
+            setattr(self, name, getattr(buffer, name))
+        if self.editor_tabs.select() != str(buffer.frame):
+            self.editor_tabs.select(buffer.frame)
+        self.root.title(f"iCACode 1.6 - {self.current_file}" if self.current_file else "iCACode 1.6")
+        # Search results belong to the previous buffer
+        self.search_generation += 1
+        self.search_matches = None
+        self.search_current = -1
+        if self.search_bar.winfo_ismapped():
+            self.schedule_search(0)
+        self.hide_completion()
+        if self.outline is not None:
+            self.refresh_outline()
+            if buffer.symbols is None:
+                self.schedule_symbol_parse(0)
+        self.enforce_buffer_budget()
+
+    def buffer_for_frame(self, frame):
+        for buffer in self.buffers:
+            if str(buffer.frame) == str(frame):
+                return buffer
+        return None
+
+    def on_tab_changed(self, event):
+        buffer = self.buffer_for_frame(self.editor_tabs.select())
+        if buffer is not None:
+            self.activate_buffer(buffer)
+
+    def on_tab_middle_click(self, event):
+        try:
+            index = self.editor_tabs.index(f"@{event.x},{event.y}")
+        except tk.TclError:
+            return
+        self.close_buffer(self.buffers_in_tab_order()[index])
+
+    def buffers_in_tab_order(self):
+        return [self.buffer_for_frame(frame) for frame in self.editor_tabs.tabs()]
+
+    def update_tab_label(self, buffer):
+        path = self.current_file if buffer is self.buffer else buffer.current_file
+        label = os.path.basename(path) if path else "Untitled"
+        self.editor_tabs.tab(buffer.frame, text=label + (" *" if buffer.modified else ""))
+
+    def close_buffer(self, buffer):
+        self.store_buffer_state()
+        if buffer.modified:
+            name = os.path.basename(buffer.current_file) if buffer.current_file else "Untitled"
+            answer = messagebox.askyesnocancel("Close Tab", f"Save changes to '{name}'?")
+            if answer is None:
+                return
+            if answer:
+                # Close once the save has finished
+                self.activate_buffer(buffer)
+                self.save_file(on_saved=lambda: self.close_buffer(buffer))
+                return
+        self.store_buffer_state()
+        buffer.journal.discard()
+        buffer.load_token += 1
+        if buffer.large_file is not None:
+            buffer.large_file.close()
+        if buffer.highlighter is not None and buffer.spilled is None:
+            buffer.highlighter.detach()
+        buffer.identifiers.release()
+        buffer.diff = None
+        self.buffers.remove(buffer)
+        if buffer is self.buffer:
+            self.buffer = None
+        self.editor_tabs.forget(buffer.frame)
+        buffer.frame.destroy()
+        if not self.buffers:
+            self.new_buffer()
+        elif self.buffer is None:
+            self.activate_buffer(self.buffer_for_frame(self.editor_tabs.select()))
+
+    def enforce_buffer_budget(self):
+        # Spill the least recently used inactive buffers while over the budget
+        limit = self.settings["buffer_cache_limit_mb"] * 1024 * 1024
+        total = sum(buffer.memory() for buffer in self.buffers)
+        for buffer in sorted(self.buffers, key=lambda buffer: buffer.last_used):
+            if total <= limit:
+                break
+            if buffer is self.buffer or buffer.loading or buffer.memory() == 0:
+                continue
+            total -= buffer.memory()
+            self.spill_buffer(buffer)
+
+    def spill_buffer(self, buffer):
+        text_widget = buffer.text_widget
+        buffer.cursor = text_widget.index(tk.INSERT)
+        buffer.top = text_widget.index("@0,0")
+        if not buffer.modified and buffer.current_file and buffer.disk_key is not None:
+            buffer.spilled = EditorBuffer.ON_DISK
+        else:
+            buffer.spilled = zlib.compress(buffer.document.text().encode("utf-8"), 1)
+        buffer.highlighter.detach()
+        buffer.document.load("")
+        text_widget.destroy()
+        buffer.gutter.destroy()
+        buffer.text_widget = None
+        buffer.text_hook = None
+        buffer.gutter = None
+
+    def restore_buffer(self, buffer):
+        # Rebuild the widget of a spilled buffer; undo history, cursor, scroll
+        # position and lexer states are kept when the text is unchanged. A
+        # buffer dropped for the copy on disk is read back in the background.
+        if buffer.spilled is EditorBuffer.ON_DISK:
+            buffer.spilled = None
+            self.create_buffer_widget(buffer, "")
+            # The lexer states are only good for the text that is coming
+            buffer.highlighter.detach()
+            buffer.text_widget.configure(state="disabled")
+            buffer.loading = True
+            buffer.load_token += 1
+            token, disk_key = buffer.load_token, buffer.disk_key
+            self.file_loader.read_async(buffer.current_file, lambda path, content, error:
+                                        self.on_buffer_reread(buffer, token, disk_key, content, error))
+            return
+        content = zlib.decompress(buffer.spilled).decode("utf-8")
+        buffer.spilled = None
+        buffer.document.load(content)
+        self.create_buffer_widget(buffer, content)
+        buffer.text_widget.yview(buffer.top)
+
+    def on_buffer_reread(self, buffer, token, disk_key, content, error):
+        if token != buffer.load_token:
+            return
+        if content is FileLoader.LARGE:
+            error = OSError("the file is now too large to edit")
+        if error:
+            messagebox.showerror("Error", f"Error reloading '{buffer.current_file}': {str(error)}")
+            content = ""
+        unchanged = error is None and file_stat_key(buffer.current_file) == disk_key
+        self.insert_reread_chunk(buffer, token, content, 0, unchanged)
+
+    def insert_reread_chunk(self, buffer, token, content, position, unchanged):
+        # Like insert_file_chunk, but behind the change hook, as
+        # create_buffer_widget does, so the buffer's document, history and
+        # identifiers don't see the text coming back
+        if token != buffer.load_token:
+            return
+        end = position + FILE_LOAD_CHUNK
+        if end < len(content):
+            end = content.find("\n", end) + 1 or len(content)
+        buffer.text_widget.configure(state="normal")
+        buffer.text_hook.call("insert", "end-1c", content[position:end])
+        if end < len(content):
+            buffer.text_widget.configure(state="disabled")
+            if buffer is self.buffer:
+                percent = 100 * end // len(content)
+                self.root.title(f"iCACode 1.6 - {buffer.current_file} [loading {percent}%]")
+            self.root.after(1, self.insert_reread_chunk, buffer, token, content, end, unchanged)
+            return
+        buffer.loading = False
+        buffer.document.load(content)
+        buffer.text_widget.mark_set(tk.INSERT, buffer.cursor)
+        buffer.highlighter.attach(buffer.text_widget)
+        if not unchanged:
+            buffer.history.clear()
+            buffer.highlighter.reset()
+            buffer.identifiers.reset(content)
+            buffer.disk_key = file_stat_key(buffer.current_file)
+            buffer.journal.reset(buffer.current_file, buffer.disk_key)
+            self.start_diff(buffer)
+        buffer.text_widget.yview(buffer.top)
+        if buffer is self.buffer:
+            self.root.title(f"iCACode 1.6 - {buffer.current_file}")
 
     def open_file(self):
         file_path = filedialog.askopenfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
         if file_path:
-            with open(file_path, "r") as file:
-                content = file.read()
-                self.text_widget.delete("1.0", tk.END)
-                self.text_widget.insert(tk.END, content)
-                self.root.title(f"iCACode 1.6 - {file_path}")
-
-    def save_file(self):
-        if hasattr(self, 'current_file'):
-            with open(self.current_file, "w") as file:
-                content = self.text_widget.get("1.0", tk.END)
-                file.write(content)
-                self.root.title(f"iCACode 1.6 - {self.current_file}")
-        else:
-            self.save_file_as()
-
-    def save_file_as(self):
+            self.open_path(file_path)
+
+    def open_path(self, path, line=None, preview=False):
+        # Switch to the file's tab, or load it in the background; a newer call
+        # cancels this one. A preview tab (single click in the tree) is reused
+        # by the next preview until it is edited or opened for real.
+        path = os.path.abspath(path)
+        self.store_buffer_state()
+        for buffer in self.buffers:
+            if buffer.current_file == path:
+                self.file_loader.cancel()
+                buffer.preview = buffer.preview and preview
+                self.activate_buffer(buffer)
+                if line:
+                    self.show_line(line)
+                return
+        self.pending_line = line
+        self.pending_preview = preview
+        self.root.title(f"iCACode 1.6 - {path} [loading]")
+        self.file_loader.request(path, self.on_file_loaded)
+
+    def buffer_for_load(self, preview):
+        # An untouched empty tab or the preview tab is reused for a new file
+        candidates = [self.buffer] + [buffer for buffer in self.buffers if buffer.preview]
+        for buffer in candidates:
+            if buffer.spilled is not None or buffer.modified:
+                continue
+            if buffer is self.buffer and not buffer.current_file and not buffer.document.length:
+                return buffer
+            if preview and buffer.preview:
+                return buffer
+        return self.new_buffer()
+
+    def on_file_loaded(self, path, content, error):
+        if error:
+            self.root.title(f"iCACode 1.6 - {self.current_file}" if self.current_file else "iCACode 1.6")
+            messagebox.showerror("Error", f"Error opening '{path}': {str(error)}")
+            return
+        self.store_buffer_state()
+        buffer = self.buffer_for_load(self.pending_preview)
+        self.activate_buffer(buffer)
+        self.close_large_file()
+        self.current_file = path
+        buffer.current_file = path
+        buffer.preview = self.pending_preview
+        buffer.modified = False
+        buffer.symbols = None
+        self.update_tab_label(buffer)
+        if content is FileLoader.LARGE:
+            self.open_large_file(path)
+            return
+        buffer.pending_line = self.pending_line
+        self.pending_line = None
+        # A load this one replaces may have left the widget read-only
+        self.text_widget.configure(state="normal")
+        self.set_buffer_content("")
+        buffer.disk_key = file_stat_key(path)
+        buffer.journal.reset(path, buffer.disk_key)
+        buffer.loading = True
+        buffer.load_token += 1
+        self.history.replaying = True
+        # Typing between chunks would put text in the widget that the
+        # document, loaded from content at the end, doesn't have
+        self.text_widget.configure(state="disabled")
+        self.insert_file_chunk(buffer, buffer.load_token, path, content, 0)
+
+    def insert_file_chunk(self, buffer, token, path, content, position):
+        # Insert one chunk and yield to the event loop before the next one
+        if token != buffer.load_token:
+            return
+        end = position + FILE_LOAD_CHUNK
+        if end < len(content):
+            end = content.find("\n", end) + 1 or len(content)
+        buffer.text_widget.configure(state="normal")
+        buffer.text_widget.insert("end-1c", content[position:end])
+        if end < len(content):
+            buffer.text_widget.configure(state="disabled")
+            if buffer is self.buffer:
+                percent = 100 * end // len(content)
+                self.root.title(f"iCACode 1.6 - {path} [loading {percent}%]")
+            self.root.after(1, self.insert_file_chunk, buffer, token, path, content, end)
+            return
+        buffer.document.load(content)
+        buffer.history.replaying = False
+        buffer.history.clear()
+        buffer.loading = False
+        buffer.text_widget.mark_set(tk.INSERT, f"{buffer.pending_line}.0" if buffer.pending_line else "1.0")
+        buffer.text_widget.see(tk.INSERT)
+        buffer.pending_line = None
+        if buffer is self.buffer:
+            self.root.title(f"iCACode 1.6 - {path}")
+            self.schedule_symbol_parse(0)
+        self.start_diff(buffer)
+        self.enforce_buffer_budget()
+        self.plugins.fire("file_opened", path)
+
+    def open_large_file(self, path):
+        self.large_file = LargeFileView(path, on_progress=lambda view: self.call_soon(self.on_large_file_progress, view))
+        self.large_search_offset = 0
+        self.show_large_window(0)
+        self.root.title(f"iCACode 1.6 - {path} [read-only, indexing]")
+        self.plugins.fire("file_opened", path)
+
+    def close_large_file(self):
+        if self.large_file is not None:
+            self.large_file.close()
+            self.large_file = None
+            self.text_widget.configure(state="normal")
+
+    def on_large_file_progress(self, view):
+        if view is not self.large_file:
+            return
+        if view.done:
+            self.root.title(f"iCACode 1.6 - {view.path} [read-only]")
+        else:
+            percent = 100 * view.indexed_offset // max(view.size, 1)
+            self.root.title(f"iCACode 1.6 - {view.path} [read-only, indexing {percent}%]")
+        if self.pending_line and self.pending_line <= view.indexed_lines:
+            self.show_line(self.pending_line)
+            self.pending_line = None
+        # Fill the window as soon as more lines are known
+        if self.large_window_lines < LARGE_FILE_WINDOW and self.large_window_start + self.large_window_lines < view.indexed_lines:
+            top = self.large_window_start + int(self.text_widget.index("@0,0").split(".")[0]) - 1
+            self.show_large_window(self.large_window_start, top)
+
+    def show_large_window(self, first, top_line=None):
+        # Load LARGE_FILE_WINDOW lines starting at first into the read-only widget
+        view = self.large_file
+        first = max(0, min(first, view.indexed_lines - 1))
+        content = view.read_lines(first, LARGE_FILE_WINDOW)
+        self.large_window_start = first
+        self.large_window_lines = content.count("\n") + 1
+        self.text_widget.configure(state="normal")
+        self.set_buffer_content(content)
+        self.text_widget.configure(state="disabled")
+        if top_line is not None:
+            self.text_widget.yview(f"{top_line - first + 1}.0")
+
+    def page_large_window(self):
+        # Re-center the window on the visible lines after scrolling near its edge
+        if self.large_file is not None:
+            top = self.large_window_start + int(self.text_widget.index("@0,0").split(".")[0]) - 1
+            self.show_large_window(top - LARGE_FILE_WINDOW // 2, top)
+        self.large_paging = False
+
+    def call_soon(self, callback, *args):
+        # Safe to call from any thread
+        self.ui_queue.put((callback, args))
+
+    def poll_ui_queue(self):
+        self.drain_ui_queue()
+        self.root.after(25, self.poll_ui_queue)
+
+    def drain_ui_queue(self):
+        monitor = LatencyMonitor.active
+        try:
+            while True:
+                callback, args = self.ui_queue.get_nowait()
+                if monitor is None:
+                    callback(*args)
+                else:
+                    monitor.call(callback, args)
+        except queue.Empty:
+            pass
+
+    def save_file(self, on_saved=None):
+        if self.large_file is not None:
+            messagebox.showwarning("Save", "Large files are opened read-only.")
+        elif self.current_file:
+            self.save_buffer(self.buffer, self.current_file, on_saved)
+        else:
+            self.save_file_as(on_saved)
+
+    def save_file_as(self, on_saved=None):
+        if self.large_file is not None:
+            messagebox.showwarning("Save", "Large files are opened read-only.")
+            return
         file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
         if file_path:
-            with open(file_path, "w") as file:
-                content = self.text_widget.get("1.0", tk.END)
-                file.write(content)
-                self.current_file = file_path
-                self.root.title(f"iCACode 1.6 - {file_path}")
+            self.save_buffer(self.buffer, os.path.abspath(file_path), on_saved)
+
+    def save_buffer(self, buffer, path, on_saved=None):
+        # Write a snapshot of the document atomically on the writer thread. The
+        # journal is reset to the saved file right after the write, ahead of
+        # any edit made while the save was running.
+        snapshot = buffer.document.snapshot()
+        version = buffer.version
+        journal = buffer.journal
+        if buffer is self.buffer:
+            self.root.title(f"iCACode 1.6 - {path} [saving]")
+
+        def work():
+            try:
+                disk_key = write_file_atomically(path, snapshot.text())
+            except Exception as e:
+                # Any failure must reach on_buffer_saved, or the buffer stays "[saving]"
+                self.call_soon(self.on_buffer_saved, buffer, path, version, None, e, on_saved)
+                return
+            journal.set_base(EditJournal.make_base(path, disk_key, None))
+            self.call_soon(self.on_buffer_saved, buffer, path, version, disk_key, None, on_saved)
+        self.journal_writer.submit(work)
+
+    def on_buffer_saved(self, buffer, path, version, disk_key, error, on_saved):
+        if buffer not in self.buffers:
+            return
+        if buffer is self.buffer:
+            self.root.title(f"iCACode 1.6 - {self.current_file}" if self.current_file else "iCACode 1.6")
+        if error:
+            messagebox.showerror("Error", f"Error saving '{path}': {str(error)}")
+            return
+        buffer.current_file = path
+        if buffer is self.buffer:
+            self.current_file = path
+            self.root.title(f"iCACode 1.6 - {path}")
+        buffer.disk_key = disk_key
+        # Edits made while the save was running keep the buffer modified
+        buffer.modified = buffer.version != version
+        buffer.preview = False
+        self.update_tab_label(buffer)
+        if self.settings["diff_base"] == "disk" or buffer.diff is None:
+            self.start_diff(buffer)
+        self.plugins.fire("file_saved", path)
+        if on_saved is not None and not buffer.modified:
+            on_saved()
+
+    def autosave(self):
+        # Make the journals durable and compact the ones that outgrew their
+        # buffer. Only the edits since the last tick are written, whatever the
+        # size of the files.
+        self.store_buffer_state()
+        for buffer in self.buffers:
+            journal = buffer.journal
+            if journal.dirty:
+                journal.sync()
+            if journal.size > max(EditJournal.COMPACT_MIN, 2 * buffer.document.length) and buffer.spilled is None:
+                journal.compact(buffer.current_file, buffer.document.snapshot())
+        self.root.after(int(self.settings["autosave_seconds"] * 1000), self.autosave)
+
+    def recover_journals(self):
+        # Startup task: look for journals left by an editor that didn't exit
+        # cleanly and rebuild their buffers on the writer thread
+        def work():
+            recovered = []
+            try:
+                names = sorted(os.listdir(JOURNAL_DIR))
+            except OSError:
+                names = []
+            for name in names:
+                journal_path = os.path.join(JOURNAL_DIR, name)
+                pid = name.split("-")[0]
+                if name.endswith(".failed") or not pid.isdigit() or int(pid) == os.getpid() or process_running(int(pid)):
+                    continue
+                if name.endswith(".tmp"):
+                    os.remove(journal_path)
+                    continue
+                try:
+                    path, text = EditJournal.recover(journal_path)
+                    recovered.append((journal_path, path, text, None))
+                except (OSError, ValueError, LookupError, TypeError, AttributeError) as e:
+                    recovered.append((journal_path, None, None, e))
+            if recovered:
+                self.call_soon(self.offer_recovery, recovered)
+        self.journal_writer.submit(work)
+        self.root.after(int(self.settings["autosave_seconds"] * 1000), self.autosave)
+
+    def offer_recovery(self, recovered):
+        # Only restored journals are removed; failed and declined ones are
+        # renamed to *.failed so the edits can still be dug out by hand
+        names = [os.path.basename(path) if path else "Untitled" for _, path, text, _ in recovered if text is not None]
+        accepted = bool(names) and messagebox.askyesno("Recover Unsaved Changes",
+                                                       "iCACode did not exit cleanly. Recover the unsaved changes to "
+                                                       + ", ".join(names) + "?")
+        for journal_path, path, text, _ in recovered:
+            if text is None or not accepted:
+                self.journal_writer.submit(os.replace, journal_path, journal_path + ".failed")
+                continue
+            buffer = self.new_buffer()
+            self.set_buffer_content(text)
+            self.current_file = buffer.current_file = path
+            buffer.disk_key = file_stat_key(path)
+            buffer.modified = True
+            self.update_tab_label(buffer)
+            self.root.title(f"iCACode 1.6 - {path}" if path else "iCACode 1.6")
+            buffer.journal.compact(path, buffer.document.snapshot())
+            self.start_diff(buffer)
+            self.journal_writer.submit(os.remove, journal_path)
+        failed = [f"{os.path.basename(journal_path)}: {error}" for journal_path, _, _, error in recovered if error]
+        if failed:
+            messagebox.showwarning("Recover Unsaved Changes", "Some journals could not be recovered and were kept as "
+                                   f"*.failed files in {JOURNAL_DIR}:\n" + "\n".join(failed))
 
     def show_version(self):
         tk.messagebox.showinfo("Version", "iCACode 1.6")
 
     def update_treeview(self):
-        # Clear the existing directory tree
-        for item in self.treeview.get_children():
-            self.treeview.delete(item)
-
-        # Get the list of files and directories in the current directory
+        # Refresh the directory tree, only touching the items that changed on
+        # disk so expanded directories and the selection are kept
         current_directory = os.getcwd()
-        for item in os.listdir(current_directory):
-            item_path = os.path.join(current_directory, item)
-            is_directory = os.path.isdir(item_path)
-            tags = ("directory",) if is_directory else ("file",)
-            self.treeview.insert("", "end", text=item, open=True, tags=tags)
-            
-            # Tagging directories with the "directory" tag
-            if is_directory:
-                self.treeview.tag_configure("directory", foreground="#0000FF")
+        if current_directory != self.tree_root:
+            self.treeview.delete(*self.treeview.get_children())
+            self.tree_root = current_directory
+            self.tree_entries = {}
+            self.tree_loaded = {}
+            self.start_git_status()
+        self.populate_tree_node("")
+        for item in list(self.tree_loaded):
+            if item and item in self.tree_loaded:
+                self.populate_tree_node(item)
+        self.plugins.fire("tree_refreshed", current_directory)
+
+    def scan_directory(self, path):
+        # os.scandir reports the entry type from the directory listing itself,
+        # so there is no stat call per entry. Directories come first.
+        entries = []
+        try:
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    try:
+                        is_directory = entry.is_dir()
+                    except OSError:
+                        is_directory = False
+                    entries.append((not is_directory, entry.name.lower(), entry.name, entry.path, is_directory))
+        except OSError:
+            return []
+        entries.sort()
+        return [(name, item_path, is_directory) for _, _, name, item_path, is_directory in entries]
+
+    def populate_tree_node(self, parent):
+        # Diff the loaded children of parent ("" for the root) against the directory
+        entries = self.scan_directory(parent or self.tree_root)
+        shown = entries[:max(self.tree_loaded.get(parent, 0), TREE_PAGE_SIZE)]
+        self.tree_entries[parent] = entries
+        self.tree_loaded[parent] = len(shown)
+
+        wanted = {item_path for _, item_path, _ in shown}
+        existing = self.treeview.get_children(parent)
+        stale = [item for item in existing if item not in wanted]
+        if stale:
+            self.treeview.delete(*stale)
+            self.forget_tree_items(stale)
+        existing = set(existing).difference(stale)
+        for index, entry in enumerate(shown):
+            if entry[1] not in existing:
+                self.insert_tree_entry(parent, index, entry)
+        self.update_more_item(parent)
+
+    def insert_tree_entry(self, parent, index, entry):
+        name, item_path, is_directory = entry
+        tags = self.git_tags(item_path) + (("directory",) if is_directory else ("file",))
+        self.treeview.insert(parent, index, iid=item_path, text=name, tags=tags)
+        if is_directory:
+            # Children are only read when the directory is expanded
+            self.treeview.insert(item_path, "end", iid=TREE_PLACEHOLDER + item_path, text="")
+
+    def update_more_item(self, parent):
+        more_item = TREE_MORE + parent
+        remaining = len(self.tree_entries[parent]) - self.tree_loaded[parent]
+        if self.treeview.exists(more_item):
+            self.treeview.delete(more_item)
+        if remaining > 0:
+            self.treeview.insert(parent, "end", iid=more_item, text=f"... {remaining} more")
 
+    def load_more_tree_entries(self, parent):
+        # Append the next page of a large directory from the cached listing
+        start = self.tree_loaded[parent]
+        entries = self.tree_entries[parent][start:start + TREE_PAGE_SIZE]
+        for index, entry in enumerate(entries, start):
+            self.insert_tree_entry(parent, index, entry)
+        self.tree_loaded[parent] = start + len(entries)
+        self.update_more_item(parent)
+
+    def forget_tree_items(self, items):
+        # Drop cached listings of removed directories and everything below them
+        prefixes = tuple(item + os.sep for item in items)
+        for key in list(self.tree_loaded):
+            if key in items or key.startswith(prefixes):
+                del self.tree_loaded[key]
+                del self.tree_entries[key]
+
+    def git_tags(self, item_path):
+        # The Git tag goes first so its color wins over the file/directory one
+        state = self.git_status.state(item_path) if self.git_status is not None else None
+        return (GIT_TAGS[state][0],) if state else ()
+
+    def start_git_status(self):
+        # Find the repository of the new tree root and query its full status
+        self.git_generation += 1
+        generation = self.git_generation
+        root = self.tree_root
+        self.git_status = None
+        self.git_running = True
+        self.git_pending = set()
+        self.git_full_pending = False
+        self.treeview.heading("#0", text="")
+
+        def work():
+            status = GitStatus.discover(root)
+            if status is None:
+                self.call_soon(self.on_git_status, generation, None, None, None)
+                return
+            head_key = status.head_key()
+            try:
+                result = status.query()
+            except OSError:
+                result = None
+            self.call_soon(self.on_git_status, generation, status, head_key, None, result)
+        threading.Thread(target=work, daemon=True).start()
+
+    def request_git_status(self, paths=None):
+        # Re-query the given paths, or the whole repository when paths is None
+        if paths is None:
+            self.git_full_pending = True
+        else:
+            self.git_pending.update(paths)
+            if len(self.git_pending) > GIT_STATUS_MAX_PATHS:
+                self.git_full_pending = True
+        if not self.git_running:
+            self.run_git_status()
+
+    def run_git_status(self):
+        status = self.git_status
+        if status is None or not (self.git_full_pending or self.git_pending):
+            return
+        paths = None if self.git_full_pending else sorted(self.git_pending)
+        self.git_pending = set()
+        self.git_full_pending = False
+        self.git_running = True
+        generation = self.git_generation
+
+        def work():
+            try:
+                result = status.query(paths)
+            except OSError:
+                result = None
+            self.call_soon(self.on_git_status, generation, status, None, paths, result)
+        threading.Thread(target=work, daemon=True).start()
+
+    def on_git_status(self, generation, status, head_key, paths, result=None):
+        if generation != self.git_generation:
+            return
+        self.git_running = False
+        if status is None:
+            return
+        if self.git_status is None:
+            self.git_status = status
+            self.git_head_key = head_key
+            if self.git_poll_id is None:
+                self.git_poll_id = self.root.after(1000, self.poll_git_head)
+        if result is not None:
+            self.decorate_tree_items(status.apply(result, paths))
+            name = os.path.basename(self.tree_root) or self.tree_root
+            label = status.branch_label()
+            self.treeview.heading("#0", text=f"{name}  [{label}]" if label else name, anchor="w")
+        self.run_git_status()
+
+    def decorate_tree_items(self, paths):
+        # Retag the loaded tree items whose state changed; the contents of an
+        # untracked or ignored directory follow the directory
+        items = set()
+        for path in paths:
+            item = path.rstrip(os.sep)
+            items.add(item)
+            if path.endswith(os.sep):
+                prefix = item + os.sep
+                for parent in self.tree_loaded:
+                    if parent == item or parent.startswith(prefix):
+                        items.update(self.treeview.get_children(parent))
+        for item in items:
+            if self.treeview.exists(item):
+                tags = [tag for tag in self.treeview.item(item, "tags") if not tag.startswith("git_")]
+                self.treeview.item(item, tags=self.git_tags(item) + tuple(tags))
+
+    def update_git_status(self, changes):
+        # Directory listener: only the reported paths are re-queried
+        if self.git_status is not None:
+            self.request_git_status(changes.keys())
+
+    def poll_git_head(self):
+        # Commits, checkouts and staging only touch .git, which the directory
+        # watcher ignores; a few stat calls tell when to re-query everything
+        status = self.git_status
+        if status is not None:
+            head_key = status.head_key()
+            if head_key != self.git_head_key:
+                self.git_head_key = head_key
+                self.request_git_status()
+                if self.settings["diff_base"] == "head":
+                    for buffer in self.buffers:
+                        self.start_diff(buffer)
+        self.git_poll_id = self.root.after(1000, self.poll_git_head)
+
+    def on_tree_open(self, event):
+        item = self.treeview.focus()
+        if item and item not in self.tree_loaded and self.treeview.exists(TREE_PLACEHOLDER + item):
+            self.treeview.delete(TREE_PLACEHOLDER + item)
+            self.populate_tree_node(item)
+
+    def on_tree_double_click(self, event):
+        # Double-clicking a directory makes it the new root of the tree
+        # and double-clicking a file keeps its tab open
+        item = self.treeview.identify_row(event.y)
+        if item and "directory" in self.treeview.item(item, "tags"):
+            self.change_directory(item)
+        elif item and "file" in self.treeview.item(item, "tags"):
+            self.open_path(item)
+
+    def change_directory(self, directory_path):
+        # chdir and move the tree and the directory watch along with it
+        os.chdir(directory_path)
+        if self.directory_watcher is not None:
+            self.directory_watcher.watch_path(os.getcwd())
+        self.update_treeview()
+        self.start_file_index()
+        self.root.title(f"iCACode 1.6 - {directory_path}")
 
     def update_editor(self, event):
         # Get the selected item in the directory tree
         selected_item = self.treeview.selection()
         if selected_item:
-            # Get the text of the selected item
-            item_text = self.treeview.item(selected_item, "text")
-
-            # Open the selected file or directory
-            item_path = os.path.join(os.getcwd(), item_text)
-            if os.path.isfile(item_path):
-                with open(item_path, "r") as file:
-                    content = file.read()
-                    self.text_widget.delete("1.0", tk.END)
-                    self.text_widget.insert(tk.END, content)
-                    self.root.title(f"iCACode 1.6 - {item_path}")
-            elif os.path.isdir(item_path):
-                os.chdir(item_path)
-                self.update_treeview()
-                self.root.title(f"iCACode 1.6 - {item_path}")
+            # Item ids are the absolute paths of the entries
+            item_path = selected_item[0]
+            if item_path.startswith(TREE_MORE):
+                self.load_more_tree_entries(item_path[len(TREE_MORE):])
+                return
+
+            # Open the selected file, using the tags set by update_treeview
+            # instead of touching the disk again. Directories are expanded in
+            # place; double-click one to make it the tree root.
+            if "file" in self.treeview.item(item_path, "tags"):
+                self.open_path(item_path, preview=True)
+                self.prefetch_neighbours(item_path)
+
+    def prefetch_neighbours(self, item, count=2):
+        # Read ahead the files next to the selection so arrowing through them is instant
+        paths = []
+        for step in (self.treeview.next, self.treeview.prev):
+            neighbour = item
+            for _ in range(count):
+                neighbour = step(neighbour)
+                if not neighbour:
+                    break
+                if "file" in self.treeview.item(neighbour, "tags"):
+                    paths.append(neighbour)
+        self.file_loader.prefetch(paths)
 
     def delete_file(self):
         # Get the selected item in the directory tree
         selected_item = self.treeview.selection()
         if selected_item:
-            # Get the text of the selected item
-            item_text = self.treeview.item(selected_item, "text")
-
-            # Build the path of the selected file or directory
-            item_path = os.path.join(os.getcwd(), item_text)
+            # Item ids are the absolute paths of the entries
+            item_path = selected_item[0]
+            item_text = os.path.basename(item_path)
 
             # Display a confirmation message
             confirmation = messagebox.askyesno("Confirmation", f"Are you sure you want to delete the { 'file' if os.path.isfile(item_path) else 'directory'} '{item_text}'?")
@@ -440,9 +4763,7 @@ class CodeEditor:
     def open_directory(self):
         directory_path = filedialog.askdirectory()
         if directory_path:
-            os.chdir(directory_path)
-            self.update_treeview()
-            self.root.title(f"iCACode 1.6 - {directory_path}")
+            self.change_directory(directory_path)
 
     def toggle_theme(self):
         # Toggle entre os temas existentes e o tema personalizado
@@ -472,70 +4793,974 @@ class CodeEditor:
 
     def set_syntax_highlighting(self):
         # Configure syntax highlighting for the current language
-        content = self.text_widget.get("1.0", tk.END)
-        self.text_widget.tag_delete("c", "1.0", tk.END)
-        self.text_widget.tag_delete("cpp", "1.0", tk.END)
-        self.text_widget.tag_delete("csharp", "1.0", tk.END)
-        self.text_widget.tag_delete("java", "1.0", tk.END)
-        self.text_widget.tag_delete("javascript", "1.0", tk.END)
-        self.text_widget.tag_delete("python", "1.0", tk.END)
-
-        if self.language == "c":
-            self.text_widget.tag_configure("c", foreground="#00F", font=("Courier New", 12, "bold"))
-            self.text_widget.tag_add("c", "1.0", tk.END)
-        elif self.language == "cpp":
-            self.text_widget.tag_configure("cpp", foreground="#00F", font=("Courier New", 12, "bold"))
-            self.text_widget.tag_add("cpp", "1.0", tk.END)
-        elif self.language == "csharp":
-            self.text_widget.tag_configure("csharp", foreground="#178600", font=("Courier New", 12, "bold"))
-            self.text_widget.tag_add("csharp", "1.0", tk.END)
-        elif self.language == "java":
-            self.text_widget.tag_configure("java", foreground="#00A", font=("Courier New", 12, "italic"))
-            self.text_widget.tag_add("java", "1.0", tk.END)
-        elif self.language == "javascript":
-            self.text_widget.tag_configure("javascript", foreground="#f00", font=("Courier New", 12, "normal"))
-            self.text_widget.tag_add("javascript", "1.0", tk.END)
-        elif self.language == "python":
-            self.text_widget.tag_configure("python", foreground="#0A0", font=("Courier New", 12, "normal"))
-            self.text_widget.tag_add("python", "1.0", tk.END)
-
-    def highlight_syntax(self, event):
-        # Highlight syntax while typing
-        self.set_syntax_highlighting()
+        keyword_styles = {
+            "c": ("#00F", ("Courier New", 12, "bold")),
+            "cpp": ("#00F", ("Courier New", 12, "bold")),
+            "csharp": ("#178600", ("Courier New", 12, "bold")),
+            "java": ("#00A", ("Courier New", 12, "italic")),
+            "javascript": ("#f00", ("Courier New", 12, "normal")),
+            "python": ("#0A0", ("Courier New", 12, "normal")),
+        }
+        keyword_style = keyword_styles.get(self.language, ("#000", ("Courier New", 12, "normal")))
+        self.highlighter.set_language(self.language, keyword_style)
+
+    def on_text_scroll(self, first, last):
+        # Called by the Text widget whenever the visible region changes
+        self.highlighter.on_view_changed()
+        if self.search_matches:
+            self.schedule_search_render()
+        if self.large_file is not None and not self.large_paging:
+            near_end = float(last) > 0.9 and self.large_window_start + self.large_window_lines < self.large_file.indexed_lines
+            near_start = float(first) < 0.1 and self.large_window_start > 0
+            if near_end or near_start:
+                self.large_paging = True
+                self.root.after_idle(self.page_large_window)
+
+    def schedule_search_render(self):
+        if self.search_render_id is None:
+            self.search_render_id = self.root.after(20, self.run_search_render)
+
+    def run_search_render(self):
+        self.search_render_id = None
+        self.render_search_matches()
 
     def setup_directory_observer(self):
-        # Set up monitoring for the current directory
-        self.event_handler = FileSystemEventHandler()
-        self.event_handler.on_any_event = self.handle_directory_event
+        # Set up monitoring for the current directory; the batched changes go
+        # to every callback in directory_listeners
+        self.directory_watcher = DirectoryWatcher(self.root, self.call_soon, self.handle_directory_event,
+                                                  self.settings["watch_ignore_patterns"])
+        self.directory_watcher.watch_path(os.getcwd())
 
-        self.directory_observer = Observer()
-        self.directory_observer.schedule(self.event_handler, path=os.getcwd(), recursive=False)
-        self.directory_observer.start()
+    def handle_directory_event(self, changes):
+        # changes maps each path to its last event type ("created", "deleted", ...)
+        for listener in self.directory_listeners:
+            listener(changes)
 
-    def handle_directory_event(self, event):
-        # Update the directory tree when there is a change in the directory
-        self.update_treeview()
+    def handle_directory_changes(self, changes):
+        # Patch only the loaded directories that contain changed entries
+        parents = set()
+        for path, kind in changes.items():
+            if kind == "modified":
+                continue
+            parent = os.path.dirname(path)
+            parents.add("" if parent == self.tree_root else parent)
+        for parent in parents:
+            if parent in self.tree_loaded:
+                self.populate_tree_node(parent)
+
+    def start_file_index(self):
+        # Load the saved index of the project so quick open works right away,
+        # then crawl the tree in the background and replace it
+        self.file_index_generation += 1
+        generation = self.file_index_generation
+        root = os.getcwd()
+
+        def build():
+            cache_path = FileIndex.cache_path(root)
+            try:
+                index = FileIndex.load(cache_path, root)
+            except (OSError, ValueError, zlib.error):
+                index = None
+            if index is not None:
+                self.call_soon(self.set_file_index, index, generation)
+            index = FileIndex(root)
+            index.crawl(should_stop=lambda: generation != self.file_index_generation)
+            if generation == self.file_index_generation:
+                try:
+                    index.save(cache_path)
+                    index.dirty = False
+                except OSError:
+                    pass
+                self.call_soon(self.set_file_index, index, generation)
+        threading.Thread(target=build, daemon=True).start()
+
+    def set_file_index(self, index, generation):
+        if generation == self.file_index_generation:
+            if self.project_identifier_generation != generation:
+                self.start_project_identifiers(index, generation)
+            self.start_symbol_index(index)
+            self.file_index = index
+            if self.file_index_save_timer is None:
+                self.file_index_save_timer = self.root.after(60000, self.save_file_index)
+
+    def save_file_index(self):
+        # Persist the changes made by the directory observer
+        index = self.file_index
+        if index is not None and index.dirty:
+            index.dirty = False
+            threading.Thread(target=self.save_file_index_now, args=(index,), daemon=True).start()
+        self.file_index_save_timer = self.root.after(60000, self.save_file_index)
+
+    def save_file_index_now(self, index):
+        try:
+            index.save(FileIndex.cache_path(index.root))
+        except OSError:
+            index.dirty = True
+
+    def update_file_index(self, changes):
+        # Directory listener keeping the project index current
+        index = self.file_index
+        if index is None:
+            return
+        for path, kind in changes.items():
+            relative = os.path.relpath(path, index.root).replace(os.sep, "/")
+            if relative.startswith("../"):
+                continue
+            if kind == "deleted":
+                index.remove_path(relative)
+            elif kind == "created":
+                if os.path.isdir(path):
+                    if not index.is_ignored(relative, True):
+                        threading.Thread(target=self.crawl_into_index, args=(index, relative), daemon=True).start()
+                elif not index.is_ignored(relative, False):
+                    index.add_file(relative)
+
+    def crawl_into_index(self, index, relative_dir):
+        # Index a new directory (e.g. one moved into the project) off the main loop
+        part = FileIndex(index.root)
+        part.ignores = dict(index.ignores)
+        part.crawl(relative_dir)
+        self.call_soon(self.merge_into_index, index, part.paths())
+
+    def merge_into_index(self, index, paths):
+        for relative in paths:
+            index.add_file(relative)
+
+    def start_project_identifiers(self, index, generation):
+        # Collect the identifiers of the project's source files on a worker
+        # thread; the finished index replaces the previous project's
+        self.project_identifier_generation = generation
+        paths = [os.path.join(index.root, relative) for relative in index.paths()
+                 if relative.endswith(IDENTIFIER_SOURCE_SUFFIXES)]
+
+        def build():
+            counts = {}
+            files = {}
+            for path in paths:
+                if generation != self.file_index_generation:
+                    return
+                names = scan_identifiers(path)
+                if names:
+                    files[path] = names
+                    for name in names:
+                        counts[name] = counts.get(name, 0) + 1
+            self.call_soon(self.set_project_identifiers, generation, IdentifierIndex(counts), files)
+        threading.Thread(target=build, daemon=True).start()
+
+    def set_project_identifiers(self, generation, index, files):
+        if generation == self.file_index_generation:
+            self.project_identifiers = index
+            self.project_identifier_files = files
+
+    def update_project_identifiers(self, changes):
+        # Directory listener rescanning the source files that changed
+        paths = [path for path in changes if path.endswith(IDENTIFIER_SOURCE_SUFFIXES)]
+        if not paths:
+            return
+        generation = self.file_index_generation
+
+        def scan():
+            updates = [(path, scan_identifiers(path)) for path in paths]
+            self.call_soon(self.apply_project_identifiers, generation, updates)
+        threading.Thread(target=scan, daemon=True).start()
+
+    def apply_project_identifiers(self, generation, updates):
+        if generation != self.file_index_generation:
+            return
+        for path, names in updates:
+            old = self.project_identifier_files.pop(path, ())
+            if names:
+                self.project_identifier_files[path] = names
+                self.project_identifiers.add(names)
+            self.project_identifiers.remove(old)
+
+    def get_process_pool(self):
+        # Worker processes shared by find in files and the symbol index,
+        # started by whichever thread needs them first
+        with self.process_pool_lock:
+            if self.process_pool_closed:
+                raise RuntimeError("the editor is closing")
+            if self.process_pool is None:
+                import multiprocessing
+                self.process_pool = concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+            return self.process_pool
+
+    def on_root_destroyed(self, event):
+        # <Destroy> on root also fires for each of its children
+        if event.widget is not self.root:
+            return
+        with self.process_pool_lock:
+            self.process_pool_closed = True
+            pool = self.process_pool
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def start_symbol_index(self, index):
+        # Reparse the project files whose stat key differs from the cached one.
+        # Only a few chunks are queued in the pool at a time so buffer reparses
+        # don't wait for the whole project.
+        self.symbol_generation += 1
+        generation = self.symbol_generation
+        if self.symbol_index is None or self.symbol_index.root != index.root:
+            self.symbol_index = SymbolIndex(index.root)
+        symbol_index = self.symbol_index
+        paths = [relative for relative in index.paths() if os.path.splitext(relative)[1].lower() in SYMBOL_LANGUAGES]
+
+        def build():
+            try:
+                connection = symbol_index.connect()
+                stored = symbol_index.keys(connection)
+                symbol_index.remove(connection, set(stored).difference(paths))
+                stale = [relative for relative in paths
+                         if file_stat_key(os.path.join(symbol_index.root, relative)) != stored.get(relative)]
+                chunks = [stale[i:i + SYMBOL_CHUNK_FILES] for i in range(0, len(stale), SYMBOL_CHUNK_FILES)]
+                pool = self.get_process_pool()
+                running = set()
+                while (chunks or running) and generation == self.symbol_generation:
+                    while chunks and len(running) < (os.cpu_count() or 2):
+                        running.add(pool.submit(index_symbol_files, symbol_index.root, chunks.pop()))
+                    done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        symbol_index.store(connection, future.result())
+                connection.close()
+            except Exception as e:
+                print(f"[symbols] indexing {symbol_index.root} failed: {e}", file=sys.stderr)
+        threading.Thread(target=build, daemon=True).start()
+
+    def update_symbol_index(self, changes):
+        # Directory listener reparsing the source files that changed on disk
+        symbol_index = self.symbol_index
+        if symbol_index is None:
+            return
+        changed = []
+        removed = []
+        for path, kind in changes.items():
+            relative = os.path.relpath(path, symbol_index.root).replace(os.sep, "/")
+            if relative.startswith("../"):
+                continue
+            if kind == "deleted":
+                removed.append(relative)
+            elif os.path.splitext(relative)[1].lower() in SYMBOL_LANGUAGES:
+                if self.file_index is None or not self.file_index.is_ignored(relative, False):
+                    changed.append(relative)
+        if not changed and not removed:
+            return
+
+        def work():
+            try:
+                connection = symbol_index.connect()
+                symbol_index.remove(connection, removed)
+                if changed:
+                    future = self.get_process_pool().submit(index_symbol_files, symbol_index.root, changed)
+                    symbol_index.store(connection, future.result())
+                connection.close()
+            except Exception as e:
+                print(f"[symbols] updating {symbol_index.root} failed: {e}", file=sys.stderr)
+        threading.Thread(target=work, daemon=True).start()
+
+    def on_symbol_buffer_changed(self, kind, start, end, text):
+        self.schedule_symbol_parse(SYMBOL_REPARSE_DELAY)
+
+    def schedule_symbol_parse(self, delay):
+        # Reparse the active buffer once the edits stop
+        if self.outline is None:
+            return
+        if self.symbol_parse_id is not None:
+            self.root.after_cancel(self.symbol_parse_id)
+        self.symbol_parse_id = self.root.after(delay, self.parse_buffer_symbols)
+
+    def parse_buffer_symbols(self):
+        # The text is joined and parsed in the process pool, so big files
+        # don't hold the GIL away from the UI
+        self.symbol_parse_id = None
+        buffer = self.buffer
+        if buffer.loading:
+            return
+        suffix = os.path.splitext(self.current_file or "")[1].lower()
+        language = SYMBOL_LANGUAGES.get(suffix, self.language.lower())
+        if self.large_file is not None or language not in SYMBOL_PATTERNS:
+            self.set_buffer_symbols(buffer, buffer.version, [])
+            return
+        version = buffer.version
+        snapshot = self.document.snapshot()
+
+        def work():
+            try:
+                symbols = self.get_process_pool().submit(extract_symbols, language, snapshot.text()).result()
+            except Exception as e:
+                print(f"[symbols] parsing failed: {e}", file=sys.stderr)
+                return
+            self.call_soon(self.set_buffer_symbols, buffer, version, symbols)
+        threading.Thread(target=work, daemon=True).start()
+
+    def set_buffer_symbols(self, buffer, version, symbols):
+        # Results for an older version are dropped; a newer parse is pending
+        if buffer.version != version:
+            return
+        buffer.symbols = symbols
+        if buffer is self.buffer:
+            self.refresh_outline()
+
+    def toggle_outline(self):
+        # Symbols of the active buffer, docked right of the editor
+        if self.outline is not None:
+            self.outline.destroy()
+            self.outline = None
+            return
+        self.outline = ttk.Treeview(self.main_frame, show="tree", style="Custom.Treeview")
+        self.outline.pack(side="right", fill="y", before=self.editor_tabs)
+        self.outline.bind("<<TreeviewSelect>>", self.on_outline_select)
+        self.refresh_outline()
+        self.schedule_symbol_parse(0)
+
+    def refresh_outline(self):
+        if self.outline is None:
+            return
+        self.outline.delete(*self.outline.get_children())
+        self.outline_lines = {}
+        parents = {}
+        for name, kind, line, column, container in self.buffer.symbols or ():
+            item = self.outline.insert(parents.get(container, ""), "end", text=f"{name} ({kind})", open=True)
+            self.outline_lines[item] = (line, column)
+            parents[f"{container}.{name}" if container else name] = item
+
+    def on_outline_select(self, event):
+        selection = self.outline.selection()
+        if selection and selection[0] in self.outline_lines:
+            line, column = self.outline_lines[selection[0]]
+            self.text_widget.mark_set(tk.INSERT, f"{line}.{column}")
+            self.text_widget.see(tk.INSERT)
+
+    def search_symbols(self, symbol_index, generation, query):
+        # On the symbol search thread; queries overtaken by newer keystrokes
+        # are skipped
+        import sqlite3
+        if generation != self.symbol_search_generation:
+            return []
+        try:
+            if self.symbol_connection is None or self.symbol_connection[0] is not symbol_index:
+                if self.symbol_connection is not None:
+                    self.symbol_connection[1].close()
+                    self.symbol_connection = None
+                self.symbol_connection = (symbol_index, symbol_index.connect(SymbolIndex.SEARCH_TIMEOUT))
+            return symbol_index.search(self.symbol_connection[1], query)
+        except sqlite3.Error as e:
+            print(f"[symbols] search failed: {e}", file=sys.stderr)
+            return []
+
+    def show_go_to_symbol(self):
+        if self.symbol_index is None:
+            messagebox.showinfo("Go to Symbol", "The project index is still being built.")
+            return
+        symbol_index = self.symbol_index
+        if self.symbol_search_executor is None:
+            self.symbol_search_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        window = tk.Toplevel(self.root)
+        window.title("Go to Symbol")
+        window.transient(self.root)
+        entry = tk.Entry(window, width=70)
+        entry.pack(fill="x", padx=5, pady=5)
+        listbox = tk.Listbox(window, height=15)
+        listbox.pack(fill="both", expand=True, padx=5, pady=(0, 5))
+        results = []
+
+        def refresh(event):
+            if event.keysym in ("Up", "Down", "Return", "Escape"):
+                return
+            self.symbol_search_generation += 1
+            generation = self.symbol_search_generation
+            query = entry.get().strip()
+            if not query:
+                show(generation, [])
+                return
+            future = self.symbol_search_executor.submit(self.search_symbols, symbol_index, generation, query)
+            future.add_done_callback(lambda future: self.call_soon(show, generation, future.result()))
+
+        def show(generation, found):
+            if generation != self.symbol_search_generation or not window.winfo_exists():
+                return
+            results[:] = found
+            listbox.delete(0, tk.END)
+            for name, kind, path, line, container in results:
+                listbox.insert(tk.END, f"{container + '.' if container else ''}{name} ({kind})   {path}:{line}")
+            listbox.selection_set(0)
+
+        def move(step):
+            selection = listbox.curselection()
+            index = min(max((selection[0] if selection else -1) + step, 0), listbox.size() - 1)
+            listbox.selection_clear(0, tk.END)
+            listbox.selection_set(index)
+            listbox.see(index)
+            return "break"
+
+        def accept(event):
+            selection = listbox.curselection()
+            if selection:
+                name, kind, path, line, container = results[selection[0]]
+                window.destroy()
+                self.open_path(os.path.join(symbol_index.root, path), line)
+
+        entry.bind("<KeyRelease>", refresh)
+        entry.bind("<Up>", lambda event: move(-1))
+        entry.bind("<Down>", lambda event: move(1))
+        entry.bind("<Return>", accept)
+        entry.bind("<Escape>", lambda event: window.destroy())
+        listbox.bind("<Double-1>", accept)
+        entry.focus_set()
+
+    def start_diff(self, buffer):
+        # Read the base version of the buffer's file and diff it from scratch
+        # on a worker thread; edits made meanwhile make set_diff start over
+        self.store_buffer_state()
+        buffer.diff_generation += 1
+        buffer.diff = None
+        self.schedule_gutter_redraw(buffer)
+        if not buffer.current_file or buffer.large_file is not None or buffer.spilled is not None or buffer.loading:
+            return
+        generation, version = buffer.diff_generation, buffer.version
+        path, snapshot = buffer.current_file, buffer.document.snapshot()
+        use_head = self.settings["diff_base"] == "head"
+
+        def work():
+            base = read_diff_base(path, use_head)
+            if base is not None:
+                self.call_soon(self.set_diff, buffer, generation, version, LineDiff(base, snapshot.text()))
+        threading.Thread(target=work, daemon=True).start()
+
+    def set_diff(self, buffer, generation, version, diff):
+        if generation != buffer.diff_generation or buffer not in self.buffers:
+            return
+        if version != buffer.version:
+            self.start_diff(buffer)
+            return
+        buffer.diff = diff
+        self.run_diff(buffer)
+
+    def on_diff_change(self, buffer, kind, start, end, text):
+        # TextChangeHook listener: re-hash the edited lines now, diff them once
+        # typing pauses
+        diff = buffer.diff
+        if diff is None or buffer.loading:
+            return
+        first = int(start.split(".")[0]) - 1
+        if kind == "insert":
+            last, count = first + 1, int(end.split(".")[0]) - first
+        else:
+            last, count = int(end.split(".")[0]), 1
+        diff.replace(first, last, buffer.text_widget.get(f"{first + 1}.0", f"{first + count}.end").split("\n"))
+        self.schedule_gutter_redraw(buffer)
+        if buffer.diff_after_id is not None:
+            self.root.after_cancel(buffer.diff_after_id)
+        buffer.diff_after_id = self.root.after(DIFF_DELAY, self.run_diff, buffer)
+
+    def run_diff(self, buffer):
+        # Diff the dirty window on a worker thread, one run per buffer at a time
+        buffer.diff_after_id = None
+        diff = buffer.diff
+        if diff is None or diff.dirty is None or diff.running or buffer not in self.buffers:
+            return
+        window = diff.window()
+        old, new = diff.old[window[0]:window[1]], diff.new[window[2]:window[3]]
+        version = diff.version
+        diff.running = True
+
+        def work():
+            hunks = diff_lines(old, new, time.perf_counter() + DIFF_TIME_BUDGET)
+            self.call_soon(self.on_diff_done, buffer, diff, version, window, hunks)
+        threading.Thread(target=work, daemon=True).start()
+
+    def on_diff_done(self, buffer, diff, version, window, hunks):
+        diff.running = False
+        if buffer.diff is not diff:
+            return
+        if version == diff.version:
+            diff.apply(window, hunks)
+            self.schedule_gutter_redraw(buffer)
+        elif buffer.diff_after_id is None:
+            # Edited while diffing: the window is still dirty
+            self.run_diff(buffer)
+
+    def schedule_gutter_redraw(self, buffer):
+        if buffer.gutter_after_id is None:
+            buffer.gutter_after_id = self.root.after_idle(self.draw_diff_gutter, buffer)
+
+    def draw_diff_gutter(self, buffer):
+        # Only the markers of the visible lines are drawn
+        buffer.gutter_after_id = None
+        gutter, text_widget = buffer.gutter, buffer.text_widget
+        if gutter is None or buffer not in self.buffers:
+            return
+        gutter.delete("all")
+        diff = buffer.diff
+        if diff is None:
+            return
+        width = int(gutter.cget("width"))
+        top = int(text_widget.index("@0,0").split(".")[0]) - 1
+        bottom = int(text_widget.index(f"@0,{text_widget.winfo_height()}").split(".")[0])
+        for kind, first, last in diff.markers(top, bottom):
+            color = DIFF_COLORS[kind]
+            info = text_widget.dlineinfo(f"{max(first, top) + 1}.0")
+            if info is None:
+                continue
+            if kind == "deleted":
+                # A wedge at the top of the line after the removed ones
+                y = info[1]
+                gutter.create_polygon(0, y - 4, width, y, 0, y + 4, fill=color, outline="")
+                continue
+            end = text_widget.dlineinfo(f"{min(last, bottom)}.0")
+            y1 = end[1] + end[3] if end is not None else text_widget.winfo_height()
+            gutter.create_rectangle(0, info[1], width, y1, fill=color, outline="")
+
+    def toggle_diff_base(self):
+        self.settings["diff_base"] = "head" if self.diff_head_var.get() else "disk"
+        save_settings(self.settings)
+        for buffer in self.buffers:
+            self.start_diff(buffer)
+
+    def show_diff(self):
+        # Side-by-side view of the base version and the buffer
+        self.store_buffer_state()
+        path = self.current_file
+        if not path or self.large_file is not None:
+            messagebox.showinfo("Show Diff", "Only saved files opened for editing can be compared.")
+            return
+        snapshot = self.document.snapshot()
+        use_head = self.settings["diff_base"] == "head"
+
+        def work():
+            base = read_diff_base(path, use_head)
+            if base is None:
+                self.call_soon(messagebox.showerror, "Show Diff", f"Can't read the base version of '{path}'.")
+                return
+            old_lines, new_lines = base.split("\n"), snapshot.text().split("\n")
+            hunks = diff_lines(array.array("q", map(hash, old_lines)), array.array("q", map(hash, new_lines)),
+                               time.perf_counter() + 4 * DIFF_TIME_BUDGET)
+            self.call_soon(self.open_diff_window, path, use_head, old_lines, new_lines, hunks)
+        threading.Thread(target=work, daemon=True).start()
+
+    def open_diff_window(self, path, use_head, old_lines, new_lines, hunks):
+        # Both sides get the same rows: the shorter side of a hunk is padded
+        # with filler lines so unchanged lines stay level
+        left_rows, right_rows, ranges = [], [], []
+        old_position = new_position = 0
+        for old_start, old_end, new_start, new_end in hunks + [(len(old_lines), None, len(new_lines), None)]:
+            left_rows.extend(old_lines[old_position:old_start])
+            right_rows.extend(new_lines[new_position:new_start])
+            if old_end is None:
+                break
+            row, removed, added = len(left_rows), old_end - old_start, new_end - new_start
+            size = max(removed, added)
+            left_rows.extend(old_lines[old_start:old_end] + [""] * (size - removed))
+            right_rows.extend(new_lines[new_start:new_end] + [""] * (size - added))
+            ranges.append((row, removed, added, size))
+            old_position, new_position = old_end, new_end
+        window = tk.Toplevel(self.root)
+        window.title(f"Diff - {os.path.basename(path)}")
+        removed = sum(r[1] for r in ranges)
+        added = sum(r[2] for r in ranges)
+        base = "Git HEAD" if use_head else "file on disk"
+        tk.Label(window, anchor="w", text=f"{len(ranges)} changes: {removed} lines removed, {added} added against the {base}").pack(fill="x", padx=5)
+        panes = tk.Frame(window)
+        panes.pack(fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(panes, orient="vertical")
+        scrollbar.pack(side="right", fill="y")
+        views = []
+        for rows, tag, color in ((left_rows, "removed", "#FFDCE0"), (right_rows, "added", "#DCFFE4")):
+            view = tk.Text(panes, wrap="none", width=80, height=40, font=("Courier New", 12))
+            view.pack(side="left", fill="both", expand=True)
+            view.insert("1.0", "\n".join(rows))
+            view.tag_config(tag, background=color)
+            view.tag_config("filler", background="#EEEEEE")
+            views.append(view)
+        left, right = views
+        for row, removed, added, size in ranges:
+            for view, tag, count in ((left, "removed", removed), (right, "added", added)):
+                if count:
+                    view.tag_add(tag, f"{row + 1}.0", f"{row + count + 1}.0")
+                if count < size:
+                    view.tag_add("filler", f"{row + count + 1}.0", f"{row + size + 1}.0")
+        for view in views:
+            view.configure(state="disabled")
+
+        # Scrolling either side moves the other one along
+        def follow(other):
+            def on_scroll(first, last):
+                scrollbar.set(first, last)
+                if other.yview()[0] != float(first):
+                    other.yview_moveto(first)
+            return on_scroll
+        left.configure(yscrollcommand=follow(right))
+        right.configure(yscrollcommand=follow(left))
+        scrollbar.configure(command=lambda *args: (left.yview(*args), right.yview(*args)))
+        if ranges:
+            left.yview(max(ranges[0][0] - 3, 0))
+
+    def show_quick_open(self):
+        if self.file_index is None:
+            messagebox.showinfo("Go to File", "The project index is still being built.")
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Go to File")
+        window.transient(self.root)
+        entry = tk.Entry(window, width=70)
+        entry.pack(fill="x", padx=5, pady=5)
+        listbox = tk.Listbox(window, height=15)
+        listbox.pack(fill="both", expand=True, padx=5, pady=(0, 5))
+
+        def refresh(event):
+            if event.keysym in ("Up", "Down", "Return", "Escape"):
+                return
+            listbox.delete(0, tk.END)
+            for path in self.file_index.search(entry.get()):
+                listbox.insert(tk.END, path)
+            listbox.selection_set(0)
+
+        def move(step):
+            selection = listbox.curselection()
+            index = min(max((selection[0] if selection else -1) + step, 0), listbox.size() - 1)
+            listbox.selection_clear(0, tk.END)
+            listbox.selection_set(index)
+            listbox.see(index)
+            return "break"
+
+        def accept(event):
+            selection = listbox.curselection()
+            if selection:
+                path = os.path.join(self.file_index.root, listbox.get(selection[0]))
+                window.destroy()
+                self.open_path(path)
+
+        entry.bind("<KeyRelease>", refresh)
+        entry.bind("<Up>", lambda event: move(-1))
+        entry.bind("<Down>", lambda event: move(1))
+        entry.bind("<Return>", accept)
+        entry.bind("<Escape>", lambda event: window.destroy())
+        listbox.bind("<Double-1>", accept)
+        entry.focus_set()
+
+    def show_find_in_files(self):
+        if self.find_window is not None:
+            self.find_window.lift()
+            self.find_entry.focus_set()
+            return
+        window = self.find_window = tk.Toplevel(self.root)
+        window.title("Find in Files")
+        options = tk.Frame(window)
+        options.pack(fill="x", padx=5, pady=5)
+        self.find_entry = tk.Entry(options, width=50)
+        self.find_entry.pack(side="left", fill="x", expand=True)
+        self.find_regex = tk.BooleanVar(value=False)
+        self.find_case = tk.BooleanVar(value=False)
+        self.find_word = tk.BooleanVar(value=False)
+        tk.Checkbutton(options, text="Regex", variable=self.find_regex).pack(side="left")
+        tk.Checkbutton(options, text="Match case", variable=self.find_case).pack(side="left")
+        tk.Checkbutton(options, text="Whole word", variable=self.find_word).pack(side="left")
+        tk.Button(options, text="Find", command=self.start_find_in_files).pack(side="left")
+        self.find_status = tk.Label(window, anchor="w")
+        self.find_status.pack(fill="x", padx=5)
+        self.find_results = ttk.Treeview(window, columns=("line", "text"), show="tree headings")
+        self.find_results.heading("#0", text="File")
+        self.find_results.heading("line", text="Line")
+        self.find_results.heading("text", text="Text")
+        self.find_results.column("line", width=60, stretch=False)
+        self.find_results.pack(fill="both", expand=True, padx=5, pady=5)
+        self.find_entry.bind("<Return>", lambda event: self.start_find_in_files())
+        self.find_results.bind("<Double-1>", self.open_find_result)
+        window.protocol("WM_DELETE_WINDOW", self.close_find_in_files)
+        self.find_entry.focus_set()
+
+    def start_find_in_files(self):
+        # A new query cancels the one still running
+        query = self.find_entry.get()
+        self.cancel_find_in_files()
+        self.find_results.delete(*self.find_results.get_children())
+        if not query:
+            return
+        if self.find_regex.get():
+            try:
+                re.compile(query.encode("utf-8"))
+            except re.error as e:
+                self.find_status.config(text=f"Invalid regular expression: {e}")
+                return
+        generation = self.find_generation
+        self.find_result_count = 0
+        self.find_pending = None
+        self.find_status.config(text="Searching...")
+        args = (query, self.find_regex.get(), self.find_case.get(), self.find_word.get())
+        index = self.file_index
+        root = index.root if index is not None else os.getcwd()
+        threading.Thread(target=self.submit_find_in_files, args=(generation, index, root, args), daemon=True).start()
+
+    def submit_find_in_files(self, generation, index, root, args):
+        # Worker thread: build the file list and fan it out over the process pool
+        if index is not None:
+            paths = index.paths()
+        else:
+            index = FileIndex(root)
+            index.crawl()
+            paths = index.paths()
+        if generation != self.find_generation:
+            return
+        pool = self.get_process_pool()
+        chunks = [paths[i:i + FIND_CHUNK_FILES] for i in range(0, len(paths), FIND_CHUNK_FILES)]
+        self.call_soon(self.set_find_pending, generation, len(chunks))
+        for chunk in chunks:
+            future = pool.submit(find_in_files, root, chunk, *args)
+            future.add_done_callback(lambda future: self.call_soon(self.on_find_results, generation, root, future))
+            self.find_futures.append(future)
+            if generation != self.find_generation:
+                future.cancel()
+                return
+
+    def set_find_pending(self, generation, count):
+        if generation == self.find_generation:
+            self.find_pending = count
+            self.update_find_status(generation)
+
+    def on_find_results(self, generation, root, future):
+        # Stream the results of one chunk into the tree as it arrives
+        if generation != self.find_generation or future.cancelled():
+            return
+        self.find_pending = (self.find_pending or 0) - 1
+        try:
+            results = future.result()
+        except Exception as e:
+            self.find_status.config(text=f"Search failed: {e}")
+            return
+        for path, line, column, text in results:
+            if self.find_result_count >= FIND_MAX_RESULTS:
+                break
+            file_item = os.path.join(root, path)
+            if not self.find_results.exists(file_item):
+                self.find_results.insert("", "end", iid=file_item, text=path, open=True)
+            self.find_results.insert(file_item, "end", text="", values=(line, text.strip()))
+            self.find_result_count += 1
+        self.update_find_status(generation)
+
+    def update_find_status(self, generation):
+        count = self.find_result_count
+        if self.find_pending:
+            self.find_status.config(text=f"Searching... {count} matches so far")
+        elif count >= FIND_MAX_RESULTS:
+            self.find_status.config(text=f"Showing the first {count} matches")
+        else:
+            self.find_status.config(text=f"{count} matches")
+
+    def open_find_result(self, event):
+        item = self.find_results.identify_row(event.y)
+        parent = self.find_results.parent(item) if item else ""
+        if parent:
+            line = int(self.find_results.item(item, "values")[0])
+            self.open_path(parent, line)
+
+    def cancel_find_in_files(self):
+        self.find_generation += 1
+        for future in self.find_futures:
+            future.cancel()
+        self.find_futures = []
+
+    def close_find_in_files(self):
+        self.cancel_find_in_files()
+        self.find_window.destroy()
+        self.find_window = None
+
+    def edit_ignore_patterns(self):
+        patterns = simpledialog.askstring("Watch Ignore Patterns", "Patterns to ignore (comma separated):",
+                                          initialvalue=", ".join(self.settings["watch_ignore_patterns"]))
+        if patterns is not None:
+            self.settings["watch_ignore_patterns"] = [p.strip() for p in patterns.split(",") if p.strip()]
+            if self.directory_watcher is not None:
+                self.directory_watcher.set_ignore_patterns(self.settings["watch_ignore_patterns"])
+            save_settings(self.settings)
 
     def execute_file(self, language):
         # Execute the current file using the selected language
-        if hasattr(self, 'current_file'):
+        if self.current_file:
+            name = os.path.basename(self.current_file)
             if language == "python" and self.current_file.endswith(".py"):
-                subprocess.run(["python", self.current_file])
+                self.run_command([sys.executable, self.current_file], name)
             elif language == "javascript" and self.current_file.endswith(".js"):
-                subprocess.run(["node", self.current_file])
-            elif language == "c_cpp" and (self.current_file.endswith(".c") or self.current_file.endswith(".cpp")):
-                subprocess.run(["gcc", "-o", "output", self.current_file])
-                subprocess.run(["./output"])
+                self.run_command(["node", self.current_file], name)
+            elif language == "c_cpp" and self.current_file.endswith(C_SOURCE_SUFFIXES + CPP_SOURCE_SUFFIXES):
+                self.build_and_run(self.current_file)
             else:
                 messagebox.showwarning("Execution Warning", f"Cannot execute file with {language}.")
 
+    def create_output_panel(self):
+        # Output panel docked under the editor; "Undock" turns it into its own window
+        self.output_panel = tk.Frame(self.root)
+        self.output_tabs = ttk.Notebook(self.output_panel, height=180)
+        self.output_tabs.pack(fill="both", expand=True)
+        self.output_docked = True
+
+    def toggle_output_panel(self):
+        if self.output_panel is None:
+            self.create_output_panel()
+        if not self.output_docked:
+            self.dock_output_panel()
+        elif self.output_panel.winfo_ismapped():
+            self.output_panel.pack_forget()
+        else:
+            self.output_panel.pack(side="bottom", fill="x", before=self.main_frame)
+
+    def show_output_panel(self):
+        if self.output_panel is None:
+            self.create_output_panel()
+        if self.output_docked and not self.output_panel.winfo_ismapped():
+            self.output_panel.pack(side="bottom", fill="x", before=self.main_frame)
+
+    def undock_output_panel(self):
+        if self.output_docked:
+            self.output_panel.pack_forget()
+            self.root.tk.call("wm", "manage", self.output_panel)
+            self.root.tk.call("wm", "title", self.output_panel, "Output")
+            self.root.tk.call("wm", "protocol", self.output_panel, "WM_DELETE_WINDOW",
+                              self.root.register(self.dock_output_panel))
+            self.output_docked = False
+
+    def dock_output_panel(self):
+        if not self.output_docked:
+            self.root.tk.call("wm", "forget", self.output_panel)
+            self.output_docked = True
+            self.output_panel.pack(side="bottom", fill="x", before=self.main_frame)
+
+    def run_command(self, command, title, cwd=None, on_exit=None, view=None):
+        # Start a process without blocking the UI and stream its output into a tab
+        self.show_output_panel()
+        session = RunSession(command, cwd, self.call_soon, self.on_run_output, self.on_run_exit)
+        session.title = title
+        session.exit_callback = on_exit
+        if view is None:
+            view = self.create_run_view(title)
+        view["session"] = session
+        self.run_views[session] = view
+        view["text"].configure(state="normal")
+        view["text"].delete("1.0", tk.END)
+        view["text"].insert(tk.END, " ".join(command) + "\n", "info")
+        view["text"].configure(state="disabled")
+        try:
+            session.start()
+        except OSError as e:
+            self.append_run_output(view, [("stderr", f"Could not start process: {e}\n")], 0)
+            del self.run_views[session]
+            return None
+        view["status"].config(text="Running")
+        self.output_tabs.select(view["frame"])
+        return session
+
+    def create_run_view(self, title):
+        frame = tk.Frame(self.output_tabs)
+        toolbar = tk.Frame(frame)
+        toolbar.pack(side="top", fill="x")
+        view = {"frame": frame}
+        view["session"] = None
+        tk.Button(toolbar, text="Kill", command=lambda: view["session"] and view["session"].kill()).pack(side="left")
+        tk.Button(toolbar, text="Restart", command=lambda: self.restart_run(view)).pack(side="left")
+        tk.Button(toolbar, text="Close", command=lambda: self.close_run_view(view)).pack(side="left")
+        tk.Button(toolbar, text="Undock", command=self.undock_output_panel).pack(side="left")
+        view["status"] = tk.Label(toolbar, anchor="w")
+        view["status"].pack(side="left", fill="x", expand=True)
+        view["text"] = tk.Text(frame, height=10, wrap="char", state="disabled")
+        view["text"].pack(fill="both", expand=True)
+        view["text"].tag_config("stderr", foreground="#CC0000")
+        view["text"].tag_config("info", foreground="#808080")
+        self.output_tabs.add(frame, text=title)
+        return view
+
+    def restart_run(self, view):
+        session = view["session"]
+        if session is None:
+            return
+        session.kill()
+        self.run_views.pop(session, None)
+        self.run_command(session.command, session.title, session.cwd, session.exit_callback, view)
+
+    def close_run_view(self, view):
+        if view["session"] is not None:
+            view["session"].kill()
+            self.run_views.pop(view["session"], None)
+        self.output_tabs.forget(view["frame"])
+        view["frame"].destroy()
+
+    def on_run_output(self, session):
+        view = self.run_views.get(session)
+        chunks, dropped = session.take_output()
+        if view is not None:
+            self.append_run_output(view, chunks, dropped)
+
+    def append_run_output(self, view, chunks, dropped):
+        text = view["text"]
+        text.configure(state="normal")
+        if dropped:
+            text.insert(tk.END, f"[... {dropped} chunks of output dropped ...]\n", "info")
+        for stream, data in chunks:
+            text.insert(tk.END, data, stream)
+        # Keep only the last OUTPUT_PANEL_LINES lines in the widget
+        lines = int(text.index("end-1c").split(".")[0])
+        if lines > OUTPUT_PANEL_LINES:
+            text.delete("1.0", f"{lines - OUTPUT_PANEL_LINES}.0")
+        text.configure(state="disabled")
+        text.see(tk.END)
+
+    def on_run_exit(self, session):
+        self.on_run_output(session)
+        view = self.run_views.get(session)
+        if view is not None:
+            view["status"].config(text=session.status())
+            # Runs that were restarted or closed don't chain into follow-up commands
+            if session.exit_callback is not None:
+                session.exit_callback(session)
+        self.plugins.fire("run_finished", session.command, session.returncode)
+
+    def build_and_run(self, path):
+        # The file is the program, or with build_all_sources every C/C++
+        # source next to it is; objects and binaries come from the build
+        # cache when nothing changed
+        path = os.path.abspath(path)
+        sources = [path]
+        if self.settings["build_all_sources"]:
+            directory = os.path.dirname(path)
+            sources = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                             if name.endswith(C_SOURCE_SUFFIXES + CPP_SOURCE_SUFFIXES))
+        if self.build_cache is None:
+            self.build_cache = BuildCache(os.path.join(CONFIG_DIR, "build-cache"),
+                                          self.settings["build_cache_limit_mb"] * 1024 * 1024)
+        name = os.path.basename(path)
+        self.show_output_panel()
+        view = self.create_run_view(f"build {name}")
+        view["status"].config(text="Building")
+        self.output_tabs.select(view["frame"])
+        settings = dict(self.settings)
+
+        def on_output(text, stream="stderr"):
+            self.call_soon(self.append_run_output, view, [(stream, text)], 0)
+
+        def build():
+            binary = self.build_cache.build(sources, settings, on_output)
+            self.call_soon(self.on_build_done, view, binary, name)
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def on_build_done(self, view, binary, name):
+        if not view["frame"].winfo_exists():
+            return
+        if binary is None:
+            view["status"].config(text="Build failed")
+            return
+        view["status"].config(text="Build succeeded")
+        self.run_command([binary], name)
+
     def show_context_menu(self, event):
         # Show context menu for right-click event
         menu = tk.Menu(self.root, tearoff=0)
         menu.add_command(label="Delete File", command=self.delete_file)
         menu.post(event.x_root, event.y_root)
 
+
 if __name__ == "__main__":
+    profile = StartupProfile("--profile-startup" in sys.argv)
+    profile.mark("imports")
     root = tk.Tk()
-    editor = CodeEditor(root)
+    profile.mark("tk init")
+    editor = CodeEditor(root, profile)
     root.mainloop()
@@ -0,0 +1,213 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Document, EditHistory
+
+
+class StubText:
+    # Plain string with Tk "line.col" indices; inserts and deletes are passed
+    # to the listeners the way TextChangeHook reports them
+    def __init__(self, text=""):
+        self.text = text
+        self.listeners = []
+        self.idle = []
+
+    def offset(self, index):
+        index, _, chars = index.partition("+")
+        if index == "end":
+            return len(self.text)
+        line, col = map(int, index.split("."))
+        position = 0
+        for _ in range(line - 1):
+            position = self.text.index("\n", position) + 1
+        return min(position + col + (int(chars[:-1]) if chars else 0), len(self.text))
+
+    def index(self, index):
+        offset = self.offset(index)
+        line = self.text.count("\n", 0, offset) + 1
+        return "%d.%d" % (line, offset - (self.text.rfind("\n", 0, offset) + 1))
+
+    def insert(self, index, text):
+        start = self.index(index)
+        offset = self.offset(start)
+        self.text = self.text[:offset] + text + self.text[offset:]
+        end = self.index("%s+%dc" % (start, len(text)))
+        for listener in self.listeners:
+            listener("insert", start, end, text)
+
+    def delete(self, start, end):
+        start, end = self.index(start), self.index(end)
+        first, last = self.offset(start), self.offset(end)
+        text = self.text[first:last]
+        self.text = self.text[:first] + self.text[last:]
+        for listener in self.listeners:
+            listener("delete", start, end, text)
+
+    def after_idle(self, callback):
+        self.idle.append(callback)
+
+    def run_idle(self):
+        idle, self.idle = self.idle, []
+        for callback in idle:
+            callback()
+
+    def mark_set(self, mark, index):
+        pass
+
+    def see(self, index):
+        pass
+
+
+def random_text(rng, length):
+    return "".join(rng.choice("ab \n") for _ in range(length))
+
+
+class DocumentTest(unittest.TestCase):
+    def test_fuzz_against_string(self):
+        rng = random.Random(1)
+        for _ in range(20):
+            expected = random_text(rng, rng.randrange(50))
+            document = Document(expected)
+            for _ in range(300):
+                if expected and rng.random() < 0.4:
+                    offset = rng.randrange(len(expected))
+                    length = rng.randrange(1, min(20, len(expected) - offset) + 1)
+                    document.delete(offset, length)
+                    expected = expected[:offset] + expected[offset + length:]
+                else:
+                    offset = rng.randrange(len(expected) + 1)
+                    text = random_text(rng, rng.randrange(1, 10))
+                    document.insert(offset, text)
+                    expected = expected[:offset] + text + expected[offset:]
+                self.assertEqual(document.length, len(expected))
+            self.assertEqual(document.text(), expected)
+            self.assertEqual(document.newline_count(), expected.count("\n"))
+
+    def test_offset_of(self):
+        document = Document("ab\ncd\n")
+        document.insert(3, "x\ny")
+        self.assertEqual(document.text(), "ab\nx\nycd\n")
+        self.assertEqual(document.offset_of(1, 1), 1)
+        self.assertEqual(document.offset_of(2, 0), 3)
+        self.assertEqual(document.offset_of(3, 2), 7)
+        self.assertEqual(document.offset_of(4, 0), 9)
+
+    def test_snapshot_is_unaffected_by_later_edits(self):
+        document = Document("hello")
+        snapshot = document.snapshot()
+        document.insert(5, " world")
+        document.delete(0, 1)
+        self.assertEqual(snapshot.text(), "hello")
+        self.assertEqual(document.text(), "ello world")
+
+    def test_typing_shares_add_buffers(self):
+        document = Document("")
+        for i, char in enumerate("x" * 100):
+            document.insert(i, char)
+        self.assertEqual(len(document.buffers), 2)
+        self.assertEqual(len(document.pieces), 1)
+
+
+class EditHistoryTest(unittest.TestCase):
+    def make(self, text="", memory_limit=16 * 1024 * 1024):
+        widget = StubText(text)
+        document = Document(text)
+        history = EditHistory(widget, memory_limit)
+        widget.listeners += [document.on_change, history.on_change]
+        return widget, document, history
+
+    def type(self, widget, index, text):
+        for char in text:
+            widget.insert(index, char)
+            widget.run_idle()
+            index = widget.index("%s+1c" % index)
+
+    def test_typing_undoes_a_word_at_a_time(self):
+        widget, document, history = self.make()
+        self.type(widget, "1.0", "hello world")
+        self.assertEqual(len(history.undo_stack), 2)
+        history.undo()
+        self.assertEqual(widget.text, "hello")
+        history.undo()
+        self.assertEqual(widget.text, "")
+        history.redo()
+        history.redo()
+        self.assertEqual(widget.text, "hello world")
+        self.assertEqual(document.text(), "hello world")
+
+    def test_backspace_and_delete_runs_coalesce(self):
+        widget, document, history = self.make("abcdef")
+        for col in (5, 4, 3):
+            widget.delete("1.%d" % col, "1.%d" % (col + 1))
+            widget.run_idle()
+        self.assertEqual(widget.text, "abc")
+        for _ in range(2):
+            widget.delete("1.0", "1.1")
+            widget.run_idle()
+        self.assertEqual(widget.text, "c")
+        self.assertEqual(len(history.undo_stack), 2)
+        history.undo()
+        self.assertEqual(widget.text, "abc")
+        history.undo()
+        self.assertEqual(widget.text, "abcdef")
+
+    def test_changes_in_one_event_form_one_group(self):
+        widget, document, history = self.make("old text")
+        widget.delete("1.0", "1.3")
+        widget.insert("1.0", "new")
+        widget.run_idle()
+        self.assertEqual(len(history.undo_stack), 1)
+        history.undo()
+        self.assertEqual(widget.text, "old text")
+
+    def test_new_edit_clears_redo(self):
+        widget, document, history = self.make()
+        self.type(widget, "1.0", "abc")
+        history.undo()
+        self.type(widget, "1.0", "x")
+        self.assertEqual(history.redo_stack, [])
+        self.assertEqual(history.memory, 1)
+
+    def test_fuzz_undo_redo_round_trip(self):
+        rng = random.Random(2)
+        widget, document, history = self.make(random_text(rng, 40))
+        states = [widget.text]
+        for _ in range(200):
+            if widget.text and rng.random() < 0.4:
+                start = rng.randrange(len(widget.text))
+                end = min(len(widget.text), start + rng.randrange(1, 5))
+                widget.delete(widget.index("1.0+%dc" % start), widget.index("1.0+%dc" % end))
+            else:
+                offset = rng.randrange(len(widget.text) + 1)
+                widget.insert(widget.index("1.0+%dc" % offset), random_text(rng, rng.randrange(1, 4)))
+            widget.run_idle()
+            states.append(widget.text)
+        final = widget.text
+        while history.undo_stack:
+            history.undo()
+            self.assertIn(widget.text, states)
+            self.assertEqual(document.text(), widget.text)
+        self.assertEqual(widget.text, states[0])
+        while history.redo_stack:
+            history.redo()
+            self.assertEqual(document.text(), widget.text)
+        self.assertEqual(widget.text, final)
+
+    def test_oldest_groups_are_evicted_at_the_memory_limit(self):
+        widget, document, history = self.make(memory_limit=10)
+        for i in range(10):
+            widget.insert("end", "line %d\n" % i)
+            widget.run_idle()
+        self.assertLessEqual(history.memory, 10)
+        self.assertEqual(history.memory, sum(len(edit[3]) for group in history.undo_stack for edit in group))
+        self.assertEqual(len(history.undo_stack), 1)
+        history.undo()
+        self.assertEqual(widget.text, "".join("line %d\n" % i for i in range(9)))
+
+
+if __name__ == "__main__":
+    unittest.main()
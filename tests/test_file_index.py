@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import FileIndex, GitIgnore
+
+
+class GitIgnoreTest(unittest.TestCase):
+    CASES = [
+        # (rules, path, is_directory, expected)
+        (["*.o"], "main.o", False, True),
+        (["*.o"], "src/main.o", False, True),
+        (["*.o"], "main.c", False, None),
+        (["out/"], "out", True, True),
+        (["out/"], "out", False, None),
+        (["/build"], "build", True, True),
+        (["/build"], "src/build", True, None),
+        (["docs/*.md"], "docs/a.md", False, True),
+        (["docs/*.md"], "docs/sub/a.md", False, None),
+        (["**/logs"], "a/b/logs", True, True),
+        (["a/**/z"], "a/b/c/z", False, True),
+        (["file?.txt"], "file1.txt", False, True),
+        (["file[!0-9].txt"], "file1.txt", False, None),
+        (["file[!0-9].txt"], "filex.txt", False, True),
+        (["*.log", "!keep.log"], "keep.log", False, False),
+        (["# comment", "", "*.tmp"], "x.tmp", False, True),
+    ]
+
+    def test_match(self):
+        for rules, path, is_directory, expected in self.CASES:
+            with self.subTest(rules=rules, path=path):
+                self.assertEqual(GitIgnore(rules).match(path, is_directory), expected)
+
+
+class FileIndexTest(unittest.TestCase):
+    FILES = ["main.py", "README.md", "src/editor.py", "src/editor_test.py", "src/ui/tree_view.py",
+             "out/main.o", "node_modules/pkg/index.js", "src/.gitignore", "src/gen/parser.py",
+             ".git/HEAD", "notes.log"]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        for relative in self.FILES:
+            self.write(relative, "")
+        self.write(".gitignore", "out/\nnode_modules/\n*.log\n")
+        self.write("src/.gitignore", "gen/\n")
+        self.index = FileIndex(self.root)
+        self.index.crawl()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, relative, text):
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            file.write(text)
+
+    def test_crawl_skips_ignored(self):
+        self.assertEqual(sorted(self.index.paths()),
+                         [".gitignore", "README.md", "main.py", "src/.gitignore", "src/editor.py",
+                          "src/editor_test.py", "src/ui/tree_view.py"])
+
+    def test_paths_below_ignored_directories_are_ignored(self):
+        self.assertTrue(self.index.is_ignored("out/new.o", False))
+        self.assertTrue(self.index.is_ignored("out/sub", True))
+        self.assertTrue(self.index.is_ignored("node_modules/pkg/lib/a.js", False))
+        self.assertTrue(self.index.is_ignored("src/gen/lexer.py", False))
+        self.assertTrue(self.index.is_ignored(".git/objects/ab", False))
+        self.assertTrue(self.index.is_ignored("logs.log", False))
+        self.assertFalse(self.index.is_ignored("src/new.py", False))
+        self.assertFalse(self.index.is_ignored("output/new.o", False))
+        self.assertFalse(self.index.is_ignored("src/generated", True))
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symlinks")
+    def test_crawl_does_not_follow_directory_symlinks(self):
+        try:
+            os.symlink(self.root, os.path.join(self.root, "src", "loop"))
+        except OSError:
+            self.skipTest("symlinks not permitted")
+        index = FileIndex(self.root)
+        index.crawl()
+        self.assertEqual(sorted(index.paths()), sorted(self.index.paths()))
+
+    def test_search(self):
+        self.assertEqual(self.index.search("editor")[:2], ["src/editor.py", "src/editor_test.py"])
+        self.assertEqual(self.index.search("trvw"), ["src/ui/tree_view.py"])
+        self.assertEqual(self.index.search("ui/tree"), ["src/ui/tree_view.py"])
+        self.assertEqual(self.index.search("zzz"), [])
+
+    def test_add_and_remove(self):
+        self.index.add_file("src/ui/new_panel.py")
+        self.assertEqual(self.index.search("new_panel"), ["src/ui/new_panel.py"])
+        self.index.remove_path("src/ui")
+        self.assertEqual(self.index.search("tree_view"), [])
+        self.assertEqual(self.index.search("new_panel"), [])
+        self.assertIn("src/editor.py", self.index.paths())
+
+    def test_save_and_load(self):
+        path = os.path.join(self.root, "cache", "index.idx")
+        self.index.save(path)
+        loaded = FileIndex.load(path, self.root)
+        self.assertEqual(sorted(loaded.paths()), sorted(self.index.paths()))
+        self.assertIsNone(FileIndex.load(path, self.root + "-other"))
+
+
+if __name__ == "__main__":
+    unittest.main()
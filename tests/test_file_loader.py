@@ -0,0 +1,94 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import FileLoader
+
+
+class FileLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.delivered = []
+        self.loader = FileLoader(lambda callback, *args: callback(*args))
+
+    def tearDown(self):
+        self.loader.executor.shutdown(wait=True)
+        self.directory.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def block_workers(self):
+        # Occupy both workers until the returned event is set
+        release = threading.Event()
+        for _ in range(2):
+            self.loader.executor.submit(release.wait)
+        return release
+
+    def test_newlines_are_normalized(self):
+        path = self.write("crlf.txt", b"a\r\nb\rc\n")
+        self.assertEqual(self.loader.read(path), "a\nb\nc\n")
+
+    def test_non_utf8_is_refused(self):
+        path = self.write("latin.txt", b"caf\xe9\n")
+        with self.assertRaises(ValueError):
+            self.loader.read(path)
+
+    def test_only_the_last_request_is_read(self):
+        first = self.write("first.txt", b"first")
+        second = self.write("second.txt", b"second")
+        read = []
+        original = self.loader.read
+        self.loader.read = lambda path: read.append(path) or original(path)
+        release = self.block_workers()
+        self.loader.request(first, lambda *args: self.delivered.append(args))
+        self.loader.request(second, lambda *args: self.delivered.append(args))
+        release.set()
+        self.loader.executor.shutdown(wait=True)
+        self.assertEqual(read, [second])
+        self.assertEqual(self.delivered, [(second, "second", None)])
+
+    def test_prefetch_is_not_queued_twice_and_cancelled_by_request(self):
+        near = self.write("near.txt", b"near")
+        wanted = self.write("wanted.txt", b"wanted")
+        release = self.block_workers()
+        self.loader.prefetch([near])
+        self.loader.prefetch([near])
+        self.assertEqual(list(self.loader.prefetching), [near])
+        self.loader.request(wanted, lambda *args: self.delivered.append(args))
+        self.assertEqual(self.loader.prefetching, {})
+        release.set()
+        self.loader.executor.shutdown(wait=True)
+        self.assertNotIn(near, self.loader.cache)
+        self.assertEqual(self.delivered, [(wanted, "wanted", None)])
+
+    def test_concurrent_reads_share_one_read(self):
+        path = self.write("shared.txt", b"shared")
+        opened = []
+        started = threading.Event()
+        release = threading.Event()
+        original_store = self.loader.store
+
+        def slow_store(*args):
+            opened.append(args[0])
+            started.set()
+            release.wait()
+            original_store(*args)
+        self.loader.store = slow_store
+        first = self.loader.executor.submit(self.loader.read, path)
+        started.wait()
+        second = self.loader.executor.submit(self.loader.read, path)
+        release.set()
+        self.assertEqual((first.result(), second.result()), ("shared", "shared"))
+        self.assertEqual(opened, [path])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import GitStatus
+
+
+@unittest.skipUnless(shutil.which("git"), "needs git")
+class GitStatusTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.top = os.path.realpath(self.directory.name)
+        self.run_git("init", "-q", "-b", "main")
+        self.write("tracked.txt", "one\n")
+        self.write("old name.txt", "rename me\n")
+        self.write("src/module.py", "x = 1\n")
+        self.write(".gitignore", "*.log\nbuild/\n")
+        self.commit("first")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_git(self, *args):
+        subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com",
+                        "-c", "commit.gpgsign=false"] + list(args),
+                       cwd=self.top, check=True, capture_output=True)
+
+    def commit(self, message):
+        self.run_git("add", "-A")
+        self.run_git("commit", "-q", "-m", message)
+
+    def write(self, relative, text):
+        path = os.path.join(self.top, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            file.write(text)
+
+    def path(self, relative):
+        return os.path.join(self.top, relative.replace("/", os.sep))
+
+    def status(self, root=None):
+        status = GitStatus.discover(root or self.top)
+        self.assertIsNotNone(status)
+        return status
+
+    def test_discover(self):
+        status = self.status(self.path("src"))
+        self.assertEqual(status.top, self.top)
+        self.assertEqual(os.path.realpath(status.git_dir), self.path(".git"))
+
+    def test_clean_tree(self):
+        branch, ahead, behind, entries = self.status().query()
+        self.assertEqual((branch, ahead, behind, entries), ("main", 0, 0, {}))
+
+    def test_record_kinds(self):
+        self.write("tracked.txt", "two\n")
+        self.write("new file.py", "")
+        self.run_git("add", "new file.py")
+        self.run_git("mv", "old name.txt", "new name.txt")
+        self.write("scratch.txt", "")
+        self.write("notes/a.txt", "")
+        self.write("debug.log", "")
+        self.write("build/out.o", "")
+        branch, ahead, behind, entries = self.status().query()
+        self.assertEqual(branch, "main")
+        self.assertEqual(entries, {
+            self.path("tracked.txt"): "modified",
+            self.path("new file.py"): "added",
+            self.path("new name.txt"): "modified",
+            self.path("scratch.txt"): "untracked",
+            self.path("notes") + os.sep: "untracked",
+            self.path("debug.log"): "ignored",
+            self.path("build") + os.sep: "ignored",
+        })
+
+    def test_unmerged(self):
+        self.run_git("checkout", "-q", "-b", "feature")
+        self.write("tracked.txt", "feature\n")
+        self.commit("feature")
+        self.run_git("checkout", "-q", "main")
+        self.write("tracked.txt", "main\n")
+        self.commit("main")
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.run_git("merge", "-q", "feature")
+        entries = self.status().query()[3]
+        self.assertEqual(entries, {self.path("tracked.txt"): "conflict"})
+
+    def test_branch_ahead_and_behind(self):
+        self.run_git("checkout", "-q", "-b", "feature")
+        self.run_git("branch", "-q", "--set-upstream-to=main")
+        self.write("tracked.txt", "feature\n")
+        self.commit("feature 1")
+        self.write("src/module.py", "x = 2\n")
+        self.commit("feature 2")
+        self.run_git("checkout", "-q", "main")
+        self.write("other.txt", "")
+        self.commit("main")
+        self.run_git("checkout", "-q", "feature")
+        status = self.status()
+        status.apply(status.query())
+        self.assertEqual((status.branch, status.ahead, status.behind), ("feature", 2, 1))
+        self.assertEqual(status.branch_label(), "feature ↑2 ↓1")
+
+    def test_query_paths_and_apply(self):
+        self.write("src/module.py", "x = 2\n")
+        self.write("tracked.txt", "two\n")
+        status = self.status()
+        touched = status.apply(status.query())
+        self.assertIn(self.path("src/module.py"), touched)
+        self.assertEqual(status.state(self.path("src/module.py")), "modified")
+        self.assertEqual(status.state(self.path("src")), "modified")
+        self.assertEqual(status.state(self.top), "modified")
+
+        self.write("src/module.py", "x = 1\n")
+        paths = [self.path("src/module.py")]
+        touched = status.apply(status.query(paths), paths)
+        self.assertEqual(touched, {self.path("src/module.py"), self.path("src")})
+        self.assertIsNone(status.state(self.path("src/module.py")))
+        self.assertIsNone(status.state(self.path("src")))
+        self.assertEqual(status.state(self.path("tracked.txt")), "modified")
+
+    def test_state_below_untracked_directory(self):
+        self.write("notes/deep/a.txt", "")
+        status = self.status()
+        status.apply(status.query())
+        self.assertEqual(status.state(self.path("notes/deep/a.txt")), "untracked")
+        self.assertEqual(status.state(self.path("notes")), "untracked")
+
+
+if __name__ == "__main__":
+    unittest.main()
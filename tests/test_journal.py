@@ -0,0 +1,99 @@
+import os
+import sys
+import stat
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import EditJournal, file_stat_key, write_file_atomically
+
+
+class WriteFileAtomicallyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "file.txt")
+        self.umask = os.umask(0o022)
+
+    def tearDown(self):
+        os.umask(self.umask)
+        self.directory.cleanup()
+
+    def mode(self):
+        return stat.S_IMODE(os.stat(self.path).st_mode)
+
+    def test_new_file_gets_mode_from_umask(self):
+        key = write_file_atomically(self.path, "text\n")
+        self.assertEqual(self.mode(), 0o644)
+        self.assertEqual(key, file_stat_key(self.path))
+        self.assertEqual(os.listdir(self.directory.name), ["file.txt"])
+
+    def test_existing_mode_is_kept(self):
+        with open(self.path, "w") as file:
+            file.write("old\n")
+        os.chmod(self.path, 0o750)
+        write_file_atomically(self.path, "new\n")
+        self.assertEqual(self.mode(), 0o750)
+
+    def test_writes_utf8(self):
+        write_file_atomically(self.path, "café →\n")
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(), "café →\n".encode("utf-8"))
+
+
+class EditJournalTest(unittest.TestCase):
+    # Drives the writer-thread side of the journal directly
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal_dir = main.JOURNAL_DIR
+        main.JOURNAL_DIR = os.path.join(self.directory.name, "journal")
+        self.path = os.path.join(self.directory.name, "file.py")
+
+    def tearDown(self):
+        main.JOURNAL_DIR = self.journal_dir
+        self.directory.cleanup()
+
+    def replay(self, journal, records):
+        for kind, start, text in records:
+            journal.append(["i", start, text] if kind == "insert" else ["d", start, len(text)])
+        journal.fsync()
+        return EditJournal.recover(journal.path)
+
+    def test_recover_from_text_base(self):
+        journal = EditJournal(None, self.path, None, "one\ntwo\n")
+        records = [("insert", "1.3", " more"), ("delete", "2.0", "tw"), ("insert", "3.0", "three\n")]
+        self.assertEqual(self.replay(journal, records), (self.path, "one more\no\nthree\n"))
+
+    def test_recover_from_disk_base(self):
+        with open(self.path, "wb") as file:
+            file.write(b"a\r\nb\r\n")
+        journal = EditJournal(None, self.path, file_stat_key(self.path), None)
+        self.assertEqual(self.replay(journal, [("insert", "2.1", "c")]), (self.path, "a\nbc\n"))
+
+    def test_recover_refuses_changed_file(self):
+        with open(self.path, "w") as file:
+            file.write("a\n")
+        journal = EditJournal(None, self.path, file_stat_key(self.path), None)
+        journal.append(["i", "1.0", "x"])
+        with open(self.path, "w") as file:
+            file.write("changed\n")
+        with self.assertRaises(ValueError):
+            EditJournal.recover(journal.path)
+
+    def test_torn_last_record_is_ignored(self):
+        journal = EditJournal(None, self.path, None, "abc")
+        journal.append(["i", "1.3", "d"])
+        journal.file.write('["i", "1.4", "tor')
+        journal.file.flush()
+        self.assertEqual(EditJournal.recover(journal.path), (self.path, "abcd"))
+
+    def test_compact_keeps_text(self):
+        journal = EditJournal(None, self.path, None, "abc")
+        journal.append(["d", "1.0", 1])
+        journal.write_snapshot(self.path, main.Document("bc"))
+        self.assertEqual(EditJournal.recover(journal.path), (self.path, "bc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import LargeFileView
+
+
+class LargeFileSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "big.txt")
+        lines = [f"line {i} value" for i in range(5000)]
+        lines[10] = "Needle here"
+        lines[4000] = "another needle"
+        with open(self.path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        self.view = LargeFileView(self.path)
+        self.view.thread.join()
+        # Small chunks so the scan crosses several of them
+        self.view.SEARCH_CHUNK = 1000
+
+    def tearDown(self):
+        self.view.close()
+        self.directory.cleanup()
+
+    def line_of(self, span):
+        return None if span is None else self.view.line_of_offset(span[0])
+
+    def test_search_flags(self):
+        view = self.view
+        self.assertEqual(self.line_of(view.search(re.compile(b"needle"))), 4000)
+        self.assertEqual(self.line_of(view.search(re.compile(b"needle", re.IGNORECASE))), 10)
+        span = view.search(re.compile(rb"^line 49\d\d value$", re.MULTILINE))
+        self.assertEqual(self.line_of(span), 4900)
+        self.assertEqual(span[1] - span[0], len("line 4900 value"))
+        self.assertIsNone(view.search(re.compile(b"missing")))
+        # Empty matches are skipped
+        self.assertEqual(self.line_of(view.search(re.compile(b"N?eedle"))), 10)
+
+    def test_search_async_wraps_around(self):
+        pattern = re.compile(b"needle", re.IGNORECASE)
+        results = []
+        done = threading.Event()
+
+        def callback(span):
+            results.append(span)
+            done.set()
+        first = self.view.line_offset(10)
+        self.view.search_async(pattern, first + 1, callback, lambda: False)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(self.line_of(results[-1]), 4000)
+        done.clear()
+        self.view.search_async(pattern, results[-1][0] + 1, callback, lambda: False)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(self.line_of(results[-1]), 10)
+
+    def test_cancelled_search(self):
+        self.assertIsNone(self.view.search(re.compile(b"another"), is_cancelled=lambda: True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import tkinter
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import LatencyMonitor, TimedCallWrapper
+
+
+class LatencyMonitorTest(unittest.TestCase):
+    # A Tcl interpreter without Tk is enough to register and call commands
+    def setUp(self):
+        self.root = tkinter.Tcl()
+        self.original_wrapper = tkinter.CallWrapper
+        self.monitor = LatencyMonitor(self.root)
+
+    def tearDown(self):
+        self.monitor.uninstall()
+        tkinter.CallWrapper = self.original_wrapper
+
+    def register(self, function):
+        return self.root._register(function)
+
+    def calls(self):
+        return sum(count for name, count in self.monitor.counts.items() if name != LatencyMonitor.LAG)
+
+    def test_callbacks_registered_before_install_are_timed(self):
+        def on_key(*args):
+            return "break"
+        name = self.register(on_key)
+        self.monitor.install()
+        self.assertEqual(self.root.tk.call(name), "break")
+        self.assertEqual(self.monitor.counts["on_key"], 1)
+
+    def test_callbacks_registered_after_install_are_timed_once(self):
+        self.monitor.install()
+        self.assertIs(tkinter.CallWrapper, TimedCallWrapper)
+        name = self.register(lambda: None)
+        self.root.tk.call(name)
+        self.assertEqual(self.calls(), 1)
+
+    def test_uninstall_restores_commands_and_wrapper(self):
+        before = self.register(lambda: "before")
+        self.monitor.install()
+        during = self.register(lambda: "during")
+        self.monitor.uninstall()
+        self.assertIs(tkinter.CallWrapper, self.original_wrapper)
+        self.assertEqual(self.root.tk.call(before), "before")
+        self.assertEqual(self.root.tk.call(during), "during")
+        self.assertEqual(self.calls(), 0)
+        self.assertFalse(self.root.tk.call("info", "commands", before + "_untimed"))
+
+    def test_reinstall_does_not_time_twice(self):
+        self.monitor.install()
+        during = self.register(lambda: None)
+        self.monitor.uninstall()
+        before = self.register(lambda: None)
+        self.monitor.install()
+        self.root.tk.call(during)
+        self.root.tk.call(before)
+        self.assertEqual(self.calls(), 2)
+
+    def test_deleted_command_is_cleaned_up(self):
+        name = self.register(lambda: None)
+        self.monitor.install()
+        self.root.deletecommand(name)
+        self.monitor.uninstall()
+        self.assertFalse(self.root.tk.call("info", "commands", name + "_untimed"))
+
+
+if __name__ == "__main__":
+    unittest.main()
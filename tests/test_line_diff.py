@@ -0,0 +1,113 @@
+import array
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import LineDiff, diff_lines
+
+FOREVER = float("inf")
+
+
+def hashes(lines):
+    return array.array("q", map(hash, lines))
+
+
+def run(diff):
+    # What CodeEditor.run_diff and on_diff_done do, without the worker thread
+    window = diff.window()
+    old, new = diff.old[window[0]:window[1]], diff.new[window[2]:window[3]]
+    diff.apply(window, diff_lines(old, new, FOREVER))
+
+
+class DiffTestCase(unittest.TestCase):
+    def check(self, old, new, hunks):
+        # Outside the hunks the lines must match one to one
+        old_line = new_line = 0
+        for o0, o1, n0, n1 in hunks + [(len(old), len(old), len(new), len(new))]:
+            self.assertEqual(o0 - old_line, n0 - new_line)
+            self.assertEqual(old[old_line:o0], new[new_line:n0])
+            old_line, new_line = o1, n1
+
+
+class DiffLinesTest(DiffTestCase):
+    def test_simple_cases(self):
+        cases = [
+            ("a b c", "a b c", []),
+            ("a b c", "a x c", [(1, 2, 1, 2)]),
+            ("a b c", "a c", [(1, 2, 1, 1)]),
+            ("a c", "a b c", [(1, 1, 1, 2)]),
+            ("", "a", [(0, 0, 0, 1)]),
+            ("a b c d", "x b c y", [(0, 1, 0, 1), (3, 4, 3, 4)]),
+        ]
+        for old, new, expected in cases:
+            with self.subTest(old=old, new=new):
+                old_lines, new_lines = old.split(), new.split()
+                self.assertEqual(diff_lines(hashes(old_lines), hashes(new_lines), FOREVER), expected)
+
+    def test_random_diffs_are_valid(self):
+        rng = random.Random(3)
+        for size in (10, 200, 3000):
+            old = [rng.choice("abcdef") for _ in range(size)]
+            new = list(old)
+            for _ in range(size // 10 + 1):
+                position = rng.randrange(len(new) + 1)
+                new[position:position + rng.randrange(3)] = [rng.choice("abcxyz") for _ in range(rng.randrange(3))]
+            self.check(old, new, diff_lines(hashes(old), hashes(new), FOREVER))
+
+
+class LineDiffTest(DiffTestCase):
+    def edit_randomly(self, seed, restore):
+        # Random line edits like the ones on_diff_change reports, with a diff
+        # run now and then; yields (base, lines, diff) after each run
+        rng = random.Random(seed)
+        counter = iter(range(10 ** 9))
+        for _ in range(10):
+            base = ["line %d" % next(counter) for _ in range(rng.randrange(1, 300))]
+            lines = list(base)
+            diff = LineDiff("\n".join(base), "\n".join(lines))
+            run(diff)
+            self.assertEqual(diff.hunks, [])
+            for step in range(100):
+                first = rng.randrange(len(lines))
+                last = min(len(lines), first + max(1, rng.randrange(4)))
+                choice = rng.random()
+                if choice < 0.3:
+                    # Typing a new line, or splitting one
+                    replacement = [lines[first], "new %d" % next(counter)]
+                elif choice < 0.6:
+                    # Joining or deleting lines
+                    replacement = [lines[first]]
+                elif choice < 0.8 and restore:
+                    # Bringing back a line of the base version
+                    replacement = [rng.choice(base)]
+                else:
+                    replacement = ["edit %d" % next(counter)]
+                lines[first:last] = replacement
+                diff.replace(first, last, replacement)
+                if rng.random() < 0.3 or step == 99:
+                    run(diff)
+                    self.assertEqual(list(diff.new), list(hashes(lines)))
+                    yield base, lines, diff
+
+    def test_incremental_matches_full_recompute(self):
+        # Without repeated lines the shortest diff is unique
+        for base, lines, diff in self.edit_randomly(4, restore=False):
+            self.assertEqual(diff.hunks, diff_lines(hashes(base), hashes(lines), FOREVER))
+
+    def test_incremental_is_valid_with_repeated_lines(self):
+        # Several diffs can be as short; the hunks must still align the versions
+        for base, lines, diff in self.edit_randomly(5, restore=True):
+            self.check(base, lines, diff.hunks)
+
+    def test_markers(self):
+        diff = LineDiff("a\nb\nc\nd\ne", "a\nB\nc\nnew\nd")
+        run(diff)
+        self.assertEqual(list(diff.markers(0, 10)), [("modified", 1, 2), ("added", 3, 4), ("deleted", 5, 5)])
+        self.assertEqual(list(diff.markers(3, 4)), [("added", 3, 4)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import SymbolIndex, extract_symbols, index_symbol_files
+
+
+class ExtractSymbolsTest(unittest.TestCase):
+    # (language, source, [(name, kind, line, column, container), ...])
+    CASES = [
+        ("python",
+         "import os\nVALUE = 1\n\nclass Editor(Base):\n    mode: str = 'x'\n\n    def open(self, path):\n"
+         "        local = 2\n        def helper():\n            pass\n\n    async def save(self):\n        pass\n\n\n"
+         "def main():\n    pass\n\nif True:\n    def inside_if():\n        pass\n",
+         [("VALUE", "variable", 2, 0, None), ("Editor", "class", 4, 0, None), ("mode", "variable", 5, 4, "Editor"),
+          ("open", "method", 7, 4, "Editor"), ("helper", "function", 9, 8, "Editor.open"),
+          ("save", "method", 12, 4, "Editor"), ("main", "function", 16, 0, None),
+          ("inside_if", "function", 20, 4, None)]),
+        # Half-typed Python goes to the tagger
+        ("python", "class Editor:\n    def open(self\n\ndef main():\n    pass\n",
+         [("Editor", "class", 1, 6, None), ("open", "method", 2, 8, "Editor"), ("main", "function", 4, 4, None)]),
+        ("c",
+         "#include <stdio.h>\n#define MAX 10\n\nstruct point {\n    int x;\n};\n\nstatic int add(int a, int b)\n{\n"
+         "    if (a) {\n        return a;\n    }\n    return a + b;\n}\n\nint main(void) { return 0; }\n",
+         [("MAX", "macro", 2, 8, None), ("point", "class", 4, 7, None), ("add", "function", 8, 11, None),
+          ("main", "function", 16, 4, None)]),
+        ("cpp",
+         "namespace app {\nclass Widget : public Base {\npublic:\n    void draw() const;\n    int size() { return 1; }\n"
+         "};\n}\n\nvoid app::Widget::draw() const\n{\n}\n",
+         [("app", "class", 1, 10, None), ("Widget", "class", 2, 6, "app"), ("size", "function", 5, 8, "app.Widget"),
+          ("draw", "function", 9, 18, "app::Widget")]),
+        ("java",
+         "public class Main {\n    private int count;\n    public static void main(String[] args) {\n"
+         "        if (args.length > 0) {\n            run();\n        }\n    }\n    interface Listener {\n"
+         "        void changed(int value);\n    }\n}\n",
+         [("Main", "class", 1, 13, None), ("main", "method", 3, 23, "Main"), ("Listener", "class", 8, 14, "Main")]),
+        ("csharp",
+         "namespace App.Core\n{\n    public class Service\n    {\n        public async Task<int> RunAsync(string name)\n"
+         "        {\n            return await Task.FromResult(1);\n        }\n    }\n}\n",
+         [("App.Core", "class", 1, 10, None), ("Service", "class", 3, 17, "App.Core"),
+          ("RunAsync", "method", 5, 31, "App.Core.Service")]),
+        ("javascript",
+         "export class View extends Base {\n  constructor(model) {\n    this.model = model;\n  }\n  async render() {\n"
+         "    if (this.model) {\n    }\n  }\n}\nexport function start() {}\nconst handler = async (event) => {};\n"
+         "function* gen() {}\n",
+         [("View", "class", 1, 13, None), ("constructor", "method", 2, 2, "View"), ("render", "method", 5, 8, "View"),
+          ("start", "function", 10, 16, None), ("handler", "function", 11, 6, None), ("gen", "function", 12, 10, None)]),
+        ("plain", "def not_code():\n", []),
+    ]
+
+    def test_languages(self):
+        for language, text, expected in self.CASES:
+            with self.subTest(language=language, source=text[:20]):
+                self.assertEqual(extract_symbols(language, text), expected)
+
+
+class SymbolIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SymbolIndex("/project")
+        self.index.path = ":memory:"
+        self.connection = self.index.connect()
+
+    def tearDown(self):
+        self.connection.close()
+
+    def names(self, query, limit=50):
+        return [(name, path) for name, kind, path, line, container in self.index.search(self.connection, query, limit)]
+
+    def test_store_and_search(self):
+        self.index.store(self.connection, [
+            ("src/editor.py", (1, 10), [("Editor", "class", 1, 0, None), ("open_file", "method", 2, 4, "Editor")]),
+            ("src/util.py", (2, 20), [("open_path", "function", 1, 0, None), ("reopen", "function", 5, 0, None)]),
+        ])
+        self.assertEqual(self.index.keys(self.connection), {"src/editor.py": (1, 10), "src/util.py": (2, 20)})
+        # Prefix matches first, in name order, then names containing the query
+        self.assertEqual(self.names("open"), [("open_file", "src/editor.py"), ("open_path", "src/util.py"),
+                                              ("reopen", "src/util.py")])
+        self.assertEqual(self.names("EDIT"), [("Editor", "src/editor.py")])
+        self.assertEqual(self.names("open", limit=1), [("open_file", "src/editor.py")])
+        self.assertEqual(self.names("_"), [("open_file", "src/editor.py"), ("open_path", "src/util.py")])
+
+    def test_update_replaces_symbols(self):
+        self.index.store(self.connection, [("a.py", (1, 1), [("old_name", "function", 1, 0, None)])])
+        self.index.store(self.connection, [("a.py", (2, 2), [("new_name", "function", 1, 0, None)])])
+        self.assertEqual(self.names("old"), [])
+        self.assertEqual(self.names("new"), [("new_name", "a.py")])
+        self.assertEqual(self.index.keys(self.connection), {"a.py": (2, 2)})
+        # A None key means the file is gone
+        self.index.store(self.connection, [("a.py", None, [])])
+        self.assertEqual(self.names("new"), [])
+        self.assertEqual(self.index.keys(self.connection), {})
+
+    def test_remove_directory(self):
+        self.index.store(self.connection, [
+            ("pkg/a.py", (1, 1), [("alpha", "function", 1, 0, None)]),
+            ("pkg/sub/b.py", (1, 1), [("beta", "function", 1, 0, None)]),
+            ("pkg0.py", (1, 1), [("gamma", "function", 1, 0, None)]),
+            ("pkgs/c.py", (1, 1), [("delta", "function", 1, 0, None)]),
+        ])
+        self.index.remove(self.connection, ["pkg"])
+        self.assertEqual(sorted(self.index.keys(self.connection)), ["pkg0.py", "pkgs/c.py"])
+        self.assertEqual(self.names("a"), [("gamma", "pkg0.py"), ("delta", "pkgs/c.py")])
+
+    def test_index_symbol_files(self):
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, "m.py"), "w") as file:
+                file.write("def f():\n    pass\n")
+            results = index_symbol_files(root, ["m.py", "missing.py"])
+        self.assertEqual(results[0][0], "m.py")
+        self.assertEqual(results[0][2], [("f", "function", 1, 0, None)])
+        self.assertEqual(results[1], ("missing.py", None, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import SyntaxHighlighter, SyntaxTokenizer
+
+
+class StubText:
+    # The parts of tk.Text the highlighter uses, over a list of lines, with a
+    # viewport of `height` lines starting at `top`
+    def __init__(self, lines, height=40):
+        self.lines = lines
+        self.top = 0
+        self.height = height
+
+    def index(self, index):
+        if index == "end-1c":
+            return "%d.%d" % (len(self.lines), len(self.lines[-1]))
+        y = int(index.split(",")[1])
+        return "%d.0" % min(len(self.lines), self.top + 1 + y)
+
+    def winfo_height(self):
+        return self.height - 1
+
+    def get(self, start, end):
+        first = int(start.split(".")[0]) - 1
+        last = int(end.split(".")[0])
+        return "\n".join(self.lines[first:last])
+
+    def insert_line(self, line, text):
+        self.lines.insert(line - 1, text)
+
+    def after(self, delay, callback):
+        return "after#1"
+
+    def after_cancel(self, after_id):
+        pass
+
+    def tag_configure(self, *args, **kwargs):
+        pass
+
+    def tag_add(self, *args):
+        pass
+
+    def tag_remove(self, *args):
+        pass
+
+
+class SyntaxHighlighterTest(unittest.TestCase):
+    def make_highlighter(self, count):
+        lines = ['x = 1  # line %d' % i if i % 3 else 'text = """a"""' for i in range(count)]
+        widget = StubText(lines)
+        highlighter = SyntaxHighlighter(widget)
+        highlighter.set_language("python", ("blue", None))
+        highlighter.render()
+        return widget, highlighter
+
+    def expected_states(self, lines):
+        tokenizer = SyntaxTokenizer("python")
+        states, state = [], None
+        for line in lines:
+            state = tokenizer.tokenize_line(line, state)[1]
+            states.append(state)
+        return states
+
+    def scroll_and_check(self, widget, highlighter, top):
+        widget.top = top
+        highlighter.render()
+        last = min(len(widget.lines), top + widget.height + highlighter.VIEWPORT_MARGIN)
+        self.assertEqual(highlighter.line_states[:last], self.expected_states(widget.lines)[:last])
+
+    def test_edit_then_scroll(self):
+        for count, top in ((1000, 420), (20000, 4999)):
+            widget, highlighter = self.make_highlighter(count)
+            widget.insert_line(10, "y = 2")
+            highlighter.on_change("insert", "10.0", "11.0", "y = 2\n")
+            highlighter.render()
+            self.scroll_and_check(widget, highlighter, top)
+
+    def test_edit_opening_string_relexes_past_frontier(self):
+        widget, highlighter = self.make_highlighter(1000)
+        widget.insert_line(5, '"""')
+        highlighter.on_change("insert", "5.0", "6.0", '"""\n')
+        highlighter.render()
+        self.scroll_and_check(widget, highlighter, 300)
+
+
+if __name__ == "__main__":
+    unittest.main()